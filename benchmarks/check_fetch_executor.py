@@ -0,0 +1,121 @@
+import sys
+import os
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import nasdaqdatalink as ndl
+
+from benchmarks.compare_fetch_clients import requests_for, chunked, same_rows
+from benchmarks.fixtures import SyntheticSharadar, make_tickers
+from benchmarks.mock_datatables_server import SyntheticPages, make_handler
+from src.data_fetching import FETCH_CONFIG, _fetch_page, _request_key
+from src.fetch_executor import FetchExecutor
+
+
+def check_retries(executor, handler, fixtures, requests):
+    """
+    Every chunk of the usual queries through the executor, a page at a time, while the server throttles. Each 429
+    must come back as one executor retry, every request served must have taken a token, and the rows must match
+    the fixtures, so ndl isn't retrying or dropping pages itself.
+    """
+    served = handler.requests
+    throttled = handler.throttled
+    retries = executor.retries
+    tokens = executor.bucket.taken
+    futures = [(table, chunk, params, executor.submit_pages(_request_key(table, chunk, params), _fetch_page,
+                                                            table, chunk, params))
+               for table, tickers, params in requests for chunk in chunked(table, tickers)]
+
+    mismatches = 0
+    for table, chunk, params, future in futures:
+        mismatches += not same_rows(fixtures.get_table(table, ticker=chunk, paginate=True, **params), future.result())
+    served = handler.requests - served
+    throttled = handler.throttled - throttled
+    retries = executor.retries - retries
+    tokens = executor.bucket.taken - tokens
+    print(f"retries        {len(futures)} queries, {throttled} throttled, {retries} retried, "
+          f"{'match' if not mismatches else f'{mismatches} MISMATCHED'}")
+    print(f"rate limit     {served} requests served for {tokens} tokens")
+    return throttled > 0 and retries == throttled and tokens == served and not mismatches
+
+
+def check_in_flight(executor, handler, requests, callers):
+    """
+    The same query submitted by many callers while it is in flight is fetched once: the server serves it
+    no more pages than one caller on its own gets.
+    """
+    table, tickers, params = requests[0]
+    chunk = chunked(table, tickers)[0]
+    key = _request_key(table, chunk, params)
+
+    def served():
+        return handler.requests - handler.throttled
+
+    before = served()
+    start = threading.Barrier(callers)
+    futures = []
+
+    def submit():
+        start.wait()
+        futures.append(executor.submit_pages(key, _fetch_page, table, chunk, params))
+
+    threads = [threading.Thread(target=submit) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    futures[0].result()
+    shared_pages = served() - before
+
+    before = served()
+    executor.run_pages(key, _fetch_page, table, chunk, params)
+    single_pages = served() - before
+
+    shared = len({id(future) for future in futures})
+    print(f"in flight      {callers} callers, {shared} future(s), {shared_pages} page(s) served vs {single_pages} for one caller")
+    return shared == 1 and shared_pages == single_pages
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run FetchExecutor against a local datatables server that answers "
+                                                 "some requests with 429, checking retries and in-flight deduplication.")
+    parser.add_argument('--tickers', type=int, default=100, help="Synthetic universe size")
+    parser.add_argument('--throttle-every', type=int, default=4, metavar='N', help="Answer every Nth request with 429")
+    parser.add_argument('--latency', type=float, default=0.02, help="Seconds added to every response")
+    parser.add_argument('--backoff', type=float, default=0.01, help="Executor backoff seconds, short so the check is quick")
+    parser.add_argument('--callers', type=int, default=8, help="Concurrent callers of one query in the in-flight check")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    fixtures = SyntheticSharadar(args.tickers)
+    handler = make_handler(SyntheticPages(fixtures), args.latency, args.throttle_every)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ndl.ApiConfig.api_base = f"http://127.0.0.1:{server.server_address[1]}/api/v3"
+    ndl.ApiConfig.api_key = 'mock'
+
+    # The configured workers and retries, with a rate and backoff that don't slow the check down
+    executor = FetchExecutor(FETCH_CONFIG['max_workers'], rate=1000, burst=1000,
+                             max_retries=FETCH_CONFIG['max_retries'], backoff_seconds=args.backoff)
+    requests = requests_for(make_tickers(args.tickers))
+    try:
+        start = time.perf_counter()
+        passed = check_retries(executor, handler, fixtures, requests)
+        passed &= check_in_flight(executor, handler, requests, args.callers)
+        print(f"\n{handler.requests} requests served in {time.perf_counter() - start:.2f}s, "
+              f"{'all checks passed' if passed else 'CHECK FAILED'}")
+    finally:
+        executor.shutdown()
+        server.shutdown()
+        server.server_close()
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import sys
+import os
+import time
+import asyncio
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pandas as pd
+import nasdaqdatalink as ndl
+
+from benchmarks.fixtures import make_tickers
+from src.comparison_metrics import COMPARISON_METRICS, HISTORY_YEARS
+from src.data_fetching import TICKERS_PER_QUERY, DEFAULT_TICKERS_PER_QUERY, async_client
+from src.query_specs import sf1_query, sf2_query, returns_query
+
+
+def requests_for(tickers):
+    return [
+        ('SHARADAR/SF1', tickers, sf1_query(COMPARISON_METRICS, years=HISTORY_YEARS)),
+        ('SHARADAR/SF2', tickers, sf2_query(years=5)),
+        ('SHARADAR/SEP', tickers, returns_query(2)),
+    ]
+
+
+def chunked(table, tickers):
+    size = TICKERS_PER_QUERY.get(table, DEFAULT_TICKERS_PER_QUERY)
+    return [tickers[i:i + size] for i in range(0, len(tickers), size)]
+
+
+def fetch_serial(requests):
+    # ndl.get_table walks the cursor pages of each query in turn, one query after another
+    return [
+        pd.concat([ndl.get_table(table, ticker=chunk, paginate=True, **params) for chunk in chunked(table, tickers)],
+                  ignore_index=True)
+        for table, tickers, params in requests
+    ]
+
+
+async def fetch_async(requests, per_page):
+    async with async_client(per_page=per_page) as client:
+        frames = await asyncio.gather(*(
+            asyncio.gather(*(client.fetch(table, chunk, **params) for chunk in chunked(table, tickers)))
+            for table, tickers, params in requests
+        ))
+        return [pd.concat(chunks, ignore_index=True) for chunks in frames], client.requests
+
+
+def same_rows(left, right):
+    columns = list(left.columns)
+    if sorted(columns) != sorted(right.columns):
+        return False
+    # Clients parse dates at different resolutions, so compare every date column at ns
+    dates = [col for col in columns
+             if pd.api.types.is_datetime64_any_dtype(left[col]) or pd.api.types.is_datetime64_any_dtype(right[col])]
+    left = left.astype({col: 'datetime64[ns]' for col in dates}).sort_values(columns, ignore_index=True)
+    right = right[columns].astype({col: 'datetime64[ns]' for col in dates}).sort_values(columns, ignore_index=True)
+    try:
+        pd.testing.assert_frame_equal(left, right, check_dtype=False)
+    except AssertionError:
+        return False
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fetch the same queries with ndl.get_table and the async client "
+                                                 "from a datatables server and compare results and timings.")
+    parser.add_argument('--port', type=int, default=8766, help="Port of benchmarks/mock_datatables_server.py")
+    parser.add_argument('--tickers', type=int, default=200, help="First N synthetic tickers")
+    parser.add_argument('--per-page', type=int, default=10000, help="Rows per page for the async client")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    ndl.ApiConfig.api_base = f"http://127.0.0.1:{args.port}/api/v3"
+    ndl.ApiConfig.api_key = 'mock'
+    requests = requests_for(make_tickers(args.tickers))
+
+    start = time.perf_counter()
+    serial = fetch_serial(requests)
+    serial_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    concurrent, page_requests = asyncio.run(fetch_async(requests, args.per_page))
+    async_seconds = time.perf_counter() - start
+
+    mismatches = 0
+    for (table, _, _), left, right in zip(requests, serial, concurrent):
+        match = same_rows(left, right)
+        mismatches += not match
+        print(f"{table:<16} {len(left):>9,} rows  {'match' if match else 'MISMATCH'}")
+    print(f"\nndl.get_table {serial_seconds:.2f}s, async client {async_seconds:.2f}s over {page_requests} page requests")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
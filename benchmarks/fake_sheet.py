@@ -0,0 +1,58 @@
+from collections import Counter
+
+
+class CallRecorder:
+    """
+    Counts the calls a writer makes into Excel. Every method call and property write on an xlwings
+    object or its .api is a cross-process COM round trip, so the total approximates Excel time.
+    """
+
+    def __init__(self):
+        self.calls = Counter()
+
+    @property
+    def total(self):
+        return sum(self.calls.values())
+
+    def reset(self):
+        self.calls.clear()
+
+
+class RecordingObject:
+    """
+    Stands in for any xlwings or COM object: reading an attribute returns another stand-in, calling one or
+    assigning to an attribute is recorded under its dotted path, e.g. 'range.color' or 'range.api.NumberFormat'.
+    """
+
+    def __init__(self, recorder, path):
+        object.__setattr__(self, '_recorder', recorder)
+        object.__setattr__(self, '_path', path)
+
+    def _child(self, name):
+        return RecordingObject(self._recorder, f"{self._path}.{name}" if self._path else name)
+
+    def __getattr__(self, name):
+        return self._child(name)
+
+    def __setattr__(self, name, value):
+        self._recorder.calls[self._child(name)._path] += 1
+
+    def __call__(self, *args, **kwargs):
+        self._recorder.calls[self._path] += 1
+        return self
+
+    def __getitem__(self, key):
+        return self
+
+
+class RecordingSheet(RecordingObject):
+    """
+    Fake xlwings Sheet for XlwingsSheetWriter that records calls instead of driving Excel.
+    """
+
+    def __init__(self, recorder=None):
+        super().__init__(recorder or CallRecorder(), '')
+
+    @property
+    def recorder(self):
+        return self._recorder
@@ -0,0 +1,245 @@
+import numpy as np
+import pandas as pd
+
+from src.metric_engine import METRIC_FORMULAS, input_columns
+from src.query_specs import SF1_BASE_COLUMNS
+
+SECTORS = {
+    'Technology': ['Software', 'Semiconductors', 'Hardware'],
+    'Healthcare': ['Biotechnology', 'Medical Devices'],
+    'Energy': ['Oil & Gas E&P', 'Oil & Gas Midstream'],
+    'Financial Services': ['Banks', 'Insurance'],
+    'Consumer Cyclical': ['Retail', 'Autos', 'Restaurants'],
+    'Industrials': ['Aerospace & Defense', 'Machinery'],
+}
+INDUSTRIES = [(sector, industry) for sector, industries in SECTORS.items() for industry in industries]
+TRANSACTION_CODES = ['P', 'S', 'A', 'M', 'F']
+TRANSACTION_CODE_WEIGHTS = [0.15, 0.40, 0.20, 0.15, 0.10]
+
+# Line items as a fraction of revenue, (mean, spread) of each ticker's level
+REVENUE_SHARES = {
+    'cor': (0.55, 0.15), 'opex': (0.25, 0.08), 'rnd': (0.08, 0.05), 'sgna': (0.12, 0.05),
+    'depamor': (0.05, 0.02), 'sbcomp': (0.03, 0.02), 'intexp': (0.02, 0.01), 'taxexp': (0.03, 0.02),
+    'capex': (0.06, 0.03), 'receivables': (0.15, 0.05), 'inventory': (0.10, 0.06), 'payables': (0.08, 0.03),
+    'deferredrev': (0.03, 0.02), 'ppnenet': (0.40, 0.20), 'intangibles': (0.20, 0.15),
+    'cashneq': (0.20, 0.10), 'investmentsc': (0.10, 0.08), 'debt': (0.35, 0.25),
+    'assetsc': (0.60, 0.20), 'liabilitiesc': (0.35, 0.12), 'assets': (1.60, 0.50), 'liabilities': (0.90, 0.35),
+}
+FILTER_OPERATORS = {'gte': 'ge', 'gt': 'gt', 'lte': 'le', 'lt': 'lt'}
+
+
+def make_tickers(n):
+    return [f"SYN{i:05d}" for i in range(n)]
+
+
+def _per_ticker(rng, n, mean, spread):
+    return np.clip(rng.normal(mean, spread, n), mean * 0.05, None)
+
+
+def make_tickers_table(tickers, rng):
+    industry = rng.integers(len(INDUSTRIES), size=len(tickers))
+    return pd.DataFrame({
+        'ticker': tickers,
+        'table': 'SF1',
+        'name': [f"{ticker} Corp" for ticker in tickers],
+        'exchange': rng.choice(['NYSE', 'NASDAQ', 'NYSEMKT'], len(tickers)),
+        'isdelisted': np.where(rng.random(len(tickers)) < 0.05, 'Y', 'N'),
+        'sector': [INDUSTRIES[i][0] for i in industry],
+        'industry': [INDUSTRIES[i][1] for i in industry],
+        'lastupdated': pd.Timestamp.today().normalize(),
+    })
+
+
+def make_sf1(tickers, years, rng):
+    """
+    ART rows for every quarter end over the last `years` years, with revenue compounding at a per-ticker
+    growth rate and every other line item at a noisy per-ticker share of revenue.
+    """
+    quarter_ends = pd.date_range(end=pd.Timestamp.today().normalize(), periods=years * 4, freq='QE')
+    n, q = len(tickers), len(quarter_ends)
+
+    base_revenue = np.exp(rng.normal(20, 2, n))  # About $500M, spanning micro to mega caps
+    growth = rng.normal(0.08, 0.15, n)
+    periods = np.arange(q) / 4
+    revenue = base_revenue[:, None] * (1 + growth[:, None]).clip(0.3) ** periods * rng.lognormal(0, 0.05, (n, q))
+
+    def share(mean, spread):
+        return _per_ticker(rng, n, mean, spread)[:, None] * revenue * rng.lognormal(0, 0.05, (n, q))
+
+    columns = {name: share(mean, spread) for name, (mean, spread) in REVENUE_SHARES.items()}
+    columns['revenue'] = revenue
+    columns['gp'] = revenue - columns['cor']
+    columns['opinc'] = columns['gp'] - columns['opex']
+    columns['ebitda'] = columns['opinc'] + columns['depamor']
+    columns['ebit'] = columns['opinc']
+    columns['ebt'] = columns['ebit'] - columns['intexp']
+    columns['netinc'] = columns['ebt'] - columns['taxexp']
+    columns['ncfo'] = columns['netinc'] + columns['depamor'] + columns['sbcomp']
+    columns['fcf'] = columns['ncfo'] - columns['capex']
+    columns['equity'] = columns['assets'] - columns['liabilities']
+
+    shares = np.exp(rng.normal(18.5, 1.2, n))[:, None] * (1 - rng.normal(0.01, 0.02, n)[:, None]) ** periods
+    columns['sharesbas'] = shares
+    columns['marketcap'] = columns['netinc'].clip(revenue * 0.01) * rng.lognormal(3, 0.4, n)[:, None]
+    columns['ev'] = columns['marketcap'] + columns['debt'] - columns['cashneq']
+    columns['eps'] = columns['netinc'] / shares
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        columns['grossmargin'] = columns['gp'] / revenue
+        columns['ebitdamargin'] = columns['ebitda'] / revenue
+        columns['netmargin'] = columns['netinc'] / revenue
+        payers = np.where(rng.random(n) < 0.4, rng.uniform(0.005, 0.05, n), 0)
+        columns['divyield'] = np.broadcast_to(payers[:, None], (n, q))
+        columns['currentratio'] = columns['assetsc'] / columns['liabilitiesc']
+        columns['assetturnover'] = revenue / columns['assets']
+        columns['roa'] = columns['netinc'] / columns['assets']
+        columns['roe'] = columns['netinc'] / columns['equity']
+        columns['roic'] = columns['ebit'] * 0.79 / (columns['equity'] + columns['debt'])
+
+    calendardate = np.tile(quarter_ends.to_numpy(), n)
+    data = pd.DataFrame({
+        'ticker': np.repeat(tickers, q),
+        'dimension': 'ART',
+        'calendardate': calendardate,
+        'datekey': calendardate + np.timedelta64(45, 'D'),
+        'reportperiod': calendardate,
+        'fiscalperiod': np.tile([f"{date.year}-Q{date.quarter}" for date in quarter_ends], n),
+        'fxusd': 1.0,
+        'sharefactor': 1.0,
+        'lastupdated': calendardate + np.timedelta64(46, 'D'),
+    })
+    for name, values in columns.items():
+        data[name] = values.ravel()
+
+    missing = set(SF1_BASE_COLUMNS).union(input_columns(METRIC_FORMULAS)) - set(data.columns)
+    if missing:
+        raise ValueError(f"Synthetic SF1 is missing columns {sorted(missing)}")
+    return data
+
+
+def make_sep(tickers, days, rng):
+    """
+    Daily closes over the last `days` business days as geometric random walks, with a daily range and volume.
+    """
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+    n, d = len(tickers), len(dates)
+    returns = rng.normal(0.0003, 0.02, (n, d)) + rng.normal(0.0002, 0.01, d)  # Idiosyncratic plus market
+    closeadj = np.exp(rng.normal(3.5, 1, n))[:, None] * np.exp(np.cumsum(returns, axis=1))
+
+    close = closeadj.ravel().round(2)
+    spread = np.abs(rng.normal(0, 0.01, n * d))
+    return pd.DataFrame({
+        'ticker': np.repeat(tickers, d),
+        'date': np.tile(dates.to_numpy(), n),
+        'close': close,
+        'closeadj': closeadj.ravel(),
+        'high': (close * (1 + spread)).round(2),
+        'low': (close * (1 - spread)).round(2),
+        'volume': rng.lognormal(12, 1, n * d).round(),
+        'lastupdated': np.tile(dates.to_numpy(), n),
+    })
+
+
+def make_sf2(tickers, years, rng, per_year=12):
+    """
+    Insider transactions at per_year on average per ticker, filed two days after the trade.
+    """
+    counts = rng.poisson(per_year * years, len(tickers))
+    total = counts.sum()
+    end = pd.Timestamp.today().normalize()
+    transactiondate = end - pd.to_timedelta(rng.integers(0, years * 365, total), unit='D')
+
+    shares = rng.lognormal(8, 1.5, total).round()
+    return pd.DataFrame({
+        'ticker': np.repeat(tickers, counts),
+        'filingdate': transactiondate + pd.Timedelta(days=2),
+        'transactiondate': transactiondate,
+        'transactioncode': rng.choice(TRANSACTION_CODES, total, p=TRANSACTION_CODE_WEIGHTS),
+        'ownername': rng.choice(['Smith John', 'Doe Jane', 'Lee Chris', 'Patel Ana'], total),
+        'securityadcode': 'ND',
+        'transactionshares': shares,
+        'transactionvalue': shares * rng.lognormal(3.5, 1, total),
+    })
+
+
+class SyntheticPage:
+    """
+    The last and only page of a query, shaped like what nasdaqdatalink.Datatable(...).data returns.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.meta = {'next_cursor_id': None}
+
+    def to_pandas(self):
+        return self.data
+
+
+class SyntheticDatatable:
+    def __init__(self, source, datatable_code):
+        self.source = source
+        self.datatable_code = datatable_code
+
+    def data(self, params):
+        params = {name: value for name, value in params.items() if name != 'qopts.cursor_id'}
+        return SyntheticPage(self.source.get_table(self.datatable_code, **params))
+
+
+class SyntheticSharadar:
+    """
+    Synthetic SHARADAR tables for tickers x years of fundamentals x days of prices, served through
+    get_table or datatable with the same ticker, column and date filters as nasdaqdatalink.get_table.
+    """
+
+    def __init__(self, n_tickers=500, years=12, days=756, benchmark='SPY', seed=0):
+        rng = np.random.default_rng(seed)
+        self.tickers = make_tickers(n_tickers)
+        self.tables = {
+            'SHARADAR/TICKERS': make_tickers_table(self.tickers, rng),
+            'SHARADAR/SF1': make_sf1(self.tickers, years, rng),
+            'SHARADAR/SF2': make_sf2(self.tickers, min(years, 5), rng),
+            'SHARADAR/SEP': make_sep(self.tickers, days, rng),
+            'SHARADAR/SFP': make_sep([benchmark], days, rng),
+        }
+        # Row ranges per ticker so a ticker filter is a few slices rather than a scan of the whole table
+        self._bounds = {}
+        for code, data in self.tables.items():
+            data = data.sort_values('ticker', kind='stable').reset_index(drop=True)
+            self.tables[code] = data
+            tickers, starts = np.unique(data['ticker'].to_numpy(), return_index=True)
+            ends = np.append(starts[1:], len(data))
+            self._bounds[code] = dict(zip(tickers, zip(starts, ends)))
+        self.calls = 0
+
+    def rows(self):
+        return {code: len(data) for code, data in self.tables.items()}
+
+    def datatable(self, datatable_code):
+        # Stands in for nasdaqdatalink.Datatable, whose pages data_fetching reads one at a time
+        return SyntheticDatatable(self, datatable_code)
+
+    def get_table(self, datatable_code, ticker=None, paginate=False, qopts=None, **filters):
+        self.calls += 1
+        data = self.tables[datatable_code]
+        if ticker is not None:
+            bounds = self._bounds[datatable_code]
+            tickers = [ticker] if isinstance(ticker, str) else ticker
+            slices = [bounds[t] for t in tickers if t in bounds]
+            data = pd.concat([data.iloc[start:end] for start, end in slices]) if slices else data.iloc[0:0]
+
+        for column, condition in filters.items():
+            values = data[column]
+            if not isinstance(condition, dict):
+                data = data[values.isin(condition) if isinstance(condition, list) else values == condition]
+                continue
+            mask = np.ones(len(data), dtype=bool)
+            for operator, bound in condition.items():
+                if pd.api.types.is_datetime64_any_dtype(values):
+                    bound = pd.Timestamp(bound)
+                mask &= getattr(values, FILTER_OPERATORS[operator])(bound).to_numpy()
+            data = data[mask]
+
+        columns = (qopts or {}).get('columns')
+        if columns:
+            data = data[[column for column in columns if column in data.columns]]
+        return data.reset_index(drop=True)
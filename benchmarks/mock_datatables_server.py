@@ -0,0 +1,180 @@
+import sys
+import os
+import re
+import json
+import time
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qsl
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pandas as pd
+
+from benchmarks.fixtures import SyntheticSharadar
+from src.async_fetch import response_key
+
+PATH_PATTERN = re.compile(r'/datatables/(.+?)(?:\.json)?$')  # ndl.get_table omits .json, the async client adds it
+DEFAULT_PER_PAGE = 10000
+
+
+def column_type(dtype):
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'Date'
+    if pd.api.types.is_integer_dtype(dtype):
+        return 'Integer'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'double'
+    return 'String'
+
+
+def to_page(data, next_cursor_id):
+    columns = [{'name': name, 'type': column_type(dtype)} for name, dtype in data.dtypes.items()]
+    data = data.copy()
+    for name, dtype in data.dtypes.items():
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            data[name] = data[name].dt.strftime('%Y-%m-%d')
+    rows = data.astype(object).where(data.notna(), None).to_numpy().tolist()
+    return {'datatable': {'data': rows, 'columns': columns}, 'meta': {'next_cursor_id': next_cursor_id}}
+
+
+def normalize_query(query):
+    """
+    ndl.get_table sends a list as repeated name[] parameters, the async client as one comma-separated value;
+    both become the latter.
+    """
+    merged = {}
+    for name, value in query:
+        if name.endswith('[]'):
+            name = name[:-2]
+            value = merged[name] + ',' + value if name in merged else value
+        merged[name] = value
+    return list(merged.items())
+
+
+def to_get_table_args(query):
+    """
+    Datatables query parameters back to ndl.get_table style arguments, plus per_page and cursor_id.
+    """
+    args = {}
+    qopts = {}
+    for name, value in query:
+        if name == 'api_key':
+            continue
+        if name.startswith('qopts.'):
+            qopts[name[len('qopts.'):]] = value
+        elif name == 'ticker':
+            args['ticker'] = value.split(',')
+        elif '.' in name:
+            column, operator = name.rsplit('.', 1)
+            args.setdefault(column, {})[operator] = value
+        else:
+            args[name] = value.split(',') if ',' in value else value
+
+    if 'columns' in qopts:
+        args['qopts'] = {'columns': qopts['columns'].split(',')}
+    per_page = int(qopts.get('per_page', DEFAULT_PER_PAGE))
+    return args, per_page, qopts.get('cursor_id')
+
+
+class SyntheticPages:
+    """
+    Paginates synthetic tables the way the datatables endpoint does, holding each full result until its
+    last page is served.
+    """
+
+    def __init__(self, fixtures):
+        self.fixtures = fixtures
+        self.results = {}
+
+    def page(self, table, query):
+        args, per_page, cursor = to_get_table_args(query)
+        key = response_key(table, [(name, value) for name, value in query if name != 'qopts.cursor_id'])
+        if key not in self.results:
+            self.results[key] = self.fixtures.get_table(table, **args)
+        data = self.results[key]
+
+        offset = int(cursor) if cursor else 0
+        end = offset + per_page
+        if end >= len(data):
+            self.results.pop(key, None)
+        return to_page(data.iloc[offset:end], str(end) if end < len(data) else None)
+
+
+def make_handler(source, latency, throttle_every=0):
+    """
+    Request handler serving source. With throttle_every, every throttle_every-th request is answered 429
+    the way the API answers when over its rate limit; requests and throttled count what has been served.
+    """
+    lock = threading.Lock()
+
+    class DatatablesHandler(BaseHTTPRequestHandler):
+        requests = 0
+        throttled = 0
+
+        def _reply(self, status, body):
+            payload = json.dumps(body).encode() if not isinstance(body, bytes) else body
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            match = PATH_PATTERN.search(url.path)
+            if match is None:
+                return self._reply(404, {'quandl_error': {'code': 'QECx02', 'message': f"Unknown path {url.path}"}})
+
+            time.sleep(latency)  # Stands in for the network round trip
+            with lock:
+                DatatablesHandler.requests += 1
+                throttle = throttle_every and DatatablesHandler.requests % throttle_every == 0
+                DatatablesHandler.throttled += bool(throttle)
+            if throttle:
+                return self._reply(429, {'quandl_error': {'code': 'QELx01', 'message': "Too many requests"}})
+            table, query = match.group(1), normalize_query(parse_qsl(url.query, keep_blank_values=True))
+            if isinstance(source, str):
+                path = os.path.join(source, response_key(table, query) + '.json')
+                if not os.path.exists(path):
+                    return self._reply(404, {'quandl_error': {'code': 'QECx02', 'message': "No recorded response"}})
+                with open(path, 'rb') as f:
+                    return self._reply(200, f.read())
+            self._reply(200, source.page(table, query))
+
+        def log_message(self, format, *args):
+            pass
+
+    return DatatablesHandler
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve the Nasdaq Data Link datatables API locally, "
+                                                 "from recorded responses or synthetic Sharadar tables.")
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--replay', metavar='DIR', help="Serve the pages recorded into DIR (fetch.record_dir in config.json)")
+    parser.add_argument('--tickers', type=int, default=500, help="Synthetic universe size when not replaying")
+    parser.add_argument('--years', type=int, default=12)
+    parser.add_argument('--days', type=int, default=756)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds added to every response")
+    parser.add_argument('--throttle-every', type=int, default=0, metavar='N', help="Answer every Nth request with 429")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    source = args.replay or SyntheticPages(SyntheticSharadar(args.tickers, args.years, args.days))
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(source, args.latency, args.throttle_every))
+    print(f"Serving datatables on http://127.0.0.1:{args.port}/api/v3 "
+          f"({'replaying ' + args.replay if args.replay else f'{args.tickers} synthetic tickers'})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
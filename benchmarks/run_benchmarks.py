@@ -0,0 +1,300 @@
+import sys
+import os
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+
+import numpy as np
+import pandas as pd
+import nasdaqdatalink as ndl
+
+import create_comparison_table
+import create_stock_overview
+import src.metric_panel as metric_panel
+import src.percentile_index as percentile_index
+import src.universe_store as universe_store
+from screen_universe import SF1_COLUMNS
+from benchmarks.fake_sheet import RecordingSheet
+from benchmarks.fixtures import SyntheticSharadar
+from src.comparison_metrics import COMPARISON_METRICS, HISTORY_YEARS, compute_comparison_metrics
+from src.data_fetching import CACHE, configure_cache, get_tables_bulk
+from src.formatting_helpers import format_metrics
+from src.panel import load_panel, baseline_memory_usage
+from src.price_stats import price_stats
+from src.query_specs import PRICE_HISTORY_COLUMNS, sf1_query, sf2_query, sep_query
+from src.settings import BASE_DIR
+from src.sheet_writers import XlsxSheetWriter, XlwingsSheetWriter
+
+RESULTS_PATH = os.path.join(BASE_DIR, 'benchmarks', 'results.jsonl')
+
+RF = 0.04  # Fixed so nothing reaches Yahoo Finance
+BETA = 1.0
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BASE_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, dirty
+
+
+def timed(function, repeat):
+    """
+    Runs function repeat times and returns (its last result, {'min', 'median'} seconds).
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - start)
+    return result, {'min': min(seconds), 'median': statistics.median(seconds)}
+
+
+def recording_writer():
+    sheet = RecordingSheet()
+    return XlwingsSheetWriter(sheet), sheet.recorder
+
+
+def run(fixtures, compare_size, overviews, repeat, work_dir):
+    """
+    Times each stage of the report pipeline against the fixtures. Returns (timings, com_calls, memory).
+    """
+    stages = {}
+    com_calls = {}
+    memory = {}
+    tickers = fixtures.tickers
+    compare_tickers = tickers[:compare_size]
+    overview_tickers = tickers[:overviews]
+
+    def fetch_all():
+        get_tables_bulk('SHARADAR/SF1', tickers, **sf1_query(COMPARISON_METRICS, years=HISTORY_YEARS))
+        get_tables_bulk('SHARADAR/SF2', tickers, **sf2_query(years=1))
+        get_tables_bulk('SHARADAR/SEP', tickers, **sep_query())
+
+    # Fetch is stub query plus per-ticker split, with no cache in the way
+    configure_cache(enabled=False)
+    _, stages['fetch'] = timed(fetch_all, repeat)
+
+    # Everything after fetch reads from a warm in-memory cache, as a repeat report would
+    CACHE.directory = os.path.join(work_dir, 'cache')
+    configure_cache(enabled=True, memory_entries=10 * len(tickers))
+    fetch_all()
+    for ticker in overview_tickers:
+        create_stock_overview.grab_fundamental_data(ticker, rf=RF, beta=BETA)
+
+    def screen():
+        sf1, sf2, sep = (pd.concat(frames.values(), ignore_index=True) for frames in (
+            get_tables_bulk('SHARADAR/SF1', tickers, **sf1_query(COMPARISON_METRICS, years=HISTORY_YEARS)),
+            get_tables_bulk('SHARADAR/SF2', tickers, **sf2_query(years=1)),
+            get_tables_bulk('SHARADAR/SEP', tickers, **sep_query())))
+        return compute_comparison_metrics(sf1, sf2, sep)
+
+    universe, stages['compute_universe'] = timed(screen, repeat)
+
+    # The screen's SF1 load from the local store, the whole file against the compact panel of what it reads
+    fixtures.tables['SHARADAR/SF1'].to_parquet(universe_store.store_path('SHARADAR/SF1'), index=False)
+    naive, stages['load_sf1_naive'] = timed(lambda: universe_store.load_table('SHARADAR/SF1'), repeat)
+    panel, stages['load_sf1_panel'] = timed(
+        lambda: load_panel('SHARADAR/SF1', SF1_COLUMNS, filters=[('dimension', '==', 'ART')]), repeat)
+    # (ticker, period) lookups: boolean masks over the whole frame against a search within each ticker's slice
+    pairs = panel.data[['ticker', 'calendardate']].sample(200, random_state=0)
+    tickers, periods = pairs['ticker'].astype(str).tolist(), pairs['calendardate'].tolist()
+    _, stages['lookup_sf1_naive'] = timed(lambda: [np.flatnonzero((naive['ticker'] == ticker).to_numpy() & (naive['calendardate'] == period).to_numpy())
+                                                   for ticker, period in zip(tickers, periods)], repeat)
+    _, stages['lookup_sf1_panel'] = timed(lambda: panel.locate(tickers, periods), repeat)
+    memory['sf1_naive_mb'] = baseline_memory_usage('SHARADAR/SF1') / 1e6
+    memory['sf1_panel_mb'] = panel.memory_usage() / 1e6
+    del naive, panel
+
+    # Streaming price statistics over the whole SEP history, a chunk at a time
+    fixtures.tables['SHARADAR/SEP'].to_parquet(universe_store.store_path('SHARADAR/SEP'), index=False,
+                                               row_group_size=universe_store.CHUNK_ROWS)
+    stream = lambda: price_stats(universe_store.iter_table('SHARADAR/SEP', PRICE_HISTORY_COLUMNS))
+    _, stages['price_stats'] = timed(stream, repeat)
+    tracemalloc.start()
+    stream()
+    memory['price_stats_peak_mb'] = tracemalloc.get_traced_memory()[1] / 1e6  # numpy and Python allocations
+    tracemalloc.stop()
+
+    # Every report metric for the universe saved once, then attached to as a batch worker would
+    sep = fixtures.tables['SHARADAR/SEP']
+    latest_close = sep.sort_values('date').drop_duplicates('ticker', keep='last').set_index('ticker')['close']
+    panel_dir = os.path.join(work_dir, 'metric_panel')
+    build = lambda: metric_panel.save_metric_panel(
+        metric_panel.build_metric_panel(fixtures.tables['SHARADAR/SF1'], fixtures.tables['SHARADAR/SF2'], latest_close), panel_dir)
+    _, stages['metric_panel_build'] = timed(build, repeat)
+    shared, stages['metric_panel_attach'] = timed(lambda: metric_panel.open_metric_panel(panel_dir), repeat)
+    memory['metric_panel_mb'] = shared.values.nbytes / 1e6
+
+    def build_index():
+        index, ticker_groups = percentile_index.build_index(universe, fixtures.tables['SHARADAR/TICKERS'].set_index('ticker'))
+        percentile_index.save_index(index, ticker_groups)
+
+    _, stages['percentile_index'] = timed(build_index, repeat)
+
+    comparison, stages['grab_data'] = timed(lambda: create_comparison_table.grab_data(compare_tickers), repeat)
+    # --prices-only: SF1 from the warm cache, latest closes re-fetched through the stub every run
+    _, stages['grab_prices'] = timed(lambda: create_comparison_table.grab_prices(compare_tickers), repeat)
+
+    overview_results, stages['grab_fundamental_data'] = timed(
+        lambda: [create_stock_overview.grab_fundamental_data(ticker, rf=RF, beta=BETA) for ticker in overview_tickers],
+        repeat
+    )
+    stages['grab_fundamental_data'] = {key: value / len(overview_tickers) for key, value in stages['grab_fundamental_data'].items()}
+    metrics, wacc = overview_results[0]
+
+    _, stages['panel_fundamental_data'] = timed(
+        lambda: [create_stock_overview.panel_fundamental_data(shared, ticker, rf=RF, beta=BETA) for ticker in overview_tickers],
+        repeat
+    )
+    stages['panel_fundamental_data'] = {key: value / len(overview_tickers) for key, value in stages['panel_fundamental_data'].items()}
+
+    def format_comparison():
+        writer, recorder = recording_writer()
+        for col, metric in enumerate(comparison.columns):
+            format_metrics(writer, 5, 7 + col, comparison[metric].to_numpy(), metric, horizontal=False,
+                           cutpoints=percentile_index.peer_cutpoints(metric, compare_tickers))
+        return recorder.total
+
+    com_calls['format_metrics'], stages['format_metrics'] = timed(format_comparison, repeat)
+
+    def write_comparison(writer):
+        create_comparison_table.write_to_excel(writer, comparison, {'synthetic': compare_tickers})
+        writer.close()
+
+    # Both writers close the sheet, which is when the xlsx backend does its work
+    writers = {
+        'write_overview': lambda writer: create_stock_overview.write_overview(writer, overview_tickers[0], metrics, wacc),
+        'write_comparison': write_comparison,
+    }
+    for name, write in writers.items():
+        def write_xlwings():
+            writer, recorder = recording_writer()
+            write(writer)
+            return recorder.total
+
+        def write_xlsx():
+            write(XlsxSheetWriter(os.path.join(work_dir, f"{name}.xlsx")))
+
+        com_calls[name], stages[f"{name}_xlwings"] = timed(write_xlwings, repeat)
+        _, stages[f"{name}_xlsx"] = timed(write_xlsx, repeat)
+
+    return stages, com_calls, memory
+
+
+def load_results(path=RESULTS_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def report(result, previous, threshold):
+    """
+    Prints each stage against the last run at the same scale. Returns the stages that slowed past threshold.
+    """
+    regressions = []
+    print(f"\n{'stage':<28}{'median':>11}{'min':>11}{'previous':>11}{'change':>9}  COM calls")
+    for stage, seconds in result['stages'].items():
+        line = f"{stage:<28}{seconds['median'] * 1000:>9.1f}ms{seconds['min'] * 1000:>9.1f}ms"
+        before = previous['stages'].get(stage) if previous else None
+        if before:
+            change = seconds['min'] / before['min'] - 1
+            line += f"{before['min'] * 1000:>9.1f}ms{change:>+9.0%}"
+            if change > threshold:
+                regressions.append(stage)
+                line += '  SLOWER'
+        else:
+            line += ' ' * 20
+        calls = result['com_calls'].get(stage.removesuffix('_xlwings'))
+        if calls is not None and not stage.endswith('_xlsx'):
+            line += f"  {calls:,}"
+        print(line)
+
+    memory = result['memory']
+    print(f"\nSF1 in memory: {memory['sf1_naive_mb']:,.1f} MB full load (strings as objects), {memory['sf1_panel_mb']:,.1f} MB panel "
+          f"({memory['sf1_naive_mb'] / memory['sf1_panel_mb']:.1f}x smaller)")
+    print(f"Streaming price statistics peak: {memory['price_stats_peak_mb']:,.1f} MB")
+    print(f"Metric panel: {memory['metric_panel_mb']:,.1f} MB memory-mapped, one copy however many workers attach")
+
+    if previous:
+        print(f"\nCompared with {previous['commit']}{' (dirty)' if previous['dirty'] else ''} from {previous['timestamp']}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time each stage of the report pipeline against synthetic Sharadar data.")
+    parser.add_argument('--tickers', type=int, default=500, help="Tickers in the synthetic universe")
+    parser.add_argument('--years', type=int, default=12, help="Years of quarterly SF1 rows per ticker")
+    parser.add_argument('--days', type=int, default=756, help="Business days of SEP prices per ticker")
+    parser.add_argument('--compare-size', type=int, default=20, help="Tickers in the comparison table")
+    parser.add_argument('--overviews', type=int, default=10, help="Overviews to time, reported per overview")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per stage, the minimum is compared")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--threshold', type=float, default=0.2, help="Slowdown against the previous run flagged as a regression")
+    parser.add_argument('--no-save', action='store_true', help="Don't append this run to benchmarks/results.jsonl")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    scale = {'tickers': args.tickers, 'years': args.years, 'days': args.days,
+             'compare_size': args.compare_size, 'overviews': args.overviews}
+
+    start = time.perf_counter()
+    fixtures = SyntheticSharadar(args.tickers, args.years, args.days, seed=args.seed)
+    rows = fixtures.rows()
+    print(f"Synthetic data: {', '.join(f'{code} {count:,}' for code, count in rows.items())} rows "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    ndl.get_table = fixtures.get_table
+    ndl.Datatable = fixtures.datatable
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Reports colour against an index of the synthetic universe, never the one in the real store
+        percentile_index.INDEX_PATH = os.path.join(work_dir, 'percentile_index.parquet')
+        percentile_index.GROUPS_PATH = os.path.join(work_dir, 'percentile_groups.parquet')
+        universe_store.STORE_DIR = work_dir
+        stages, com_calls, memory = run(fixtures, args.compare_size, args.overviews, args.repeat, work_dir)
+
+    commit, dirty = git_revision()
+    result = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'scale': scale,
+        'stages': stages,
+        'com_calls': com_calls,
+        'memory': memory,
+    }
+
+    previous = [past for past in load_results() if past['scale'] == scale]
+    regressions = report(result, previous[-1] if previous else None, args.threshold)
+
+    if not args.no_save:
+        with open(RESULTS_PATH, 'a') as f:
+            f.write(json.dumps(result) + '\n')
+
+    if regressions:
+        print(f"{len(regressions)} stage(s) more than {args.threshold:.0%} slower: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,28 +1,22 @@
 import sys
 import os
-import numpy as np
+import argparse
 import pandas as pd
-import nasdaqdatalink as ndl
-import xlwings as xw
-import json
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.formatting_helpers import format_metrics
+from src.formatting_helpers import format_metrics, cell_address, range_address, to_cell_value
+from src.percentile_index import peer_cutpoints
+from src.profiling import PROFILE, profile_writer
+from src.sheet_writers import open_writer
+from src.settings import CONFIG, configure_api_key
+from src.data_fetching import get_tables_bulk, get_tables_many, configure_cache
+from src.query_specs import sf1_query, sf2_query, sep_query
+from src.comparison_metrics import COMPARISON_METRICS, PRICE_METRICS, HISTORY_YEARS, compute_comparison_metrics
+from src.metric_panel import PANEL_DIR, open_metric_panel
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-API_KEY_PATH = os.path.join(BASE_DIR, 'api_key.json')
-CONFIG_PATH = os.path.join(BASE_DIR, 'config.json')
-
-with open(API_KEY_PATH) as f:
-    config = json.load(f)
-    API_KEY = config['api_key']
-
-with open(CONFIG_PATH, 'r') as f:
-    config = json.load(f)
-
-METRIC_GROUPS = config['metric_groups']
-COLORS = config['colors']
+METRIC_GROUPS = CONFIG['metric_groups']
+COLORS = CONFIG['colors']
 
 DARK_GREEN = COLORS['DARK_GREEN']
 MED_GREEN = COLORS['MED_GREEN']
@@ -32,150 +26,84 @@ MED_RED = COLORS['MED_RED']
 LIGHT_RED = COLORS['LIGHT_RED']
 YELLOW = COLORS['YELLOW']
 
-ndl.ApiConfig.api_key = API_KEY
-
-
-def calculate_cagr(values):
-    start_value = values[0]
-    end_value = values[-1]
-    n_years = len(values) - 1
-    
-    return ((end_value / start_value) ** (1/n_years) - 1)
-    
-def grab_data(tickers):  
-    all_metrics = {}
-    for ticker in tickers:
-        metrics = {}
-        data = ndl.get_table('SHARADAR/SF1', ticker=ticker, paginate=True)
-        
-        data = data[data['dimension'] == 'ART']  # As Reported, Trailing Twelve Months (TTM)
-        ltm = data.iloc[0:1]
-        data = data[data['fiscalperiod'].str.contains('Q4')].copy()
-
-        if data['fiscalperiod'].duplicated().any():
-            data = data.sort_values('calendardate', ascending=False).drop_duplicates('fiscalperiod').sort_index()
-
-        data['calendardate'] = pd.to_datetime(data['calendardate'])
-        data['year'] = data['calendardate'].dt.year
-        ltm['calendardate'] = pd.to_datetime(ltm['calendardate'])
-        ltm['year'] = 'LTM'
-
-        data = data.sort_values('year').reset_index(drop=True)
-        data = pd.concat([data, ltm]).tail(4)
 
-        if len(data) >= 2:
-            previous_shares = data['sharesbas'].iloc[-2]
-            current_shares = data['sharesbas'].iloc[-1]
-            bb_yield = (previous_shares - current_shares) / previous_shares
-        else:
-            bb_yield = np.nan
-
-
-        sf2_data = ndl.get_table('SHARADAR/SF2', ticker=ticker, paginate=True)
-        sf2_data['transactiondate'] = pd.to_datetime(sf2_data['transactiondate'])
-        insider_buys = sf2_data[sf2_data['transactioncode'] == 'P']
-
-        end_date = pd.to_datetime(sf2_data['transactiondate'].max())
-        start_date = end_date - pd.DateOffset(months=12)
-
-        insider_buys_count = insider_buys[
-            (insider_buys['transactiondate'] > start_date) & 
-            (insider_buys['transactiondate'] <= end_date)
-        ].shape[0]
-
-        sep_data = ndl.get_table('SHARADAR/SEP', ticker=ticker, paginate=True)
-        sep_data['date'] = pd.to_datetime(sep_data['date'])
-        latest_share_price = sep_data.sort_values('date').iloc[-1]['close']
-        current_shares_outstanding = data['sharesbas'].iloc[-1] * data['sharefactor'].iloc[-1]
-        current_market_cap = latest_share_price * current_shares_outstanding
+def grab_data(tickers, panel=None):  
+    tickers = list(dict.fromkeys(tickers))
+    if panel is not None:
+        # LTM rows of the metric panel, as of the day it was built
+        return panel.ltm(tickers, COMPARISON_METRICS).round(2)
 
-        fx_conv_ltm = ltm['fxusd'].iloc[0]
-        new_ev = current_market_cap + ((ltm['debt'].iloc[0] - ltm['cashneq'].iloc[0]) / fx_conv_ltm)
+    # One query per table for the whole ticker list, only the columns and date ranges the metrics need
+    sf1_by_ticker, sf2_by_ticker, sep_by_ticker = get_tables_many([
+        ('SHARADAR/SF1', tickers, sf1_query(COMPARISON_METRICS, years=HISTORY_YEARS)),
+        ('SHARADAR/SF2', tickers, sf2_query(years=1)),
+        ('SHARADAR/SEP', tickers, sep_query()),
+    ])
 
-        if np.isnan(data['ebitda'].iloc[-1]): # LTM EBITDA is nan for Chinese stocks
-            ltm_ebitda = data['ebitda'].iloc[-2]
-        else:
-            ltm_ebitda = data['ebitda'].iloc[-1]
-            
-        # Valuation Metrics
-        metrics['TEV'] = new_ev / 1_000_000
-        metrics['SP'] = latest_share_price
-        metrics['TEV/EBITDA'] = new_ev / (ltm_ebitda / fx_conv_ltm)
-        metrics['TEV/Rev'] = new_ev / (ltm['revenue'].iloc[0] / fx_conv_ltm)
-        metrics['TEV/FCF'] = new_ev / (ltm['fcf'].iloc[0] / fx_conv_ltm)
-        metrics['P/E'] = current_market_cap / (ltm['netinc'].iloc[0] / fx_conv_ltm)
-        metrics['P/B'] = current_market_cap / (ltm['equity'].iloc[0] / fx_conv_ltm)
-        metrics['EPS'] = ltm['eps'] / fx_conv_ltm
-
-        # Income Statement
-        metrics['Rev'] = (ltm['revenue'] / fx_conv_ltm) / 1_000_000
-        metrics['Rev 3YCAGR'] = calculate_cagr((data['revenue'] / data['fxusd']).values)
-
-        # Margins
-        metrics['GP Marg'] = ltm['grossmargin']
-        metrics['EBITDA Marg'] = ltm['ebitdamargin']
-        metrics['Net Marg'] = ltm['netmargin']
-        metrics['Op Marg'] = ltm['opinc'] / ltm['revenue']
-        metrics['FCF Marg'] = ltm['fcf'] / ltm['revenue']
-
-        # Shareholder Yield
-        metrics['Div Yield'] = data['divyield']
-        metrics['BB Yield'] = bb_yield
-        metrics['Ins Buys'] = insider_buys_count
-
-        # Solvency
-        metrics['D/E'] = ltm['debt'] / ltm['equity']
-        metrics['Debt/EBITDA'] = ltm['debt'] / ltm['ebitda']
-        metrics['Cash Ratio'] = ltm['cashneq'] / ltm['liabilitiesc']
-        metrics['Cash/Debt'] = ltm['cashneq'] / ltm['debt']
-        metrics['Int Cov'] = ltm['ebit'] / ltm['intexp']
-
-        # Liquidity
-        metrics['Curr Ratio'] = ltm['currentratio']
-        metrics['Quick Ratio'] = (ltm['assetsc'] - ltm['inventory']) / ltm['liabilitiesc']
-
-        # Efficiency
-        metrics['WC Turn'] = ltm['revenue'] / (ltm['assetsc'] - ltm['liabilitiesc'])
-        metrics['Asset Turn'] = ltm['assetturnover']
-
-        # Profitability
-        metrics['ROA'] = ltm['roa']
-        metrics['ROE'] = ltm['roe']
-        metrics['ROIC'] = ltm['roic']
-
-        metrics = {k: float(v.iloc[0]) if isinstance(v, pd.Series) else v for k, v in metrics.items()}
-        all_metrics[ticker] = metrics
-    
-    metrics_df = pd.DataFrame(all_metrics).T
-    metrics_df = metrics_df.replace([np.inf, -np.inf], np.nan)
+    metrics_df = compute_comparison_metrics(
+        pd.concat(sf1_by_ticker.values(), ignore_index=True),
+        pd.concat(sf2_by_ticker.values(), ignore_index=True),
+        pd.concat(sep_by_ticker.values(), ignore_index=True)
+    )
     
-    return metrics_df.round(2)
+    return metrics_df.reindex(tickers)
+
+
+def grab_prices(tickers):
+    """
+    PRICE_METRICS only, from the cached SF1 query of grab_data and the latest closes fetched fresh in one bulk call.
+    Skips SF2 and any price history, so an intraday refresh costs one SEP request per chunk of tickers.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    sf1_by_ticker = get_tables_bulk('SHARADAR/SF1', tickers, **sf1_query(COMPARISON_METRICS, years=HISTORY_YEARS))
+    sep_by_ticker = get_tables_bulk('SHARADAR/SEP', tickers, refresh=True, **sep_query())
+
+    metrics_df = compute_comparison_metrics(
+        pd.concat(sf1_by_ticker.values(), ignore_index=True),
+        None,
+        pd.concat(sep_by_ticker.values(), ignore_index=True),
+        metrics=PRICE_METRICS
+    )
+    return metrics_df.reindex(tickers)
 
 
-def apply_conditional_formatting(sheet, metrics_df, start_row, start_col):
+def apply_conditional_formatting(writer, metrics_df, start_row, start_col):
+    tickers = list(metrics_df.index)
     for col_idx, metric_name in enumerate(metrics_df.columns):            
         current_col = start_col + 2 + col_idx
-        data_range = sheet.range(
-            sheet.cells(start_row + 1, current_col), # Skip header row
-            sheet.cells(start_row + len(metrics_df.index), current_col)
-        )
-        
         metric_values = metrics_df[metric_name].values
         
-        format_metrics(data_range, metric_values, metric_name)
-
-
-def write_to_excel(sheet, metrics_df, companies_dict, start_row=4, start_col=5):
-    sheet.range((1, 1), (1, sheet.api.Columns.Count)).color = (185, 216, 72)
-    sheet.range((2, 1), (3, sheet.api.Columns.Count)).color = (0, 201, 192)
-    
-    sheet.cells(start_row, start_col).value = "Ticker"
-    sheet.cells(start_row, start_col + 1).value = "Sector"
+        # Skip header row, colour down the column, each ticker against its peers in the universe index if built
+        format_metrics(writer, start_row + 1, current_col, metric_values, metric_name, horizontal=False,
+                       cutpoints=peer_cutpoints(metric_name, tickers))
+
+
+def number_format_for(metric_name):
+    if 'Marg' in metric_name or 'Yield' in metric_name or 'CAGR' in metric_name:
+        return "0%"
+    if 'Ratio' in metric_name or '/' in metric_name or \
+    metric_name in ['ROA', 'ROE', 'ROIC', 'WC Turn', 'Asset Turn', 'EPS', 'SP']:
+        return "0.00"
+    return "#,##0"
+
+
+def write_to_excel(writer, metrics_df, companies_dict, start_row=4, start_col=5):
+    writer.fill_rows(1, 1, (185, 216, 72))
+    writer.fill_rows(2, 3, (0, 201, 192))
+
+    # One row per listed company, in sheet order (a ticker may appear under several sectors)
+    rows = [(company, sector) for sector, companies in companies_dict.items() for company in companies]
+    sheet_metrics = metrics_df.reindex([company for company, _ in rows])
+
+    headers = ["Ticker", "Sector"] + list(metrics_df.columns)
+    body = [
+        [company, sector] + [to_cell_value(value) for value in values]
+        for (company, sector), values in zip(rows, sheet_metrics.values.tolist())
+    ]
+    writer.write_values(start_row, start_col, [headers] + body)
     
+    comments = []
     for col_num, metric in enumerate(metrics_df.columns, start=start_col + 2):
-        cell = sheet.cells(start_row, col_num)
-        cell.value = metric
-
         description = None
         for group in METRIC_GROUPS:
             if metric in group['metrics']:
@@ -184,53 +112,65 @@ def write_to_excel(sheet, metrics_df, companies_dict, start_row=4, start_col=5):
         
         if not description:
             raise ValueError(f"Could not find description for metric {metric}")
-        if cell.api.Comment is not None:
-            cell.api.Comment.Delete()
-        cell.api.AddComment(description)
-        cell.api.Comment.Visible = False
-
-    current_row = start_row + 1
+        comments.append((start_row, col_num, description))
+    writer.add_comments(comments)
+
+    current_row = start_row + 1 + len(rows)
+    last_col = start_col + len(metrics_df.columns) + 1
+
+    # Number formats are set per column, one call per distinct format
+    formats = {}
+    if rows:
+        for col_num, metric_name in enumerate(metrics_df.columns, start=start_col + 2):
+            address = range_address(start_row + 1, col_num, current_row - 1, col_num)
+            formats.setdefault(number_format_for(metric_name), []).append(address)
+    writer.set_number_formats(formats)
+
+    writer.add_table(range_address(start_row, start_col, current_row - 1, last_col), "TableStyleLight1")
+    writer.fill([range_address(start_row, start_col, start_row, last_col)], (180, 180, 180))  # Dark grey
     
-    for sector, companies in companies_dict.items():
-        for company in companies:
-            sheet.cells(current_row, start_col).value = company
-            sheet.cells(current_row, start_col + 1).value = sector
-            
-            if company in metrics_df.index:
-                for col_num, value in enumerate(metrics_df.loc[company], start=start_col + 2):
-                    cell = sheet.cells(current_row, col_num)
-                    cell.value = value
-
-                    metric_name = metrics_df.columns[col_num - (start_col + 2)]
-                    
-                    # Apply formatting based on metric type
-                    if 'Marg' in metric_name or 'Yield' in metric_name or 'CAGR' in metric_name:
-                        cell.api.NumberFormat = "0%"
-                    elif 'Ratio' in metric_name or '/' in metric_name or \
-                    metric_name in ['ROA', 'ROE', 'ROIC', 'WC Turn', 'Asset Turn', 'EPS', 'SP']:
-                        cell.api.NumberFormat = "0.00"
-                    elif isinstance(value, (int, float)):
-                        cell.api.NumberFormat = "#,##0"
-
-            current_row += 1
-
-    table_range = sheet.range(
-        sheet.cells(start_row, start_col),
-        sheet.cells(current_row - 1, start_col + len(metrics_df.columns) + 1)
-    )
-
-    table = sheet.api.ListObjects.Add(1, table_range.api.Address, 0, 1)
-    table.TableStyle = "TableStyleLight1"
-    table_range.rows[0].color = (180, 180, 180)  # Dark grey
-    
-    for col in range(start_col, start_col + len(metrics_df.columns) + 2):
-        sheet.api.Columns(col).AutoFit()
-    
-    sheet.api.Application.ActiveWindow.SplitRow = start_row
-    sheet.api.Application.ActiveWindow.SplitColumn = start_col
-    sheet.api.Application.ActiveWindow.FreezePanes = True
+    writer.autofit_columns(start_col, last_col)
+    writer.freeze_panes(start_row, start_col)
+
+    with PROFILE.stage('conditional formatting'):
+        apply_conditional_formatting(writer, sheet_metrics, start_row, start_col)
+
+
+def refresh_prices(writer, metrics_df, row_count, start_row=4, start_col=5):
+    """
+    Rewrites the columns of metrics_df in a comparison table already in the sheet and recolours them, leaving
+    every other cell alone. Columns are found by header and rows by ticker, so a table sorted in Excel still lines up.
+    """
+    last_col = start_col + 1 + len(COMPARISON_METRICS)
+    headers = writer.read_values(range_address(start_row, start_col, start_row, last_col))[0]
+    sheet_tickers = [row[0] for row in writer.read_values(range_address(start_row + 1, start_col, start_row + row_count, start_col))]
+    if headers[:2] != ["Ticker", "Sector"] or not set(metrics_df.columns) <= set(headers) or \
+    not set(sheet_tickers) <= set(metrics_df.index):
+        raise ValueError(f"No comparison table of these companies at {cell_address(start_row, start_col)}, "
+                         f"write it once without --prices-only")
+
+    sheet_metrics = metrics_df.reindex(sheet_tickers)
+    columns = sorted(start_col + headers.index(metric) for metric in metrics_df.columns)
+
+    # Adjacent columns go out as one block, the valuation metrics lead the table so usually one write in all
+    blocks = []
+    for col in columns:
+        if blocks and col == blocks[-1][1] + 1:
+            blocks[-1][1] = col
+        else:
+            blocks.append([col, col])
+    for first_col, block_last_col in blocks:
+        block = sheet_metrics[headers[first_col - start_col:block_last_col - start_col + 1]]
+        writer.write_values(start_row + 1, first_col, [[to_cell_value(value) for value in values] for values in block.values.tolist()])
 
-    apply_conditional_formatting(sheet, metrics_df, start_row, start_col)
+    # Colours from the old prices come off before the new buckets are painted
+    writer.clear_fill([range_address(start_row + 1, first_col, start_row + row_count, block_last_col)
+                       for first_col, block_last_col in blocks])
+    with PROFILE.stage('conditional formatting'):
+        for col in columns:
+            metric_name = headers[col - start_col]
+            format_metrics(writer, start_row + 1, col, sheet_metrics[metric_name].values, metric_name, horizontal=False,
+                           cutpoints=peer_cutpoints(metric_name, sheet_tickers))
 
 
 def api_test():
@@ -238,16 +178,35 @@ def api_test():
     metrics = grab_data(tickers)
     print(metrics)
 
-def main():
-    _ = sys.argv[1] # spreadsheet path
-    company_string = sys.argv[2]
-    
-    items = company_string.split(',')
-    
+def parse_args():
+    parser = argparse.ArgumentParser(description="Write a comparison table for a list of tickers to Excel.")
+    parser.add_argument('spreadsheet', help="Path to the Excel workbook (written to when using the xlsx backend)")
+    parser.add_argument('companies', help="Comma-separated tickers, optionally grouped under lowercase sector names")
+    parser.add_argument('--metric-panel', nargs='?', const=PANEL_DIR, metavar='DIR',
+                        help="Read metrics from the metric panel saved by screen_universe.py --metric-panel instead of fetching")
+    parser.add_argument('--no-cache', action='store_true', help="Bypass the local data cache")
+    parser.add_argument('--refresh', action='store_true', help="Re-fetch all data and overwrite the cached copies")
+    parser.add_argument('--backend', choices=['excel', 'xlsx'], default='excel',
+                        help="'excel' writes to the active workbook via xlwings, 'xlsx' writes the file directly without Excel")
+    parser.add_argument('--prices-only', action='store_true',
+                        help="Only refresh the price-dependent columns of the table already in the open workbook")
+    parser.add_argument('--profile', metavar='PATH', help="Write per-stage timings and counters as JSON to PATH")
+    parser.add_argument('--cprofile-stage', metavar='STAGE', help="Also dump cProfile stats for one stage to PATH.prof, e.g. 'compute metrics'")
+    args = parser.parse_args()
+    if args.prices_only and args.backend != 'excel':
+        parser.error("--prices-only updates the open workbook in place, so it needs the excel backend")
+    if args.prices_only and args.metric_panel:
+        parser.error("--prices-only fetches the latest prices, it can't be combined with --metric-panel")
+    return args
+
+def parse_companies(companies):
+    """
+    'tech,NVDA,AMD,retail,WMT' -> ({'tech': ['NVDA', 'AMD'], 'retail': ['WMT']}, ['NVDA', 'AMD', 'WMT'])
+    """
     companies_dict = {}
     current_sector = None
     tickers = []
-    for item in items:
+    for item in companies.split(','):
         if any(c.islower() for c in item): # Sector name
             current_sector = item
             companies_dict[current_sector] = []
@@ -255,15 +214,51 @@ def main():
             tickers.append(item)
             if current_sector:
                 companies_dict[current_sector].append(item)
-    
-    metrics = grab_data(tickers)
-    
-    wb = xw.books.active
-    sheet = wb.sheets.active
-    write_to_excel(sheet, metrics, companies_dict, start_row=4, start_col=5)
-    header_cell = sheet.cells(1, 5)
-    header_cell.value = "RK Tracker"
-    header_cell.api.Font.Size = 20
+    return companies_dict, tickers
+
+
+def create_comparison(companies, spreadsheet, backend='excel', panel=None, prices_only=False):
+    """
+    Fetches, computes and writes a full comparison table. Shared by the CLI and the report server.
+    Pass a metric panel from open_metric_panel to read the metrics from it instead, or prices_only
+    to refresh just the valuation columns of the table already in the sheet.
+    """
+    companies_dict, tickers = parse_companies(companies)
+    if prices_only:
+        with PROFILE.stage('compute metrics'):
+            metrics = grab_prices(tickers)
+        with PROFILE.stage('write sheet'):
+            writer = profile_writer(open_writer(backend, spreadsheet))
+            refresh_prices(writer, metrics, sum(len(companies) for companies in companies_dict.values()))
+            writer.close()
+        return
+
+    with PROFILE.stage('compute metrics'):
+        metrics = grab_data(tickers, panel)
+
+    with PROFILE.stage('write sheet'):
+        writer = profile_writer(open_writer(backend, spreadsheet))
+        write_to_excel(writer, metrics, companies_dict, start_row=4, start_col=5)
+        writer.write_values(1, 5, [["RK Tracker"]])
+        writer.set_font_size(1, 5, 20)
+        writer.close()
+
+
+def main():
+    args = parse_args()
+    configure_api_key()
+    configure_cache(enabled=not args.no_cache, refresh=args.refresh)
+    if args.profile:
+        PROFILE.enable(args.cprofile_stage)
+
+    panel = open_metric_panel(args.metric_panel) if args.metric_panel else None
+    create_comparison(args.companies, args.spreadsheet, args.backend, panel, args.prices_only)
+
+    if args.profile:
+        PROFILE.write(args.profile, companies=args.companies, backend=args.backend)
+        print(PROFILE.summary())
+        print(f"Profile written to {args.profile}")
 
 
-main()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,123 @@
+import sys
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from create_stock_overview import grab_fundamental_data, panel_fundamental_data, write_overview
+from src.data_fetching import configure_cache, configure_rate_limit
+from src.market_data import fetch_risk_free_rate, fetch_betas, DEFAULT_BETA
+from src.metric_panel import PANEL_DIR, open_metric_panel
+from src.sheet_writers import open_writer
+from src.settings import configure_api_key
+
+
+def read_tickers(path):
+    # One or more tickers per line, separated by commas or whitespace; '#' starts a comment
+    tickers = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#')[0]
+            tickers += [ticker.strip().upper() for ticker in line.replace(',', ' ').split()]
+    return list(dict.fromkeys(tickers))
+
+
+PANEL = None  # Set in each worker when overviews are read from the metric panel
+
+
+def init_worker(cache_enabled, refresh, workers, panel_dir=None):
+    global PANEL
+    configure_api_key()
+    configure_cache(enabled=cache_enabled, refresh=refresh)
+    configure_rate_limit(workers)  # Each worker has its own limiter, together they keep to the one quota
+    if panel_dir is not None:
+        PANEL = open_metric_panel(panel_dir)  # Memory-mapped, every worker shares the one copy
+
+
+def build_overview(ticker, rf, beta, output_dir, backend):
+    """
+    Runs in a worker process. With the xlsx backend the workbook is written here too, otherwise the
+    metrics are returned for the parent process to write into Excel.
+    """
+    start = time.perf_counter()
+    try:
+        if PANEL is not None:
+            metrics, wacc = panel_fundamental_data(PANEL, ticker, rf=rf, beta=beta)
+        else:
+            metrics, wacc = grab_fundamental_data(ticker, rf=rf, beta=beta)
+        if backend == 'xlsx':
+            writer = open_writer('xlsx', os.path.join(output_dir, f"{ticker}_overview.xlsx"))
+            write_overview(writer, ticker, metrics, wacc)
+            metrics = None
+        return ticker, metrics, wacc, time.perf_counter() - start, None
+    except Exception as e:
+        return ticker, None, None, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate stock overviews for every ticker in a watchlist file.")
+    parser.add_argument('output', help="Output directory for the xlsx backend (ignored by the Excel backend)")
+    parser.add_argument('ticker_file', help="Watchlist file with tickers separated by newlines or commas")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument('--backend', choices=['excel', 'xlsx'], default='xlsx',
+                        help="'xlsx' writes one workbook per ticker, 'excel' adds one sheet per ticker to the active workbook")
+    parser.add_argument('--metric-panel', nargs='?', const=PANEL_DIR, metavar='DIR',
+                        help="Read metrics from the metric panel saved by screen_universe.py --metric-panel instead of fetching")
+    parser.add_argument('--no-cache', action='store_true', help="Bypass the local data cache")
+    parser.add_argument('--refresh', action='store_true', help="Re-fetch all data and overwrite the cached copies")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure_api_key()
+    configure_cache(enabled=not args.no_cache, refresh=args.refresh)
+    tickers = read_tickers(args.ticker_file)
+    if args.backend == 'xlsx':
+        os.makedirs(args.output, exist_ok=True)
+
+    batch_start = time.perf_counter()
+    if args.metric_panel:
+        panel = open_metric_panel(args.metric_panel)  # Fails here rather than in every worker if there is none
+        print(f"Metric panel of {len(panel.tickers):,} tickers as of {panel.as_of:%Y-%m-%d}", flush=True)
+    rf = fetch_risk_free_rate()  # Shared by every ticker in the batch
+    betas = fetch_betas(tickers).fillna(DEFAULT_BETA)  # One regression over the whole watchlist
+    timings = {}
+    failures = {}
+
+    workers = max(1, min(args.workers, len(tickers)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(not args.no_cache, args.refresh, workers, args.metric_panel)) as pool:
+        futures = [pool.submit(build_overview, ticker, rf, betas[ticker], args.output, args.backend) for ticker in tickers]
+
+        for future in as_completed(futures):
+            ticker, metrics, wacc, seconds, error = future.result()
+            if error is None and metrics is not None:
+                # Excel is driven over COM from this process only, one sheet per ticker
+                write_start = time.perf_counter()
+                try:
+                    write_overview(open_writer('excel', sheet_name=ticker), ticker, metrics, wacc)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                seconds += time.perf_counter() - write_start
+
+            timings[ticker] = seconds
+            if error is not None:
+                failures[ticker] = error
+            print(f"{ticker:<8} {seconds:7.2f}s  {'FAILED' if error else 'ok'}", flush=True)
+
+    print(f"\n{len(tickers) - len(failures)}/{len(tickers)} overviews written in {time.perf_counter() - batch_start:.1f}s")
+    if timings:
+        slowest = max(timings, key=timings.get)
+        print(f"Mean {sum(timings.values()) / len(timings):.2f}s per ticker, slowest {slowest} ({timings[slowest]:.2f}s)")
+    for ticker, error in failures.items():
+        print(f"  {ticker}: {error}")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,29 +1,27 @@
 import sys
 import os
-import json
+import argparse
 import numpy as np
 import pandas as pd
-import nasdaqdatalink as ndl
-import xlwings as xw
-import yfinance as yf
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.formatting_helpers import format_metrics
-
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-API_KEY_PATH = os.path.join(BASE_DIR, 'api_key.json')
-CONFIG_PATH = os.path.join(BASE_DIR, 'config.json')
-
-with open(API_KEY_PATH) as f:
-    config = json.load(f)
-    API_KEY = config['api_key']
-
-with open(CONFIG_PATH, 'r') as f:
-    config = json.load(f)
-
-METRIC_GROUPS = config['metric_groups']
-COLORS = config['colors']
+from src.formatting_helpers import format_metrics, cell_address, range_address, to_cell_value
+from src.percentile_index import peer_cutpoints
+from src.profiling import PROFILE, profile_writer
+from src.sheet_writers import open_writer
+from src.settings import CONFIG, configure_api_key
+from src.data_fetching import get_table, configure_cache
+from src.query_specs import sf1_query, sf2_query, sep_query
+from src.market_data import fetch_risk_free_rate, fetch_beta
+from src.event_windows import EventWindows
+from src.growth import max_horizon, parse_cagr_metric
+from src.metric_engine import evaluate_metrics
+from src.monte_carlo import simulate_overview, PATHS as MC_PATHS, SEED as MC_SEED
+from src.dcf import wacc, sensitivity_grid, GROWTH, TERMINAL_GROWTH, EXPLICIT_YEARS, TERMINAL_YEARS, GRID_GROWTH, GRID_TERMINAL_GROWTH
+
+METRIC_GROUPS = CONFIG['metric_groups']
+COLORS = CONFIG['colors']
 
 DARK_GREEN = COLORS['DARK_GREEN']
 MED_GREEN = COLORS['MED_GREEN']
@@ -33,55 +31,47 @@ MED_RED = COLORS['MED_RED']
 LIGHT_RED = COLORS['LIGHT_RED']
 YELLOW = COLORS['YELLOW']
 
-MARKET_RETURN = 0.08
+MAX_YEARS_FOR_DATA = 15
+OVERVIEW_METRICS = [metric for group in METRIC_GROUPS for metric in group['metrics']]
+# Extra years feed the longest CAGR and year-over-year changes
+HISTORY_YEARS = MAX_YEARS_FOR_DATA + max_horizon(OVERVIEW_METRICS, default=3) + 1
 
-ndl.ApiConfig.api_key = API_KEY
+PERCENTAGE_METRICS = [
+    'GP Marg', 'EBITDA Marg', 'Net Marg', 'Op Marg', 'FCF Marg',
+    'Div Yield', 'BB Yield', 'Rev 3YCAGR',
+    'R&D/Rev', 'SG&A/Rev', 'SBC/Rev',
+    'ROA', 'ROE', 'ROIC'
+]
 
-def calculate_rolling_cagr(values):
-    cagr = pd.Series(index=values.index)
-    
-    for i in range(3, len(values)):
-        end_value = values.iloc[i]
-        start_value = values.iloc[i-3]
-        cagr.iloc[i] = (end_value / start_value) ** (1/3) - 1
-                
-    return cagr
-
-
-def fetch_beta_and_rf(ticker):
-    stock = yf.Ticker(ticker)
-    beta = stock.info.get('beta', 1.0)
-    treasury = yf.Ticker('^TNX')  # 10Y Treasury yield
-    rf = treasury.history(period='1d')['Close'].iloc[-1] / 100
-
-    if np.isnan(beta) or np.isnan(rf):
-        raise ValueError(f"Failed to fetch beta or risk-free rate for {ticker}")
-    
-    return beta, rf
+DECIMAL_METRICS = [
+    'Curr Ratio', 'Quick Ratio', 'D/E', 'Debt/EBITDA', 'Cash Ratio', 'Cash/Debt',
+    'Int Cov', 'WC Turn', 'Asset Turn', 'Recv Turn', 'Inv Turn', 'EPS', 'NI to CFO',
+    'TEV/EBITDA', 'TEV/Rev', 'TEV/FCF', 'P/E', 'P/B', 'SP'
+]
 
+WHOLE_NUMBER_METRICS = ['DSO', 'DIO', 'DPO', 'Cash Cycle', 'Ins Buys']
 
-def compute_wacc(market_cap, debt, interest_exp, tax_exp, ebt, ticker):
-    beta, rf = fetch_beta_and_rf(ticker)
-    cost_of_equity = rf + beta * (MARKET_RETURN - rf)
-    cost_of_debt = 0.0 if debt == 0 else interest_exp / debt
 
-    tax_rate = 0.0 if ebt == 0 else tax_exp / ebt
-    total_capital = market_cap + debt
-    weight_equity = market_cap / total_capital
-    weight_debt = debt / total_capital
+def compute_wacc(market_cap, debt, interest_exp, tax_exp, ebt, ticker, rf=None, beta=None):
+    with PROFILE.stage('wacc'):
+        if beta is None:
+            beta = fetch_beta(ticker)  # Regressed locally on SEP prices against the benchmark
+        if rf is None:
+            rf = fetch_risk_free_rate()  # Fetched once per session
+        return float(wacc(market_cap, debt, interest_exp, tax_exp, ebt, beta, rf))
 
-    return (weight_equity * cost_of_equity) + (weight_debt * cost_of_debt * (1 - tax_rate))
 
-
-def grab_fundamental_data(ticker):
+def grab_fundamental_data(ticker, rf=None, beta=None):
     """
     Fetches and calculates comprehensive fundamental analysis metrics for a given ticker.
     Returns historical financial metrics across multiple periods for analysis.
+    Pass rf and beta to reuse values computed elsewhere, e.g. once for a whole batch run.
     """
-    metrics = {}
-    data = ndl.get_table('SHARADAR/SF1', ticker=ticker, paginate=True)
+    sf1_params = sf1_query(OVERVIEW_METRICS, years=HISTORY_YEARS, extra_columns=['taxexp', 'ebt'])
+    data = get_table('SHARADAR/SF1', ticker, **sf1_params)
 
     data = data[data['dimension'] == 'ART']  # As Reported, Trailing Twelve Months (TTM)
+    data = data.sort_values(['calendardate', 'datekey'], ascending=False)  # Latest period first
     ltm = data.iloc[0:1]
     data = data[data['fiscalperiod'].str.contains('Q4')].copy()
 
@@ -96,188 +86,30 @@ def grab_fundamental_data(ticker):
     data = data.sort_values('year').reset_index(drop=True)
     data = pd.concat([data, ltm])
 
-    sf2_data = ndl.get_table('SHARADAR/SF2', ticker=ticker, paginate=True)
-    sf2_data['transactiondate'] = pd.to_datetime(sf2_data['transactiondate'])
-    insider_buys = sf2_data[sf2_data['transactioncode'] == 'P']
-
-    def count_insider_buys(end_date):
-        if end_date == data['calendardate'].max():
-            end_date = pd.to_datetime('today')
-        start_date = end_date - pd.DateOffset(months=12)
-
-        count = insider_buys[
-            (insider_buys['transactiondate'] > start_date) & 
-            (insider_buys['transactiondate'] <= end_date)
-        ].shape[0]
-        return count
+    sf2_data = get_table('SHARADAR/SF2', ticker, **sf2_query(years=HISTORY_YEARS + 1))
+    insider_buys = EventWindows(sf2_data, 'transactiondate', codes=['P'])
+    # Each year counts the 12 months to its year end, the latest period the 12 months to today
+    window_ends = data['calendardate'].where(data['calendardate'] != data['calendardate'].max(), pd.to_datetime('today'))
     
-    sep_data = ndl.get_table('SHARADAR/SEP', ticker=ticker, paginate=True)
+    sep_data = get_table('SHARADAR/SEP', ticker, **sep_query())
     sep_data['date'] = pd.to_datetime(sep_data['date'])
-    latest_share_price = sep_data.sort_values('date').iloc[-1]['close']
+    # No recent close for a halted, suspended or delisted ticker: valuations fall back to SF1's marketcap
+    latest_share_price = sep_data.sort_values('date')['close'].iloc[-1] if not sep_data.empty else np.nan
     current_shares_outstanding = data['sharesbas'].iloc[-1] * data['sharefactor'].iloc[-1]
     current_market_cap = latest_share_price * current_shares_outstanding
-
-    # Valuation Metrics
-    metrics['TEV'] = data['ev'] / 1_000_000
-    metrics['Mkt Cap'] = data['marketcap'] / 1_000_000
-    metrics['TEV/EBITDA'] = data['ev'] / (data['ebitda'] / data['fxusd'])
-    metrics['TEV/Rev'] = data['ev'] / (data['revenue'] / data['fxusd'])
-    metrics['TEV/FCF'] = data['ev'] / (data['fcf'] / data['fxusd'])
-    metrics['P/E'] = data['marketcap'] / (data['netinc'] / data['fxusd'])
-    metrics['P/B'] = data['marketcap'] / ((data['equity']) / data['fxusd'])
-    metrics['EPS'] = data['eps'] / data['fxusd']
+    if np.isnan(current_market_cap):
+        current_market_cap = data['marketcap'].iloc[-1]
 
     ltm_debt = data['debt'].iloc[-1] / data['fxusd'].iloc[-1]
-    ltm_cash = data['cashneq'].iloc[-1] / data['fxusd'].iloc[-1]
-    ltm_revenue = data['revenue'].iloc[-1] / data['fxusd'].iloc[-1]
-    ltm_fcf = data['fcf'].iloc[-1] / data['fxusd'].iloc[-1]
-    ltm_netinc = data['netinc'].iloc[-1] / data['fxusd'].iloc[-1]
-    ltm_equity = data['equity'].iloc[-1] / data['fxusd'].iloc[-1]
-
     ltm_interest_exp = data['intexp'].iloc[-1] / data['fxusd'].iloc[-1]
     ltm_tax_exp = data['taxexp'].iloc[-1] / data['fxusd'].iloc[-1]
     ltm_ebt = data['ebt'].iloc[-1] / data['fxusd'].iloc[-1]
 
-    if np.isnan(data['ebitda'].iloc[-1]): # LTM EBITDA is nan for Chinese stocks
-        ltm_ebitda = data['ebitda'].iloc[-2] / data['fxusd'].iloc[-1]
-    else:
-        ltm_ebitda = data['ebitda'].iloc[-1] / data['fxusd'].iloc[-1]
-
-    new_ev = current_market_cap + ltm_debt - ltm_cash
-
-    # Keep up to date valuation metrics as market cap changes past latest earnings
-    metrics['TEV'].iat[-1] = new_ev / 1_000_000
-    metrics['Mkt Cap'].iat[-1] = current_market_cap / 1_000_000
-    metrics['TEV/EBITDA'].iat[-1] = new_ev / ltm_ebitda
-    metrics['TEV/Rev'].iat[-1] = new_ev / ltm_revenue
-    metrics['TEV/FCF'].iat[-1] = new_ev / ltm_fcf
-    metrics['P/E'].iat[-1] = current_market_cap / ltm_netinc
-    metrics['P/B'].iat[-1] = current_market_cap / ltm_equity
-
-    # Income Statement
-    metrics['Rev'] = (data['revenue'] / data['fxusd']) / 1_000_000
-    metrics['Rev 3YCAGR'] = calculate_rolling_cagr(data['revenue'] / data['fxusd'])
-    metrics['GP'] = (data['gp'] / data['fxusd']) / 1_000_000
-    metrics['Net Inc'] = (data['netinc'] / data['fxusd']) / 1_000_000
-    metrics['Op Inc'] = (data['opinc'] / data['fxusd']) / 1_000_000
-    metrics['EBITDA'] = (data['ebitda'] / data['fxusd']) / 1_000_000
-
-    # Operating Expense Detail
-    metrics['R&D'] = (data['rnd'] / data['fxusd']) / 1_000_000
-    metrics['SG&A'] = (data['sgna'] / data['fxusd']) / 1_000_000
-    metrics['D&A'] = (data['depamor'] / data['fxusd']) / 1_000_000
-    metrics['SBC'] = (data['sbcomp'] / data['fxusd']) / 1_000_000
-
-    # Operating Expense Ratios (with validation)
-    safe_revenue = data['revenue'].replace(0, np.nan)
-    metrics['R&D/Rev'] = data['rnd'] / safe_revenue
-    metrics['SG&A/Rev'] = data['sgna'] / safe_revenue
-    metrics['SBC/Rev'] = data['sbcomp'] / safe_revenue
-
-    # Cash Flow
-    metrics['CFO'] = (data['ncfo'] / data['fxusd']) / 1_000_000
-    metrics['FCF'] = (data['fcf'] / data['fxusd']) / 1_000_000
-    metrics['Op Exp'] = (data['opex'] / data['fxusd']) / 1_000_000
-    metrics['CapEx'] = (data['capex'] / data['fxusd']) / 1_000_000
-    metrics['Int Exp'] = (data['intexp'] / data['fxusd']) / 1_000_000
-
-    # Cash Flow Analysis (with validation)
-    safe_netinc = data['netinc'].replace(0, np.nan)
-    metrics['NI to CFO'] = data['ncfo'] / safe_netinc
-    metrics['SBC Add-back'] = (data['sbcomp'] / data['fxusd']) / 1_000_000
-    
-    # Calculate working capital change
-    current_wc = (data['assetsc'] - data['liabilitiesc']) / data['fxusd']
-    prev_wc = current_wc.shift(1)
-    metrics['WC Change'] = (prev_wc - current_wc) / 1_000_000  # Negative means cash outflow
-
-    # Margins
-    metrics['GP Marg'] = data['grossmargin']
-    metrics['EBITDA Marg'] = data['ebitdamargin']
-    metrics['Net Marg'] = data['netmargin']
-    metrics['Op Marg'] = data['opinc'] / safe_revenue
-    metrics['FCF Marg'] = data['fcf'] / safe_revenue
-
-    # Shareholder Yield
-    metrics['Div Yield'] = data['divyield']
-    metrics['BB Yield'] = (data['sharesbas'].shift(1) - data['sharesbas']) / data['sharesbas'].shift(1)
-    metrics['Ins Buys'] = data['calendardate'].apply(count_insider_buys)
-
-    # Balance Sheet
-    metrics['Equity'] = (data['equity'] / data['fxusd']) / 1_000_000
-    metrics['Debt'] = (data['debt'] / data['fxusd']) / 1_000_000
-    metrics['Assets'] = (data['assets'] / data['fxusd']) / 1_000_000
-    metrics['Liab'] = (data['liabilities'] / data['fxusd']) / 1_000_000
-    metrics['Cash & ST Inv'] = (data['cashneq'] + data['investmentsc']) / 1_000_000
-    metrics['Net Cash'] = (data['cashneq'] + data['investmentsc'] - data['debt']) / 1_000_000
-    metrics['TBV'] = ((data['assets'] - data['intangibles'] - data['liabilities']) / data['fxusd']) / 1_000_000
-
-    # Asset Quality
-    metrics['Receivables'] = (data['receivables'] / data['fxusd']) / 1_000_000
-    metrics['Inventory'] = (data['inventory'] / data['fxusd']) / 1_000_000
-    metrics['PPE Net'] = (data['ppnenet'] / data['fxusd']) / 1_000_000
-    metrics['Intangibles'] = (data['intangibles'] / data['fxusd']) / 1_000_000
-    metrics['Payables'] = (data['payables'] / data['fxusd']) / 1_000_000
-    metrics['Def Revenue'] = (data['deferredrev'] / data['fxusd']) / 1_000_000
-
-    # Working Capital Analysis (with data validation)
-    safe_cor = data['cor'].replace(0, np.nan)
-    safe_receivables = data['receivables'].replace(0, np.nan)
-    safe_inventory = data['inventory'].replace(0, np.nan)
-
-    metrics['DSO'] = (data['receivables'] / safe_revenue) * 365  # Days Sales Outstanding
-    metrics['DIO'] = (data['inventory'] / safe_cor) * 365  # Days Inventory Outstanding
-    metrics['DPO'] = (data['payables'] / safe_cor) * 365  # Days Payable Outstanding
-    metrics['Cash Cycle'] = metrics['DSO'] + metrics['DIO'] - metrics['DPO']
-
-    # Solvency
-    metrics['D/E'] = data['debt'] / data['equity']
-    metrics['Debt/EBITDA'] = data['debt'] / data['ebitda']
-    metrics['Cash Ratio'] = data['cashneq'] / data['liabilitiesc']
-    metrics['Cash/Debt'] = data['cashneq'] / data['debt']
-    metrics['Int Cov'] = data['ebit'] / data['intexp']
-
-    # Liquidity
-    metrics['Curr Ratio'] = data['currentratio']
-    metrics['Quick Ratio'] = (data['assetsc'] - data['inventory']) / data['liabilitiesc']
-
-    # Efficiency (with validation for new turnover ratios)
-    safe_working_capital = (data['assetsc'] - data['liabilitiesc']).replace(0, np.nan)
-    
-    metrics['WC Turn'] = safe_revenue / safe_working_capital
-    metrics['Asset Turn'] = data['assetturnover']
-    metrics['Recv Turn'] = safe_revenue / safe_receivables  # Revenue / Receivables
-    metrics['Inv Turn'] = safe_cor / safe_inventory  # COGS / Inventory
-
-    # Profitability
-    metrics['ROA'] = data['roa']
-    metrics['ROE'] = data['roe']
-    metrics['ROIC'] = data['roic']
-
-    # Create DataFrame and apply data cleaning
-    metrics_df = pd.DataFrame(metrics)
-    
-    # Replace infinite values and extreme outliers
-    metrics_df = metrics_df.replace([np.inf, -np.inf], np.nan)
-
-    # Cap extreme values for display purposes (optional but recommended)
-    for col in ['DSO', 'DIO', 'DPO', 'Cash Cycle']:
-        if col in metrics_df.columns:
-            # Cap at 999 days for display (negative values allowed for Cash Cycle)
-            if col == 'Cash Cycle':
-                metrics_df[col] = metrics_df[col].clip(lower=-999, upper=999)
-            else:
-                metrics_df[col] = metrics_df[col].clip(upper=999)
-
-    # Cap turnover ratios to reasonable ranges
-    for col in ['Recv Turn', 'Inv Turn', 'WC Turn']:
-        if col in metrics_df.columns:
-            metrics_df[col] = metrics_df[col].clip(upper=100)  # Cap at 100x turnover
-
-    # Cap NI to CFO ratio to reasonable range
-    if 'NI to CFO' in metrics_df.columns:
-        metrics_df['NI to CFO'] = metrics_df['NI to CFO'].clip(lower=-10, upper=10)
+    # The latest close keeps LTM valuation metrics up to date as market cap changes past latest earnings
+    data['price'] = np.where(np.arange(len(data)) == len(data) - 1, latest_share_price, np.nan)
+    data['insider_buys'] = insider_buys.window_sums(ticker, window_ends, months=12)
 
+    metrics_df = evaluate_metrics(data, OVERVIEW_METRICS)
     metrics_df.index = data['year']
 
     wacc = compute_wacc(
@@ -286,185 +118,260 @@ def grab_fundamental_data(ticker):
         interest_exp=ltm_interest_exp,
         tax_exp=ltm_tax_exp,
         ebt=ltm_ebt,
-        ticker=ticker
+        ticker=ticker,
+        rf=rf,
+        beta=beta
     )
 
     return metrics_df.round(2), wacc
 
 
-def apply_conditional_formatting(sheet, metrics_df, start_row, start_col):
+def panel_fundamental_data(panel, ticker, rf=None, beta=None):
+    """
+    grab_fundamental_data's result read from a metric panel (src/metric_panel.py) instead of fetched and computed,
+    with prices and insider buys as of the day the panel was built.
+    """
+    metrics_df = panel.frame(ticker, OVERVIEW_METRICS)
+    wacc = compute_wacc(**panel.wacc_inputs(ticker), ticker=ticker, rf=rf, beta=beta)
+    return metrics_df.round(2), wacc
+
+
+def apply_conditional_formatting(writer, metrics_df, start_row, start_col, ticker=None):
     # Work with transposed data to match Excel layout
     transposed_metrics = metrics_df.transpose()
     
     for row_idx, metric_name in enumerate(transposed_metrics.index):    
         row_values = transposed_metrics.loc[metric_name].values
-        
+
+        # Every year against the ticker's peers in the universe index if built, else against its own history
+        cutpoints = peer_cutpoints(metric_name, [ticker]) if ticker else None
+
         current_row = start_row + 1 + row_idx  # +1 to skip header row
-        data_range = sheet.range((current_row, start_col + 2),  # +2 to skip category and metric name columns
-                               (current_row, start_col + 2 + len(row_values) - 1))
-        
-        format_metrics(data_range, row_values, metric_name)
+        # +2 to skip category and metric name columns
+        format_metrics(writer, current_row, start_col + 2, row_values, metric_name, cutpoints=cutpoints)
 
 
-def write_dcf_to_excel(sheet, start_col, wacc, fcf_row_num, years):
+def write_dcf_to_excel(writer, start_col, wacc, fcf_row_num, years, ltm_fcf=None, mkt_cap_row_num=None, simulation=None):
     dcf_start_row = 10
     dcf_start_col = start_col + len(years) + 3
+    projection_years = EXPLICIT_YEARS + TERMINAL_YEARS
 
-    sheet.cells(dcf_start_row, dcf_start_col + 1).value = "DF"
-    sheet.cells(dcf_start_row, dcf_start_col + 2).value = "10Y GR"
-    sheet.cells(dcf_start_row, dcf_start_col + 3).value = "Perp GR"
-
-    wacc_cell = sheet.cells(dcf_start_row + 1, dcf_start_col + 1)
-    wacc_cell.value = wacc
-    wacc_cell.api.NumberFormat = "0.0000"
-    sheet.cells(dcf_start_row + 1, dcf_start_col + 2).value = 1.1
-    sheet.cells(dcf_start_row + 1, dcf_start_col + 3).value = 1.03
+    writer.write_values(dcf_start_row, dcf_start_col + 1, [["DF", "10Y GR", "Perp GR"], [wacc, 1 + GROWTH, 1 + TERMINAL_GROWTH]])
+    writer.set_number_formats({"0.0000": [cell_address(dcf_start_row + 1, dcf_start_col + 1)]})
 
-    sheet.range((dcf_start_row, dcf_start_col + 1), (dcf_start_row + 1, dcf_start_col + 1)).color = (255, 116, 116)
-    sheet.range((dcf_start_row, dcf_start_col + 2), (dcf_start_row + 1, dcf_start_col + 2)).color = (146, 208, 80)
-    sheet.range((dcf_start_row, dcf_start_col + 3), (dcf_start_row + 1, dcf_start_col + 3)).color = (255, 255, 0)
+    writer.fill([range_address(dcf_start_row, dcf_start_col + 1, dcf_start_row + 1, dcf_start_col + 1)], (255, 116, 116))
+    writer.fill([range_address(dcf_start_row, dcf_start_col + 2, dcf_start_row + 1, dcf_start_col + 2)], (146, 208, 80))
+    writer.fill([range_address(dcf_start_row, dcf_start_col + 3, dcf_start_row + 1, dcf_start_col + 3)], (255, 255, 0))
 
     if fcf_row_num:
-        discount_factor_cell = sheet.cells(dcf_start_row + 1, dcf_start_col + 1).address
-        gr_10y_cell = sheet.cells(dcf_start_row + 1, dcf_start_col + 2).address
-        perp_gr_cell = sheet.cells(dcf_start_row + 1, dcf_start_col + 3).address
+        discount_factor_cell = cell_address(dcf_start_row + 1, dcf_start_col + 1)
+        gr_10y_cell = cell_address(dcf_start_row + 1, dcf_start_col + 2)
+        perp_gr_cell = cell_address(dcf_start_row + 1, dcf_start_col + 3)
 
-        # 10Y FCF Extrapolation
-        for i in range(10):
+        # 10Y FCF Extrapolation followed by 40Y Perpetual Growth, written as one row of formulas
+        formulas = []
+        for i in range(projection_years):
             current_col = dcf_start_col + i
-            prev_col_addr = sheet.cells(fcf_row_num, current_col - 1).address
-            formula = f"={prev_col_addr}*({gr_10y_cell})"
-            sheet.cells(fcf_row_num, current_col).formula = formula
-            sheet.cells(fcf_row_num, current_col).api.NumberFormat = "#,##0"
-
-        # 40Y Perpetual Growth FCF Extrapolation
-        for i in range(40):
-            current_col = dcf_start_col + 10 + i
-            prev_col_addr = sheet.cells(fcf_row_num, current_col - 1).address
-            formula = f"={prev_col_addr}*({perp_gr_cell})"
-            sheet.cells(fcf_row_num, current_col).formula = formula
-            sheet.cells(fcf_row_num, current_col).api.NumberFormat = "#,##0"
+            prev_col_addr = cell_address(fcf_row_num, current_col - 1)
+            growth_cell = gr_10y_cell if i < EXPLICIT_YEARS else perp_gr_cell
+            formulas.append(f"={prev_col_addr}*({growth_cell})")
 
-        # DCF Calculation
-        dcf_label_cell = sheet.cells(fcf_row_num + 2, dcf_start_col + 1)
-        dcf_value_cell = sheet.cells(fcf_row_num + 3, dcf_start_col + 1)
+        writer.write_formulas(fcf_row_num, dcf_start_col, [formulas])
 
-        dcf_label_cell.value = "NPV"
-
-        # Construct NPV formula
-        npv_start_cell = sheet.cells(fcf_row_num, dcf_start_col).address
-        npv_end_cell = sheet.cells(fcf_row_num, dcf_start_col + 49).address
+        # DCF Calculation, with upside against the LTM market cap so both follow edits to the inputs
+        npv_start_cell = cell_address(fcf_row_num, dcf_start_col)
+        npv_end_cell = cell_address(fcf_row_num, dcf_start_col + projection_years - 1)
+        npv_cell = cell_address(fcf_row_num + 3, dcf_start_col + 1)
 
         npv_formula = f"=NPV({discount_factor_cell}, {npv_start_cell}:{npv_end_cell})"
-        dcf_value_cell.formula = npv_formula
-        dcf_value_cell.api.NumberFormat = "#,##0"
-        sheet.range((fcf_row_num + 2, dcf_start_col + 1), (fcf_row_num + 3, dcf_start_col + 1)).color = (77, 147, 217)
-        sheet.api.Columns(dcf_start_col + 1).AutoFit()
-
-
-def write_to_excel(sheet, metrics, wacc, start_row=4, start_col=5):
+        header, row = ["NPV"], [npv_formula]
+        if mkt_cap_row_num:
+            header.append("Upside")
+            row.append(f"={npv_cell}/{cell_address(mkt_cap_row_num, dcf_start_col - 1)}-1")
+        writer.write_formulas(fcf_row_num + 2, dcf_start_col + 1, [header, row])
+        writer.set_number_formats({
+            "#,##0": [
+                range_address(fcf_row_num, dcf_start_col, fcf_row_num, dcf_start_col + projection_years - 1),
+                npv_cell
+            ],
+            "0%": [cell_address(fcf_row_num + 3, dcf_start_col + 2)]
+        })
+        writer.fill([range_address(fcf_row_num + 2, dcf_start_col + 1, fcf_row_num + 3, dcf_start_col + len(header))], (77, 147, 217))
+        writer.autofit_columns(dcf_start_col + 1, dcf_start_col + 1)
+
+        next_row = fcf_row_num + 5
+        if ltm_fcf is not None:
+            next_row = write_sensitivity_grid(writer, next_row, dcf_start_col, ltm_fcf, wacc) + 2
+        if simulation is not None:
+            write_monte_carlo(writer, next_row, dcf_start_col, simulation)
+
+
+def write_sensitivity_grid(writer, start_row, start_col, ltm_fcf, wacc):
+    """
+    NPV for each discount rate (rows) x perpetual growth and 10Y growth (columns), computed in Python
+    and written as one block. Static values, unlike the NPV formula above.
+    """
+    grid, rates = sensitivity_grid(ltm_fcf, wacc)
+    n_rates, n_growth, n_terminal = grid.shape
+    # Columns run over perpetual growth first, then 10Y growth within each
+    values = grid.transpose(0, 2, 1).reshape(n_rates, n_terminal * n_growth)
+
+    rows = [
+        ["Perp GR"] + [terminal_growth for terminal_growth in GRID_TERMINAL_GROWTH for _ in GRID_GROWTH],
+        ["DF \\ 10Y GR"] + [growth for _ in GRID_TERMINAL_GROWTH for growth in GRID_GROWTH],
+    ]
+    rows += [[rate] + list(row) for rate, row in zip(rates, values)]
+    rows = [[to_cell_value(value) for value in row] for row in rows]
+
+    last_row = start_row + len(rows) - 1
+    last_col = start_col + n_terminal * n_growth
+    writer.write_values(start_row, start_col, rows)
+    writer.set_number_formats({
+        "0.0%": [
+            range_address(start_row, start_col + 1, start_row + 1, last_col),
+            range_address(start_row + 2, start_col, last_row, start_col)
+        ],
+        "#,##0": [range_address(start_row + 2, start_col + 1, last_row, last_col)]
+    })
+    writer.fill([range_address(start_row, start_col, start_row + 1, last_col)], (180, 180, 180))
+
+    # Highlight the base case, the same inputs as the NPV formula
+    base_rate = n_rates // 2
+    base_cols = [
+        start_col + 1 + t * n_growth + g
+        for t in range(n_terminal) for g in range(n_growth)
+        if np.isclose(GRID_TERMINAL_GROWTH[t], TERMINAL_GROWTH) and np.isclose(GRID_GROWTH[g], GROWTH)
+    ]
+    writer.fill([cell_address(start_row + 2 + base_rate, col) for col in base_cols], (77, 147, 217))
+    return last_row
+
+
+def write_monte_carlo(writer, start_row, start_col, simulation):
+    """
+    Percentile valuations, the sampled input distributions and a text histogram, written as one block.
+    """
+    rows = [["Monte Carlo", f"{simulation['paths']:,} paths", None, None]]
+    formats = {"#,##0": [], "0%": [], "0.0%": []}
+
+    rows.append(["Percentile", "Value", "Upside", None])
+    for percentile, value in simulation['percentiles'].items():
+        row = start_row + len(rows)
+        rows.append([f"P{percentile}", value, simulation['upside'][percentile], None])
+        formats["#,##0"].append(cell_address(row, start_col + 1))
+        formats["0%"].append(cell_address(row, start_col + 2))
+    formats["0%"].append(cell_address(start_row + len(rows), start_col + 1))
+    rows.append(["P(Value > Mkt Cap)", simulation['prob_undervalued'], None, None])
+
+    rows.append([None] * 4)
+    rows.append(["Input", "Mean", "SD", None])
+    for name, (mean, sd) in simulation['distributions'].items():
+        row = start_row + len(rows)
+        rows.append([name.replace('_', ' ').title(), mean, sd, None])
+        formats["0.0%"].append(range_address(row, start_col + 1, row, start_col + 2))
+
+    rows.append([None] * 4)
+    rows.append(["Histogram", "From", "To", "Paths"])
+    counts, edges = simulation['histogram']
+    first_bin_row = start_row + len(rows)
+    for count, low, high in zip(counts, edges[:-1], edges[1:]):
+        bar = "\u2588" * int(round(40 * count / counts.max())) if counts.max() else ""
+        rows.append([bar, low, high, int(count)])
+    formats["#,##0"].append(range_address(first_bin_row, start_col + 1, start_row + len(rows) - 1, start_col + 3))
+
+    writer.write_values(start_row, start_col, [[to_cell_value(value) for value in row] for row in rows])
+    writer.set_number_formats(formats)
+    writer.fill([range_address(start_row, start_col, start_row, start_col + 3)], (77, 147, 217))
+
+
+def number_format_for(metric_name):
+    if metric_name in PERCENTAGE_METRICS or parse_cagr_metric(metric_name):
+        return "0%"
+    if metric_name in DECIMAL_METRICS:
+        return "0.00"
+    if metric_name in WHOLE_NUMBER_METRICS:
+        return "0"
+    return "#,##0"
+
+
+def write_to_excel(writer, metrics, wacc, start_row=4, start_col=5, simulation=None, ticker=None):
     years = sorted([idx for idx in metrics.index if idx != 'LTM'])
-    max_years_for_data = 15
-    if len(years) > max_years_for_data:
-        years = years[-max_years_for_data:]
+    if len(years) > MAX_YEARS_FOR_DATA:
+        years = years[-MAX_YEARS_FOR_DATA:]
         metrics = metrics.loc[years + ['LTM']]
 
     transposed_metrics = metrics.transpose()
+    last_col = start_col + len(years) + 2
 
     headers = ["Category", "Metric"] + [str(year) for year in years] + ["LTM"]
-    for col_num, header in enumerate(headers, start=start_col):
-        sheet.cells(start_row, col_num).value = header
+    rows = [headers]
+    written_metrics = []
+    descriptions = []
+    group_bounds = []
+    formats = {}
 
     current_row = start_row + 1
 
-    for i, group in enumerate(METRIC_GROUPS):
+    for group in METRIC_GROUPS:
         group_start_row = current_row
         first_metric = True
         
         for metric_name, description in group['metrics'].items():
             if metric_name in transposed_metrics.index:
-                # Write category name (only for first metric in group)
-                if first_metric:
-                    category_cell = sheet.cells(current_row, start_col)
-                    category_cell.value = group['name']
-                    first_metric = False
-                
-                metric_cell = sheet.cells(current_row, start_col + 1)
-                metric_cell.value = metric_name
-                
-                if metric_cell.api.Comment is not None:
-                    metric_cell.api.Comment.Delete()
-                metric_cell.api.AddComment(description)
-                metric_cell.api.Comment.Visible = False
-                
-                for col_num, value in enumerate(transposed_metrics.loc[metric_name], start=start_col + 2):
-                    cell = sheet.cells(current_row, col_num)
-                    cell.value = value
-                    
-                    percentage_metrics = [
-                        'GP Marg', 'EBITDA Marg', 'Net Marg', 'Op Marg', 'FCF Marg',
-                        'Div Yield', 'BB Yield', 'Rev 3YCAGR',
-                        'R&D/Rev', 'SG&A/Rev', 'SBC/Rev',
-                        'ROA', 'ROE', 'ROIC'
-                    ]
-                    
-                    decimal_metrics = [
-                        'Curr Ratio', 'Quick Ratio', 'D/E', 'Debt/EBITDA', 'Cash Ratio', 'Cash/Debt',
-                        'Int Cov', 'WC Turn', 'Asset Turn', 'Recv Turn', 'Inv Turn', 'EPS', 'NI to CFO',
-                        'TEV/EBITDA', 'TEV/Rev', 'TEV/FCF', 'P/E', 'P/B'
-                    ]
-                    
-                    whole_number_metrics = ['DSO', 'DIO', 'DPO', 'Cash Cycle', 'Ins Buys']
-                    
-                    # Apply formatting based on explicit categories
-                    if metric_name in percentage_metrics:
-                        cell.api.NumberFormat = "0%"
-                    elif metric_name in decimal_metrics:
-                        cell.api.NumberFormat = "0.00"
-                    elif metric_name in whole_number_metrics:
-                        cell.api.NumberFormat = "0"
-                    elif isinstance(value, (int, float)) and pd.notna(value):
-                        cell.api.NumberFormat = "#,##0"
-                    
+                # Category name only on the first metric in the group
+                category = group['name'] if first_metric else None
+                first_metric = False
+
+                values = [to_cell_value(value) for value in transposed_metrics.loc[metric_name].tolist()]
+                rows.append([category, metric_name] + values)
+                written_metrics.append(metric_name)
+                descriptions.append(description)
+
+                address = range_address(current_row, start_col + 2, current_row, last_col)
+                formats.setdefault(number_format_for(metric_name), []).append(address)
                 current_row += 1
 
-        if i < len(METRIC_GROUPS) - 1:
-            border_range = sheet.range(
-                sheet.cells(group_start_row, start_col),
-                sheet.cells(current_row - 1, start_col + len(years) + 2)
-            )
-            border_range.api.Borders(9).Weight = 2
+        group_bounds.append((group_start_row, current_row - 1))
 
-    table_range = sheet.range(
-        sheet.cells(start_row, start_col),
-        sheet.cells(current_row - 1, start_col + len(years) + 2)
-    )
+    # Whole table in one write, then formats grouped by format string
+    writer.write_values(start_row, start_col, rows)
+    writer.set_number_formats(formats)
+
+    writer.add_comments([
+        (row_num, start_col + 1, description)
+        for row_num, description in enumerate(descriptions, start=start_row + 1)
+    ])
 
-    for i, row in enumerate(table_range.rows):
-        row_number = start_row + i
+    for group_start_row, group_end_row in group_bounds[:-1]:
+        if group_end_row >= group_start_row:
+            writer.add_bottom_border(range_address(group_start_row, start_col, group_end_row, last_col))
 
-        if row_number == start_row:
-            row.color = (180, 180, 180)  # Dark grey
-        elif row_number == start_row + 1:
-            pass
-        elif (row_number - start_row) % 2 == 0:
-            row.color = (217, 217, 217)  # Light grey
+    writer.fill([range_address(start_row, start_col, start_row, last_col)], (180, 180, 180))  # Dark grey
+    striped_rows = [
+        range_address(row_number, start_col, row_number, last_col)
+        for row_number in range(start_row + 2, current_row, 2)
+    ]
+    writer.fill(striped_rows, (217, 217, 217))  # Light grey
     
-    for col in range(start_col, start_col + len(years) + 2):
-        sheet.api.Columns(col).AutoFit()
+    writer.autofit_columns(start_col, last_col - 1)
 
-    apply_conditional_formatting(sheet, metrics, start_row, start_col)
+    with PROFILE.stage('conditional formatting'):
+        apply_conditional_formatting(writer, metrics[written_metrics], start_row, start_col, ticker)
 
-    sheet.range((1, 1), (1, sheet.api.Columns.Count)).color = (185, 216, 72)
+    writer.fill_rows(1, 1, (185, 216, 72))
 
-    sheet.range((2, 1), (3, sheet.api.Columns.Count)).color = (0, 201, 192)
+    writer.fill_rows(2, 3, (0, 201, 192))
 
-    fcf_row_num = None
-    for i in range(start_row + 1, current_row):
-        if sheet.cells(i, start_col + 1).value == 'FCF':
-            fcf_row_num = i
-            break
-    write_dcf_to_excel(sheet, start_col, wacc, fcf_row_num, years)
+    fcf_row_num = start_row + 1 + written_metrics.index('FCF') if 'FCF' in written_metrics else None
+    mkt_cap_row_num = start_row + 1 + written_metrics.index('Mkt Cap') if 'Mkt Cap' in written_metrics else None
+    ltm_fcf = metrics.loc['LTM', 'FCF'] if 'FCF' in metrics.columns else None
+    write_dcf_to_excel(writer, start_col, wacc, fcf_row_num, years, ltm_fcf, mkt_cap_row_num, simulation)
+
+
+def write_overview(writer, ticker, metrics, wacc, simulation=None):
+    write_to_excel(writer, metrics, wacc, start_row=4, start_col=5, simulation=simulation, ticker=ticker)
+    writer.write_values(1, 5, [[f"{ticker} Overview"]])
+    writer.set_font_size(1, 5, 20)
+    writer.close()
 
 
 def api_test():
@@ -472,17 +379,53 @@ def api_test():
     print(data)
     print(f"WACC: {wacc:.2%}")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Write a fundamental overview for a single ticker to Excel.")
+    parser.add_argument('spreadsheet', help="Path to the Excel workbook (written to when using the xlsx backend)")
+    parser.add_argument('ticker', help="Ticker to analyse")
+    parser.add_argument('--no-cache', action='store_true', help="Bypass the local data cache")
+    parser.add_argument('--refresh', action='store_true', help="Re-fetch all data and overwrite the cached copies")
+    parser.add_argument('--backend', choices=['excel', 'xlsx'], default='excel',
+                        help="'excel' writes to the active workbook via xlwings, 'xlsx' writes the file directly without Excel")
+    parser.add_argument('--monte-carlo', action='store_true', help="Add a Monte Carlo valuation next to the DCF")
+    parser.add_argument('--paths', type=int, default=MC_PATHS, help="Number of Monte Carlo paths")
+    parser.add_argument('--seed', type=int, default=MC_SEED, help="Random seed for reproducible Monte Carlo runs (default: monte_carlo.seed)")
+    parser.add_argument('--profile', metavar='PATH', help="Write per-stage timings and counters as JSON to PATH")
+    parser.add_argument('--cprofile-stage', metavar='STAGE', help="Also dump cProfile stats for one stage to PATH.prof, e.g. 'compute metrics'")
+    return parser.parse_args()
+
+def create_overview(ticker, spreadsheet, backend='excel', monte_carlo=False, paths=MC_PATHS, seed=MC_SEED):
+    """
+    Fetches, computes and writes a full overview. Shared by the CLI and the report server.
+    """
+    with PROFILE.stage('compute metrics'):
+        metrics, wacc = grab_fundamental_data(ticker)
+    simulation = None
+    if monte_carlo:
+        with PROFILE.stage('monte carlo'):
+            simulation = simulate_overview(metrics, wacc, paths=paths, seed=seed)
+        if simulation is None:
+            print(f"Monte Carlo skipped for {ticker}: LTM revenue, FCF margin or WACC is missing")
+
+    with PROFILE.stage('write sheet'):
+        writer = open_writer(backend, spreadsheet)
+        write_overview(profile_writer(writer), ticker, metrics, wacc, simulation)
+
+
 def main():
-    _ = sys.argv[1] # spreadsheet path
-    ticker = sys.argv[2]
-    metrics, wacc = grab_fundamental_data(ticker)
+    args = parse_args()
+    configure_api_key()
+    configure_cache(enabled=not args.no_cache, refresh=args.refresh)
+    if args.profile:
+        PROFILE.enable(args.cprofile_stage)
+
+    create_overview(args.ticker, args.spreadsheet, args.backend, args.monte_carlo, args.paths, args.seed)
 
-    wb = xw.books.active
-    sheet = wb.sheets.active
-    write_to_excel(sheet, metrics, wacc, start_row=4, start_col=5)
-    header_cell = sheet.cells(1, 5)
-    header_cell.value = f"{ticker} Overview"
-    header_cell.api.Font.Size = 20
+    if args.profile:
+        PROFILE.write(args.profile, ticker=args.ticker, backend=args.backend)
+        print(PROFILE.summary())
+        print(f"Profile written to {args.profile}")
 
 
-main()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
\ No newline at end of file
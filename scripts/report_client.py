@@ -0,0 +1,74 @@
+import sys
+import os
+import json
+import argparse
+import urllib.request
+import urllib.error
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Standard library only, so a request costs milliseconds rather than a pandas import
+from src.settings import CONFIG
+
+SERVER_CONFIG = CONFIG['server']
+
+
+def send(path, request=None, host=SERVER_CONFIG['host'], port=SERVER_CONFIG['port']):
+    url = f"http://{host}:{port}{path}"
+    data = json.dumps(request).encode() if request is not None else None
+    http_request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(http_request) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        return json.load(e)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Request a report from a running report_server.py.")
+    parser.add_argument('--port', type=int, default=SERVER_CONFIG['port'])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    overview = commands.add_parser('overview', help="Write a stock overview")
+    overview.add_argument('ticker')
+    overview.add_argument('spreadsheet')
+    overview.add_argument('--backend', choices=['excel', 'xlsx'], default='excel')
+    overview.add_argument('--monte-carlo', action='store_true')
+    overview.add_argument('--paths', type=int)
+    overview.add_argument('--seed', type=int)
+
+    compare = commands.add_parser('compare', help="Write a comparison table")
+    compare.add_argument('companies', help="Comma-separated tickers, optionally grouped under lowercase sector names")
+    compare.add_argument('spreadsheet')
+    compare.add_argument('--backend', choices=['excel', 'xlsx'], default='excel')
+    compare.add_argument('--prices-only', action='store_true', help="Only refresh the valuation columns of the table in the sheet")
+
+    commands.add_parser('status', help="Show server uptime and cache statistics")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        if args.command == 'status':
+            response = send('/status', port=args.port)
+        else:
+            request = {key: value for key, value in vars(args).items() if key not in ('command', 'port')}
+            request['spreadsheet'] = os.path.abspath(args.spreadsheet)  # The server may run from another directory
+            response = send(f"/{args.command}", request, port=args.port)
+    except urllib.error.URLError as e:
+        print(f"Report server not reachable on port {args.port}, start it with scripts/report_server.py ({e.reason})")
+        return 1
+
+    if not response.get('ok'):
+        print(f"Failed: {response.get('error')}")
+        return 1
+    if args.command == 'status':
+        print(json.dumps(response, indent=2))
+    else:
+        print(f"Written {args.spreadsheet} in {response['seconds']:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import sys
+import os
+import time
+import json
+import argparse
+import traceback
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from create_stock_overview import create_overview
+from create_comparison_table import create_comparison
+from src.data_fetching import CACHE, configure_cache
+from src.monte_carlo import PATHS as MC_PATHS, SEED as MC_SEED
+from src.settings import CONFIG, configure_api_key
+
+SERVER_CONFIG = CONFIG['server']
+STARTED_AT = time.time()
+
+
+def handle_overview(request):
+    create_overview(
+        request['ticker'].upper(),
+        request['spreadsheet'],
+        backend=request.get('backend', 'excel'),
+        monte_carlo=request.get('monte_carlo', False),
+        paths=request.get('paths') or MC_PATHS,
+        seed=request['seed'] if request.get('seed') is not None else MC_SEED
+    )
+
+
+def handle_compare(request):
+    create_comparison(request['companies'], request['spreadsheet'], backend=request.get('backend', 'excel'),
+                      prices_only=request.get('prices_only', False))
+
+
+ROUTES = {
+    '/overview': handle_overview,
+    '/compare': handle_compare,
+}
+
+
+class ReportHandler(BaseHTTPRequestHandler):
+    """
+    POST /overview {"ticker", "spreadsheet", "backend", "monte_carlo", "paths", "seed"}
+    POST /compare {"companies", "spreadsheet", "backend", "prices_only"}
+    GET /status
+    Requests are served one at a time, which keeps Excel access on a single thread.
+    """
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path != '/status':
+            return self._reply(404, {'ok': False, 'error': f"Unknown path {self.path}"})
+        self._reply(200, {
+            'ok': True,
+            'uptime_seconds': round(time.time() - STARTED_AT),
+            'cache_hits': CACHE.hits,
+            'cache_misses': CACHE.misses,
+            'cached_in_memory': len(CACHE.memory or ()),
+        })
+
+    def do_POST(self):
+        handler = ROUTES.get(self.path)
+        if handler is None:
+            return self._reply(404, {'ok': False, 'error': f"Unknown path {self.path}"})
+
+        start = time.perf_counter()
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            handler(request)
+        except Exception as e:
+            traceback.print_exc()
+            return self._reply(500, {'ok': False, 'error': f"{type(e).__name__}: {e}"})
+        self._reply(200, {'ok': True, 'seconds': round(time.perf_counter() - start, 3)})
+
+    def log_message(self, format, *args):
+        print(f"{self.log_date_time_string()} {format % args}", flush=True)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve overview and comparison reports from a warm, long-running process.")
+    parser.add_argument('--host', default=SERVER_CONFIG['host'], help="Interface to bind, localhost only by default")
+    parser.add_argument('--port', type=int, default=SERVER_CONFIG['port'])
+    parser.add_argument('--no-cache', action='store_true', help="Bypass the data cache, on disk and in memory")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure_api_key()
+    configure_cache(enabled=not args.no_cache, memory_entries=SERVER_CONFIG['memory_entries'])
+
+    server = HTTPServer((args.host, args.port), ReportHandler)
+    print(f"Serving reports on http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import sys
+import os
+import time
+import argparse
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.comparison_metrics import COMPARISON_METRICS, HISTORY_YEARS, compute_comparison_metrics
+from src.dcf import DCF_COLUMNS, value_ltm
+from src.market_data import fetch_risk_free_rate, DEFAULT_BETA
+from src.metric_engine import input_columns
+from src.metric_panel import PANEL_DIR, REPORT_METRICS, HISTORY_YEARS as PANEL_HISTORY_YEARS, SF1_COLUMNS as PANEL_SF1_COLUMNS, \
+    build_metric_panel, save_metric_panel
+from src.panel import load_panel, compact_frame, memory_report
+from src.percentile_index import INDEX_PATH, build_index, save_index
+from src.price_stats import PRICES, price_stats
+from src.query_specs import SF1_BASE_COLUMNS, PRICE_HISTORY_COLUMNS, sf1_query, sf2_query, price_history_query
+from src.universe_store import export_to_store, load_table, iter_table
+from src.settings import configure_api_key
+
+TICKERS_COLUMNS = ['ticker', 'table', 'name', 'exchange', 'isdelisted', 'sector', 'industry']
+SF1_COLUMNS = SF1_BASE_COLUMNS + input_columns(COMPARISON_METRICS) + DCF_COLUMNS
+
+
+def download_universe():
+    # One bulk export per table instead of one paginated query per ticker
+    tables = {
+        'SHARADAR/TICKERS': {'table': 'SF1', 'qopts': {'columns': TICKERS_COLUMNS}},
+        # Every report metric's inputs over the overview's years, so the metric panel can be built from the store too
+        'SHARADAR/SF1': sf1_query(REPORT_METRICS, years=max(HISTORY_YEARS, PANEL_HISTORY_YEARS), extra_columns=DCF_COLUMNS),
+        'SHARADAR/SF2': sf2_query(years=1),
+        'SHARADAR/SEP': price_history_query(PRICES['history_days']),
+    }
+    for table, params in tables.items():
+        start = time.perf_counter()
+        rows = export_to_store(table, **params)
+        print(f"{table:<18} {rows:>10,} rows  {time.perf_counter() - start:6.1f}s", flush=True)
+
+
+def screen_universe(include_delisted=False, metric_panel=False):
+    """
+    Computes the comparison table metrics and a base-case DCF for every ticker in the local store in one vectorized pass.
+    With metric_panel, also saves every report metric over all stored years to the metric panel report workers attach to.
+    """
+    tickers = load_table('SHARADAR/TICKERS').drop_duplicates('ticker').set_index('ticker')
+    if not include_delisted:
+        tickers = tickers[tickers['isdelisted'] == 'N']
+
+    # Only the columns and years the metrics and DCF read, straight into a compact panel
+    filters = [('dimension', '==', 'ART'), ('ticker', 'in', list(tickers.index))]
+    if metric_panel:
+        columns = SF1_COLUMNS + PANEL_SF1_COLUMNS
+    else:
+        columns = SF1_COLUMNS
+        filters.append(('calendardate', '>=', pd.Timestamp.today().normalize() - pd.DateOffset(years=HISTORY_YEARS)))
+    panel = load_panel('SHARADAR/SF1', columns, filters=filters)
+    print(f"SF1 panel: {memory_report(panel, 'SHARADAR/SF1')}", flush=True)
+    sf1 = panel.data
+
+    # One streaming pass over the price history, never more than a chunk of it in memory
+    prices = price_stats(iter_table('SHARADAR/SEP', PRICE_HISTORY_COLUMNS))
+    latest_close = prices[['date', 'close']].reset_index()
+    sf2 = compact_frame(load_table('SHARADAR/SF2'))
+    metrics = compute_comparison_metrics(sf1, sf2, latest_close)
+
+    if metric_panel:
+        start = time.perf_counter()
+        shared = build_metric_panel(sf1, sf2, prices['close'])
+        save_metric_panel(shared)
+        print(f"Metric panel of {len(shared.tickers):,} tickers x {len(shared.periods)} periods x {len(shared.metrics)} metrics "
+              f"({shared.values.nbytes / 1e6:,.1f} MB) written to {PANEL_DIR} in {time.perf_counter() - start:.1f}s", flush=True)
+
+    # Betas aren't regressed universe-wide, so every ticker is discounted at the default beta
+    dcf = value_ltm(panel.latest(), metrics['SP'], fetch_risk_free_rate(), DEFAULT_BETA).round(2)
+
+    info = tickers.reindex(index=metrics.index, columns=['name', 'exchange', 'sector', 'industry'])
+    price_columns = prices.columns.drop(['date', 'close'])
+    return pd.concat([info, metrics, prices[price_columns].reindex(metrics.index), dcf], axis=1)
+
+
+def index_universe(screen, include_delisted=False):
+    """
+    Rebuilds the percentile index that reports colour against, from listed tickers only.
+    """
+    if include_delisted:
+        listed = load_table('SHARADAR/TICKERS', columns=['ticker', 'isdelisted'])
+        screen = screen[screen.index.isin(listed.loc[listed['isdelisted'] == 'N', 'ticker'])]
+    index, ticker_groups = build_index(screen, screen)
+    save_index(index, ticker_groups)
+    return index
+
+
+def save(metrics, path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.parquet':
+        metrics.to_parquet(path)
+    elif extension == '.xlsx':
+        metrics.to_excel(path, sheet_name='Universe', freeze_panes=(1, 1))
+    else:
+        metrics.to_csv(path)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compute the comparison table metrics for the whole Sharadar universe.")
+    parser.add_argument('output', help="Output file, .csv, .parquet or .xlsx")
+    parser.add_argument('--download', action='store_true', help="Refresh the local store with a bulk export first")
+    parser.add_argument('--include-delisted', action='store_true', help="Keep delisted tickers in the output")
+    parser.add_argument('--metric-panel', action='store_true',
+                        help="Also save the metric panel that batch overviews and comparison tables can read instead of fetching")
+    parser.add_argument('--no-index', action='store_true', help="Don't rebuild the percentile index reports are coloured against")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure_api_key()
+    if args.download:
+        download_universe()
+
+    start = time.perf_counter()
+    metrics = screen_universe(include_delisted=args.include_delisted, metric_panel=args.metric_panel)
+    print(f"{len(metrics):,} tickers screened in {time.perf_counter() - start:.1f}s")
+
+    save(metrics, args.output)
+
+    if not args.no_index:
+        index = index_universe(metrics, include_delisted=args.include_delisted)
+        groups = index[['scope', 'group']].drop_duplicates()
+        print(f"Percentile index of {index['metric'].nunique()} metrics over {len(groups):,} peer groups written to {INDEX_PATH}")
+
+
+if __name__ == '__main__':
+    main()
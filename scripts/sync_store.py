@@ -0,0 +1,42 @@
+import sys
+import os
+import time
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.universe_store import STORE_DIR, load_state, sync_table
+from src.settings import configure_api_key
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pull only the rows updated since the last sync into the local store.")
+    parser.add_argument('--tables', nargs='+', help="Tables to sync, e.g. SHARADAR/SF1 (default: every table in the store)")
+    parser.add_argument('--changed-file', default=os.path.join(STORE_DIR, 'changed_tickers.txt'),
+                        help="Where to write the tickers that changed, one per line")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure_api_key()
+    tables = args.tables or list(load_state())
+    if not tables:
+        print("Nothing to sync, download the store first with scripts/screen_universe.py --download")
+        return 1
+
+    changed = set()
+    for table in tables:
+        start = time.perf_counter()
+        table_changed = sync_table(table)
+        changed |= table_changed
+        print(f"{table:<18} {len(table_changed):>7,} tickers changed  {time.perf_counter() - start:6.1f}s", flush=True)
+
+    with open(args.changed_file, 'w') as f:
+        f.writelines(f"{ticker}\n" for ticker in sorted(changed))
+    print(f"\n{len(changed):,} tickers changed, written to {args.changed_file}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import os
+import json
+import asyncio
+import hashlib
+import random
+import numpy as np
+import pandas as pd
+import nasdaqdatalink as ndl
+
+from src.fetch_executor import RETRY_STATUSES, _http_status
+
+PER_PAGE = 10000  # Largest page the datatables endpoint returns
+NUMERIC_TYPES = ('double', 'float', 'integer', 'bigdecimal')
+
+
+class DatatablesError(Exception):
+    def __init__(self, http_status, message):
+        super().__init__(f"HTTP {http_status}: {message}")
+        self.http_status = http_status
+
+
+def datatable_query(tickers, params, per_page=PER_PAGE):
+    """
+    Flattens ndl.get_table style arguments into datatables query parameters, e.g.
+    {'date': {'gte': '2024-01-01'}, 'qopts': {'columns': [...]}} -> [('date.gte', '2024-01-01'), ('qopts.columns', '...')].
+    """
+    query = []
+    if tickers is not None:
+        query.append(('ticker', tickers if isinstance(tickers, str) else ','.join(tickers)))
+    for name, value in params.items():
+        if isinstance(value, dict):
+            for operator, bound in value.items():
+                bound = ','.join(map(str, bound)) if isinstance(bound, (list, tuple)) else str(bound)
+                query.append((f"{name}.{operator}", bound))
+        elif isinstance(value, (list, tuple)):
+            query.append((name, ','.join(map(str, value))))
+        else:
+            query.append((name, str(value)))
+    query.append(('qopts.per_page', str(per_page)))
+    return query
+
+
+def response_key(table, query):
+    """
+    Identity of one page request, the API key excluded, shared by recording and the replaying mock server.
+    """
+    items = sorted((name, value) for name, value in query if name != 'api_key')
+    raw = json.dumps([table, items])
+    return f"{table.replace('/', '_')}_{hashlib.sha1(raw.encode()).hexdigest()[:16]}"
+
+
+class ColumnBuffers:
+    """
+    Accumulates page rows column by column, so a paginated result becomes one DataFrame at the end
+    instead of one per page that then has to be concatenated.
+    """
+
+    def __init__(self):
+        self.columns = None
+        self.types = None
+        self.buffers = None
+        self.rows = 0
+
+    def extend(self, columns, rows):
+        if self.columns is None:
+            self.columns = [column['name'] for column in columns]
+            self.types = [column['type'].lower() for column in columns]
+            self.buffers = [[] for _ in columns]
+        if rows:
+            for buffer, values in zip(self.buffers, zip(*rows)):
+                buffer.extend(values)
+            self.rows += len(rows)
+
+    def to_frame(self):
+        if self.columns is None:
+            return pd.DataFrame()
+        data = {}
+        for name, kind, values in zip(self.columns, self.types, self.buffers):
+            if kind == 'date':
+                data[name] = pd.to_datetime(pd.Series(values, dtype=object))
+            elif kind.startswith(NUMERIC_TYPES):
+                data[name] = np.array(values, dtype=float) if values else np.array([], dtype=float)
+            else:
+                data[name] = pd.Series(values, dtype=object)
+        return pd.DataFrame(data)
+
+
+class AsyncDatatablesClient:
+    """
+    Async client for the Nasdaq Data Link datatables endpoint. Cursor pages of one query are read in
+    sequence, but any number of queries run concurrently, so the pages of different ticker chunks overlap.
+    Requests share the synchronous executor's token bucket, and 429/5xx responses are retried with backoff.
+    Use as `async with AsyncDatatablesClient(...) as client: data = await client.fetch(table, tickers, **params)`.
+    """
+
+    def __init__(self, bucket, max_concurrency=8, max_retries=5, backoff_seconds=1.0, per_page=PER_PAGE, record_dir=None):
+        self.bucket = bucket
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.per_page = per_page
+        self.record_dir = record_dir
+        self.requests = 0
+        self.retries = 0
+        self.bytes = 0
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        import aiohttp  # Only needed when the async client is used
+        self._session = aiohttp.ClientSession()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    async def _acquire(self):
+        while True:
+            wait = self.bucket.reserve()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    async def _get_page(self, table, query):
+        url = f"{ndl.ApiConfig.api_base}/datatables/{table}.json"
+        if ndl.ApiConfig.api_key:
+            query = query + [('api_key', ndl.ApiConfig.api_key)]
+
+        for attempt in range(self.max_retries + 1):
+            await self._acquire()
+            try:
+                async with self._semaphore, self._session.get(url, params=query) as response:
+                    body = await response.read()
+                    if response.status != 200:
+                        raise DatatablesError(response.status, body[:200].decode(errors='replace'))
+                self.requests += 1
+                self.bytes += len(body)
+                page = json.loads(body)
+                if self.record_dir:
+                    self._record(table, query, body)
+                return page
+            except DatatablesError as e:
+                if _http_status(e) not in RETRY_STATUSES or attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                delay = self.backoff_seconds * (2 ** attempt)
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+    def _record(self, table, query, body):
+        os.makedirs(self.record_dir, exist_ok=True)
+        with open(os.path.join(self.record_dir, response_key(table, query) + '.json'), 'wb') as f:
+            f.write(body)
+
+    async def fetch(self, table, tickers=None, **params):
+        """
+        Awaitable equivalent of ndl.get_table(table, ticker=tickers, paginate=True, **params).
+        """
+        query = datatable_query(tickers, params, self.per_page)
+        buffers = ColumnBuffers()
+        cursor = None
+        while True:
+            page = await self._get_page(table, query + ([('qopts.cursor_id', cursor)] if cursor else []))
+            buffers.extend(page['datatable']['columns'], page['datatable']['data'])
+            cursor = page.get('meta', {}).get('next_cursor_id')
+            if not cursor:
+                return buffers.to_frame()
+
+    async def fetch_chunks(self, table, tickers, chunk_size, **params):
+        """
+        Fetches tickers in chunks of chunk_size, all chunks at once. Returns {ticker: DataFrame}.
+        """
+        chunks = [tickers[i:i + chunk_size] for i in range(0, len(tickers), chunk_size)]
+        frames = await asyncio.gather(*(self.fetch(table, chunk, **params) for chunk in chunks))
+
+        results = {}
+        for chunk, data in zip(chunks, frames):
+            grouped = dict(tuple(data.groupby('ticker', sort=False))) if not data.empty else {}
+            for ticker in chunk:
+                results[ticker] = grouped.get(ticker, data.iloc[0:0]).reset_index(drop=True)
+        return results
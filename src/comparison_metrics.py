@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from src.event_windows import EventWindows
+from src.growth import max_horizon
+from src.metric_engine import evaluate_metrics, dependent_metrics
+
+COMPARISON_METRICS = [
+    'TEV', 'SP', 'TEV/EBITDA', 'TEV/Rev', 'TEV/FCF', 'P/E', 'P/B', 'EPS',
+    'Rev', 'Rev 3YCAGR',
+    'GP Marg', 'EBITDA Marg', 'Net Marg', 'Op Marg', 'FCF Marg',
+    'Div Yield', 'BB Yield', 'Ins Buys',
+    'D/E', 'Debt/EBITDA', 'Cash Ratio', 'Cash/Debt', 'Int Cov',
+    'Curr Ratio', 'Quick Ratio',
+    'WC Turn', 'Asset Turn',
+    'ROA', 'ROE', 'ROIC'
+]
+
+# The valuation block, the only metrics that change between filings
+PRICE_METRICS = dependent_metrics(COMPARISON_METRICS, 'price')
+
+ANNUAL_PERIODS = max_horizon(COMPARISON_METRICS, default=3)  # Fiscal years kept before LTM, enough for the longest CAGR
+HISTORY_YEARS = ANNUAL_PERIODS + 2  # Calendar years of SF1 to pull to cover them
+
+
+def select_periods(sf1):
+    """
+    Splits SF1 ART rows into the LTM row per ticker and a window of the last fiscal years followed by LTM.
+    Returns (ltm, window), with window ordered oldest to newest within each ticker.
+    """
+    sf1 = sf1[sf1['dimension'] == 'ART'].copy()  # As Reported, Trailing Twelve Months (TTM)
+    sf1['calendardate'] = pd.to_datetime(sf1['calendardate'])
+    sf1 = sf1.sort_values(['ticker', 'calendardate', 'datekey'], ascending=[True, False, False])
+
+    ltm = sf1.drop_duplicates('ticker')
+
+    # Latest restatement of each fiscal year end
+    annual = sf1[sf1['fiscalperiod'].str.contains('Q4')].drop_duplicates(['ticker', 'fiscalperiod'])
+    annual = annual.sort_values(['ticker', 'calendardate']).groupby('ticker').tail(ANNUAL_PERIODS)
+
+    window = pd.concat([annual.assign(is_ltm=False), ltm.assign(is_ltm=True)])
+    window = window.sort_values(['ticker', 'is_ltm', 'calendardate'], kind='stable')
+
+    return ltm.set_index('ticker'), window
+
+
+def compute_comparison_metrics(sf1, sf2, sep, as_of=None, metrics=COMPARISON_METRICS):
+    """
+    Computes the comparison table metric set for every ticker in the frames at once.
+    sf1 holds SF1 ART rows, sf2 insider transactions and sep recent daily prices, each for any number of tickers.
+    sf2 may be None when none of metrics counts insider buys, e.g. for PRICE_METRICS.
+    as_of, if given, ignores insider transactions after it.
+    Returns a DataFrame indexed by ticker with one column per metric.
+    """
+    ltm, window = select_periods(sf1)
+    tickers = ltm.index.astype(str)  # Plain labels even when the frames hold categorical tickers
+
+    # Latest close per ticker
+    prices = sep.assign(date=pd.to_datetime(sep['date'])).sort_values('date')
+    latest_share_price = prices.drop_duplicates('ticker', keep='last').set_index('ticker')['close']
+
+    # Caller inputs only on LTM rows, the fiscal years before them are there for prior-period and growth terms
+    is_ltm = window['is_ltm'].to_numpy()
+    window['price'] = np.where(is_ltm, window['ticker'].map(latest_share_price), np.nan)
+
+    if sf2 is not None:
+        # Insider purchases in the 12 months to each ticker's latest filed transaction
+        sf2 = sf2.assign(transactiondate=pd.to_datetime(sf2['transactiondate']))
+        if as_of is not None:
+            sf2 = sf2[sf2['transactiondate'] <= pd.to_datetime(as_of)]
+        latest_filing = sf2.groupby(sf2['ticker'].astype(str))['transactiondate'].max().reindex(tickers)
+        insider_buys = EventWindows(sf2, 'transactiondate', codes=['P'])
+        counts = insider_buys.window_sums(tickers, latest_filing.fillna(pd.Timestamp(0)), months=12)
+        insider_buys_count = pd.Series(np.where(latest_filing.notna(), counts, 0), index=tickers)
+        window['insider_buys'] = np.where(is_ltm, window['ticker'].map(insider_buys_count), np.nan)
+
+    result = evaluate_metrics(window, metrics, by='ticker')[is_ltm]
+    result = result.set_axis(window.loc[is_ltm, 'ticker']).reindex(tickers)
+    return result.round(2)
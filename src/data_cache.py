@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict
+import pandas as pd
+
+from src.settings import BASE_DIR, CONFIG
+
+CACHE_CONFIG = CONFIG['cache']
+
+CACHE_DIR = os.path.join(BASE_DIR, CACHE_CONFIG['directory'])
+MAX_CACHE_BYTES = CACHE_CONFIG['max_size_mb'] * 1024 * 1024
+TTL_SECONDS = {table: hours * 3600 for table, hours in CACHE_CONFIG['ttl_hours'].items()}
+FILING_INTERVAL_SECONDS = CACHE_CONFIG['filing_interval_days'] * 24 * 3600
+
+DEFAULT_TTL_SECONDS = 24 * 3600
+MIN_RECHECK_SECONDS = 24 * 3600
+
+
+class ParquetCache:
+    """
+    On-disk cache of Sharadar query results, stored as one Parquet file per table, ticker and query.
+    Entries expire after a per-table TTL, fundamentals also once the next filing is due, and the least
+    recently used files are evicted when the cache grows past its size cap.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, enabled=True, refresh=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self.memory = None  # {data_path: (meta, DataFrame)} in LRU order once keep_in_memory() is called
+        self.max_memory_entries = 0
+
+    def keep_in_memory(self, max_entries):
+        """
+        Also holds up to max_entries results in memory, for long-running processes that serve many reports.
+        """
+        self.memory = OrderedDict()
+        self.max_memory_entries = max_entries
+
+    def _remember(self, data_path, meta, data):
+        self.memory[data_path] = (meta, data)
+        self.memory.move_to_end(data_path)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def _paths(self, table, ticker, params):
+        raw = json.dumps([table, ticker, params], sort_keys=True, default=str)
+        digest = hashlib.sha1(raw.encode()).hexdigest()[:16]
+        name = f"{table.replace('/', '_')}_{ticker}_{digest}"
+        base = os.path.join(self.directory, name)
+        return base + '.parquet', base + '.json'
+
+    def _is_stale(self, table, meta, now):
+        age = now - meta['fetched_at']
+        if age > TTL_SECONDS.get(table, DEFAULT_TTL_SECONDS):
+            return True
+
+        # Fundamentals go stale once the next filing is due, re-checked at most daily until it lands
+        next_filing = meta.get('next_filing')
+        return next_filing is not None and now >= next_filing and age > MIN_RECHECK_SECONDS
+
+    def get(self, table, ticker, params=None):
+        if not self.enabled or self.refresh:
+            return None
+
+        data_path, meta_path = self._paths(table, ticker, params or {})
+        if self.memory is not None and data_path in self.memory:
+            meta, data = self.memory[data_path]
+            if not self._is_stale(table, meta, time.time()):
+                self.memory.move_to_end(data_path)
+                self.hits += 1
+                return data.copy()  # Callers add and convert columns in place
+            del self.memory[data_path]
+
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if self._is_stale(table, meta, time.time()):
+                self.misses += 1
+                return None
+            data = pd.read_parquet(data_path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        os.utime(data_path)  # Mark as recently used for LRU eviction
+        self.hits += 1
+        if self.memory is not None:
+            self._remember(data_path, meta, data.copy())
+        return data
+
+    def put(self, table, ticker, params, data, evict=True):
+        # Pass evict=False when storing many entries in a row and call evict() once after them
+        if not self.enabled:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        data_path, meta_path = self._paths(table, ticker, params or {})
+
+        meta = {'table': table, 'ticker': ticker, 'fetched_at': time.time(), 'next_filing': None}
+        if 'datekey' in data.columns and not data.empty:
+            last_filing = pd.to_datetime(data['datekey']).max()
+            meta['next_filing'] = last_filing.timestamp() + FILING_INTERVAL_SECONDS
+
+        # Write to temporary files first so concurrent readers never see a partial entry
+        suffix = f'.{os.getpid()}.tmp'
+        data.to_parquet(data_path + suffix, index=False)
+        with open(meta_path + suffix, 'w') as f:
+            json.dump(meta, f)
+        os.replace(data_path + suffix, data_path)
+        os.replace(meta_path + suffix, meta_path)
+        if self.memory is not None:
+            self._remember(data_path, meta, data.copy())
+
+        if evict:
+            self.evict()
+
+    def evict(self):
+        if not self.enabled or not os.path.isdir(self.directory):
+            return
+        entries = []
+        total_bytes = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.parquet'):
+                try:
+                    stat = entry.stat()
+                except OSError:  # Evicted by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_bytes += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            for stale_path in (path, path[:-len('.parquet')] + '.json'):
+                try:
+                    os.remove(stale_path)
+                except OSError:
+                    pass
+            total_bytes -= size
+
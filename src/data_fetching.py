@@ -0,0 +1,175 @@
+import copy
+import json
+import asyncio
+from contextlib import nullcontext
+import nasdaqdatalink as ndl
+
+from src.async_fetch import AsyncDatatablesClient
+from src.data_cache import ParquetCache
+from src.fetch_executor import FetchExecutor, TokenBucket
+from src.profiling import PROFILE, frame_bytes
+from src.settings import CONFIG
+
+FETCH_CONFIG = CONFIG['fetch']
+TICKERS_PER_QUERY = FETCH_CONFIG['tickers_per_query']
+CLIENT = FETCH_CONFIG['client']
+DEFAULT_TICKERS_PER_QUERY = 100
+
+CACHE = ParquetCache()
+
+# Nasdaq Data Link allows 300 calls per 10 seconds and 2,000 per 10 minutes; the default
+# burst of 200 refilled at 3 calls/second stays under both
+EXECUTOR = FetchExecutor(
+    max_workers=FETCH_CONFIG['max_workers'],
+    rate=FETCH_CONFIG['requests_per_second'],
+    burst=FETCH_CONFIG['burst'],
+    max_retries=FETCH_CONFIG['max_retries'],
+    backoff_seconds=FETCH_CONFIG['backoff_seconds']
+)
+# 429/5xx are retried by EXECUTOR, which takes a token per request. Left to ndl's own urllib3 retries they
+# would never reach it; connection errors are still retried inside ndl.
+ndl.ApiConfig.retry_status_codes = []
+
+
+def configure_rate_limit(processes=1):
+    """
+    Gives this process an even share of the configured rate and burst. Every process holds its own EXECUTOR,
+    so N pool workers each calling this with N stay within the API quota together.
+    """
+    EXECUTOR.bucket = TokenBucket(FETCH_CONFIG['requests_per_second'] / processes, max(1, FETCH_CONFIG['burst'] // processes))
+
+
+def configure_cache(enabled=True, refresh=False, memory_entries=0):
+    CACHE.enabled = enabled
+    CACHE.refresh = refresh
+    if memory_entries:
+        CACHE.keep_in_memory(memory_entries)
+
+
+def _request_key(table, tickers, params):
+    return json.dumps([table, tickers, params], sort_keys=True, default=str)
+
+
+def _fetch_page(table, tickers, params, cursor):
+    """
+    One cursor page of ndl.get_table(table, ticker=tickers, **params): its rows and the next page's cursor,
+    None on the last. get_table(paginate=True) reads every page inside one call, past the rate limiter.
+    """
+    options = copy.deepcopy(params if tickers is None else {'ticker': tickers, **params})
+    if cursor is not None:
+        options['qopts.cursor_id'] = cursor
+    page = ndl.Datatable(table).data(params=options)
+    return page.to_pandas(), page.meta['next_cursor_id']
+
+
+def get_table(table, ticker, **params):
+    """
+    Drop-in for ndl.get_table(table, ticker=ticker, paginate=True, **params) backed by the on-disk cache.
+    """
+    with PROFILE.stage(f"fetch {table}"):
+        data = CACHE.get(table, ticker, params)
+        if data is None:
+            data = EXECUTOR.run_pages(_request_key(table, ticker, params), _fetch_page, table, ticker, params)
+            PROFILE.add(cache_misses=1, bytes=frame_bytes(data) if PROFILE.enabled else 0)
+            CACHE.put(table, ticker, params, data)
+        else:
+            PROFILE.add(cache_hits=1)
+        PROFILE.add(rows=len(data))
+    return data
+
+
+def get_tables_bulk(table, tickers, refresh=False, **params):
+    """
+    Fetches a table for many tickers at once and returns a {ticker: DataFrame} dict.
+    Cached tickers are read from disk, the rest are requested in chunks of tickers per query
+    and split back out per ticker, so N tickers cost about N / chunk size API calls.
+    With refresh every ticker is requested and its cache entry overwritten, e.g. for the latest prices.
+    Chunks are fetched concurrently, so a table that can't be batched (tickers_per_query of 1)
+    still runs its per-ticker requests in parallel under the rate limit.
+    """
+    with PROFILE.stage(f"fetch {table}"):
+        tickers = list(dict.fromkeys(tickers))  # Same ticker may be listed under several sectors
+        results = {}
+        missing = []
+        for ticker in tickers:
+            data = None if refresh else CACHE.get(table, ticker, params)
+            if data is None:
+                missing.append(ticker)
+            else:
+                results[ticker] = data
+
+        chunk_size = TICKERS_PER_QUERY.get(table, DEFAULT_TICKERS_PER_QUERY)
+        chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+        futures = [EXECUTOR.submit_pages(_request_key(table, chunk, params), _fetch_page, table, chunk, params)
+                   for chunk in chunks]
+        PROFILE.add(cache_hits=len(results), cache_misses=len(missing))
+
+        for chunk, future in zip(chunks, futures):
+            data = future.result()
+            PROFILE.add(bytes=frame_bytes(data) if PROFILE.enabled else 0)
+            grouped = dict(tuple(data.groupby('ticker', sort=False)))
+
+            for ticker in chunk:
+                ticker_data = grouped.get(ticker, data.iloc[0:0]).reset_index(drop=True)
+                CACHE.put(table, ticker, params, ticker_data, evict=False)
+                results[ticker] = ticker_data
+        if missing:
+            CACHE.evict()  # One directory scan for the whole batch
+
+        PROFILE.add(rows=sum(len(data) for data in results.values()))
+        return results
+
+
+def async_client(**options):
+    """
+    Async datatables client under the same rate limit, concurrency and retry settings as EXECUTOR unless overridden.
+    """
+    defaults = {
+        'max_concurrency': FETCH_CONFIG['max_workers'],
+        'max_retries': FETCH_CONFIG['max_retries'],
+        'backoff_seconds': FETCH_CONFIG['backoff_seconds'],
+        'record_dir': FETCH_CONFIG['record_dir'],
+    }
+    return AsyncDatatablesClient(EXECUTOR.bucket, **{**defaults, **options})
+
+
+async def get_tables_many_async(requests, client=None):
+    """
+    Awaitable get_tables_bulk for several (table, tickers, params) requests at once, returning one
+    {ticker: DataFrame} dict per request. Every uncached chunk of every table is in flight together.
+    """
+    with PROFILE.stage('fetch async'):
+        results = []
+        missing = []
+        for table, tickers, params in requests:
+            tickers = list(dict.fromkeys(tickers))
+            cached = {ticker: CACHE.get(table, ticker, params) for ticker in tickers}
+            results.append({ticker: data for ticker, data in cached.items() if data is not None})
+            missing.append([ticker for ticker, data in cached.items() if data is None])
+            PROFILE.add(cache_hits=len(results[-1]), cache_misses=len(missing[-1]))
+
+        async with async_client() if client is None else nullcontext(client) as client:
+            fetched = iter(await asyncio.gather(*(
+                client.fetch_chunks(table, tickers, TICKERS_PER_QUERY.get(table, DEFAULT_TICKERS_PER_QUERY), **params)
+                for (table, _, params), tickers in zip(requests, missing) if tickers
+            )))
+        PROFILE.add(bytes=client.bytes)
+
+        for (table, _, params), tickers, result in zip(requests, missing, results):
+            if tickers:
+                for ticker, data in next(fetched).items():
+                    CACHE.put(table, ticker, params, data, evict=False)
+                    result[ticker] = data
+            PROFILE.add(rows=sum(len(data) for data in result.values()))
+        CACHE.evict()  # One directory scan for the whole batch
+        return results
+
+
+def get_tables_many(requests):
+    """
+    Fetches several (table, tickers, params) requests and returns one {ticker: DataFrame} dict per request,
+    with the async client if the fetch config selects it, otherwise one get_tables_bulk call per request.
+    """
+    if CLIENT == 'async':
+        return asyncio.run(get_tables_many_async(requests))
+    return [get_tables_bulk(table, tickers, **params) for table, tickers, params in requests]
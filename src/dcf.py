@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+from src.settings import CONFIG
+
+DCF_CONFIG = CONFIG['dcf']
+MARKET_RETURN = DCF_CONFIG['market_return']
+EXPLICIT_YEARS = DCF_CONFIG['explicit_years']
+TERMINAL_YEARS = DCF_CONFIG['terminal_years']
+GROWTH = DCF_CONFIG['growth']
+TERMINAL_GROWTH = DCF_CONFIG['terminal_growth']
+
+SENSITIVITY = DCF_CONFIG['sensitivity']
+DISCOUNT_RATE_STEPS = np.array(SENSITIVITY['discount_rate_steps'])
+GRID_GROWTH = np.array(SENSITIVITY['growth'])
+GRID_TERMINAL_GROWTH = np.array(SENSITIVITY['terminal_growth'])
+
+# SF1 columns value_ltm needs on top of the share count and fx columns every SF1 pull has
+DCF_COLUMNS = ['fcf', 'debt', 'intexp', 'taxexp', 'ebt']
+
+
+def wacc(market_cap, debt, interest_exp, tax_exp, ebt, beta, rf, market_return=MARKET_RETURN):
+    """
+    CAPM cost of equity blended with the after-tax cost of debt. Works on scalars or whole arrays of tickers.
+    """
+    market_cap, debt, interest_exp, tax_exp, ebt = (np.asarray(x, dtype=float) for x in (market_cap, debt, interest_exp, tax_exp, ebt))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cost_of_equity = rf + np.asarray(beta, dtype=float) * (market_return - rf)
+        cost_of_debt = np.where(debt == 0, 0.0, interest_exp / debt)
+        tax_rate = np.where(ebt == 0, 0.0, tax_exp / ebt)
+        total_capital = market_cap + debt
+        weight_equity = market_cap / total_capital
+        weight_debt = debt / total_capital
+
+    return (weight_equity * cost_of_equity) + (weight_debt * cost_of_debt * (1 - tax_rate))
+
+
+def _geometric_sum(x, n):
+    # x + x^2 + ... + x^n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(np.isclose(x, 1.0), float(n), x * (1 - x ** n) / (1 - x))
+
+
+def npv(fcf, discount_rate, growth=GROWTH, terminal_growth=TERMINAL_GROWTH,
+        explicit_years=EXPLICIT_YEARS, terminal_years=TERMINAL_YEARS):
+    """
+    Present value of FCF grown at `growth` for the explicit years, then at `terminal_growth` for the
+    terminal years, discounted at `discount_rate` from year 1. Same cash flows as Excel's NPV() over the
+    projected row on the overview sheet, but in closed form, so all arguments broadcast against each other.
+    """
+    explicit = (1 + np.asarray(growth, dtype=float)) / (1 + np.asarray(discount_rate, dtype=float))
+    terminal = (1 + np.asarray(terminal_growth, dtype=float)) / (1 + np.asarray(discount_rate, dtype=float))
+    factor = _geometric_sum(explicit, explicit_years) + explicit ** explicit_years * _geometric_sum(terminal, terminal_years)
+    return np.asarray(fcf, dtype=float) * factor
+
+
+def sensitivity_grid(fcf, discount_rate):
+    """
+    NPVs over discount rate (WACC plus each configured step) x explicit growth x terminal growth.
+    fcf and discount_rate may be arrays over tickers; the grid axes are appended, giving shape
+    fcf.shape + (rates, growths, terminal growths). Returns (grid, discount_rates).
+    """
+    fcf = np.asarray(fcf, dtype=float)[..., None, None, None]
+    rates = np.asarray(discount_rate, dtype=float)[..., None] + DISCOUNT_RATE_STEPS
+    grid = npv(fcf, rates[..., :, None, None], GRID_GROWTH[:, None], GRID_TERMINAL_GROWTH)
+    return grid, rates
+
+
+def value_ltm(ltm, share_price, rf, beta):
+    """
+    WACC, DCF value and implied upside for every ticker in an LTM frame indexed by ticker, in one pass.
+    FCF is levered, so the DCF value is compared against market cap.
+    """
+    fx = ltm['fxusd']
+    market_cap = share_price * ltm['sharesbas'] * ltm['sharefactor']
+    discount_rate = wacc(market_cap, ltm['debt'] / fx, ltm['intexp'] / fx, ltm['taxexp'] / fx, ltm['ebt'] / fx, beta, rf)
+    value = npv(ltm['fcf'] / fx, discount_rate)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        upside = value / market_cap.to_numpy(dtype=float) - 1
+
+    return pd.DataFrame({
+        'WACC': discount_rate,
+        'DCF Value': value / 1_000_000,
+        'DCF Upside': upside
+    }, index=ltm.index)
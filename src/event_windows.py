@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+DAY_OFFSET = 100_000  # Shifts day numbers positive for dates back to the 1700s
+TICKER_SPAN = 1_000_000  # Day numbers per ticker block in the sort key
+
+
+def _days(dates):
+    return pd.DatetimeIndex(pd.to_datetime(dates)).to_numpy('datetime64[D]').astype(np.int64) + DAY_OFFSET
+
+
+class EventWindows:
+    """
+    Counts or sums dated events per ticker over trailing windows, e.g. insider purchases in the 12 months
+    to each fiscal year end. Events are sorted once on (ticker, date) and every window is answered with
+    two binary searches, so the cost is O((events + windows) log events) however many windows are asked.
+    Windows are (end - months, end], at day resolution.
+    """
+
+    def __init__(self, events, date_column='transactiondate', codes=None, code_column='transactioncode',
+                 value_columns=('transactionshares', 'transactionvalue')):
+        if codes is not None:
+            events = events[events[code_column].isin(codes)]
+        events = events.dropna(subset=[date_column])
+
+        tickers = events['ticker'].astype('category')
+        self.tickers = tickers.cat.categories
+        keys = tickers.cat.codes.to_numpy(np.int64) * TICKER_SPAN + _days(events[date_column])
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+
+        # Prefix sums turn any window sum into a difference of two lookups
+        self.cumulative = {}
+        for col in value_columns:
+            if col in events.columns:
+                values = np.nan_to_num(events[col].to_numpy(dtype=float)[order])
+                self.cumulative[col] = np.concatenate([[0.0], np.cumsum(values)])
+
+    def window_sums(self, tickers, ends, months=12, value=None):
+        """
+        Number of events, or the sum of the value column, in the window ending at each end date.
+        tickers and ends are broadcast against each other, so one ticker can be asked for many
+        ends or many tickers for one end. Unknown tickers get 0.
+        """
+        ends = pd.DatetimeIndex(pd.to_datetime(np.atleast_1d(ends)))
+        starts = ends - pd.DateOffset(months=months)
+        codes = self.tickers.get_indexer(np.atleast_1d(tickers)).astype(np.int64)
+        codes, end_days, start_days = np.broadcast_arrays(codes, _days(ends), _days(starts))
+
+        base = codes * TICKER_SPAN
+        hi = np.searchsorted(self.keys, base + end_days, side='right')
+        lo = np.searchsorted(self.keys, base + start_days, side='right')
+        known = codes >= 0
+
+        if value is None:
+            return np.where(known, hi - lo, 0)
+        if value not in self.cumulative:
+            raise ValueError(f"{value} was not loaded, pass it in value_columns")
+        cumulative = self.cumulative[value]
+        return np.where(known, cumulative[hi] - cumulative[lo], 0.0)
@@ -0,0 +1,136 @@
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _http_status(error):
+    # nasdaqdatalink errors carry http_status, plain requests errors carry the response
+    status = getattr(error, 'http_status', None)
+    if status is None and getattr(error, 'response', None) is not None:
+        status = getattr(error.response, 'status_code', None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter: allows bursts of up to `capacity` calls, refilled at `rate` calls per second.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self.taken = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token if one is available and returns 0, otherwise returns the seconds until one will be.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.taken += 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.reserve()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+class FetchExecutor:
+    """
+    Runs API calls on a thread pool behind a shared rate limiter, retrying 429/5xx responses
+    with exponential backoff. Identical requests submitted while one is in flight share its future.
+    Each call, or each page of a paginated query, is one HTTP request and takes one token.
+    """
+
+    def __init__(self, max_workers, rate, burst, max_retries, backoff_seconds):
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.retries = 0
+        self.bucket = TokenBucket(rate, burst)
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # A forked worker process inherits the pool without its threads, so submitted work would never run
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='fetch')
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.bucket._lock = threading.Lock()
+
+    def _submit(self, key, task, *args, **kwargs):
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future
+            future = self._pool.submit(task, *args, **kwargs)
+            self._in_flight[key] = future
+
+        future.add_done_callback(lambda _: self._forget(key))
+        return future
+
+    def submit(self, key, fn, *args, **kwargs):
+        return self._submit(key, self._call_with_retries, fn, *args, **kwargs)
+
+    def run(self, key, fn, *args, **kwargs):
+        return self.submit(key, fn, *args, **kwargs).result()
+
+    def submit_pages(self, key, fetch_page, *args):
+        """
+        submit for a paginated query. fetch_page(*args, cursor) returns one page's rows and the next page's
+        cursor, None on the last page. Pages are read in order, each taking its own token and retried on its own,
+        and the future holds them concatenated.
+        """
+        return self._submit(key, self._read_pages, fetch_page, *args)
+
+    def run_pages(self, key, fetch_page, *args):
+        return self.submit_pages(key, fetch_page, *args).result()
+
+    def _read_pages(self, fetch_page, *args):
+        pages = []
+        cursor = None
+        while True:
+            data, cursor = self._call_with_retries(fetch_page, *args, cursor)
+            pages.append(data)
+            if cursor is None:
+                return pages[0] if len(pages) == 1 else pd.concat(pages, ignore_index=True)
+
+    def _forget(self, key):
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def _call_with_retries(self, fn, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if _http_status(e) not in RETRY_STATUSES or attempt == self.max_retries:
+                    raise
+                with self._lock:
+                    self.retries += 1
+                delay = self.backoff_seconds * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay / 2))  # Jitter so retrying workers spread out
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
@@ -1,21 +1,9 @@
-import os
-import json
 import numpy as np
-import pandas as pd
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-API_KEY_PATH = os.path.join(BASE_DIR, 'api_key.json')
-CONFIG_PATH = os.path.join(BASE_DIR, 'config.json')
+from src.settings import CONFIG
 
-with open(API_KEY_PATH) as f:
-    config = json.load(f)
-    API_KEY = config['api_key']
-
-with open(CONFIG_PATH, 'r') as f:
-    config = json.load(f)
-
-METRIC_GROUPS = config['metric_groups']
-COLORS = config['colors']
+METRIC_GROUPS = CONFIG['metric_groups']
+COLORS = CONFIG['colors']
 
 DARK_GREEN = COLORS['DARK_GREEN']
 MED_GREEN = COLORS['MED_GREEN']
@@ -25,141 +13,125 @@ MED_RED = COLORS['MED_RED']
 LIGHT_RED = COLORS['LIGHT_RED']
 YELLOW = COLORS['YELLOW']
 
+FORMATTING = CONFIG['formatting']
+PERCENTILES = FORMATTING['percentiles']
+HIGHER_IS_BETTER = FORMATTING['higher_is_better']
+LOWER_IS_BETTER = FORMATTING['lower_is_better']
+FIXED_THRESHOLDS = FORMATTING['fixed_thresholds']
+
+BUCKET_COLORS = {
+    3: DARK_GREEN,
+    2: MED_GREEN,
+    1: LIGHT_GREEN,
+    -1: LIGHT_RED,
+    -2: MED_RED,
+    -3: DARK_RED
+}
+
+MAX_ADDRESS_LENGTH = 255  # Longest multi-area reference Excel accepts in one Range call
+
+
+def column_letter(col):
+    letters = ''
+    while col:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def cell_address(row, col):
+    return f"${column_letter(col)}${row}"
+
+def range_address(first_row, first_col, last_row, last_col):
+    return f"{cell_address(first_row, first_col)}:{cell_address(last_row, last_col)}"
+
+def union_addresses(addresses):
+    """
+    Joins range addresses into comma-separated multi-area references, split so each stays under Excel's length limit.
+    """
+    chunk = []
+    length = 0
+    for address in addresses:
+        if chunk and length + len(address) + 1 > MAX_ADDRESS_LENGTH:
+            yield ','.join(chunk)
+            chunk = []
+            length = 0
+        chunk.append(address)
+        length += len(address) + 1
+    if chunk:
+        yield ','.join(chunk)
+
+def to_cell_value(value):
+    # NaN and inf are written as empty cells
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
 
 def calculate_percentiles(values):
-    return {
-        6: np.nanpercentile(values, 6),
-        12: np.nanpercentile(values, 12),
-        25: np.nanpercentile(values, 25),
-        75: np.nanpercentile(values, 75),
-        88: np.nanpercentile(values, 88),
-        94: np.nanpercentile(values, 94)
-    }
-
-def format_metrics(range_obj, values, metric_name):
-    # Metrics where higher values are better
-    good_high = ['EPS', 'Rev 3YCAGR', 'GP Marg', 'EBITDA Marg', 'Net Marg', 'Op Marg', 'FCF Marg',
-                'Cash Ratio', 'Cash/Debt', 'WC Turn', 'Asset Turn', 'ROA', 'ROE', 'ROIC', 'Net Cash',
-                'NI to CFO', 'Recv Turn', 'Inv Turn', 'Int Cov']
-    
-    # Metrics where lower values are better
-    good_low = ['TEV/Rev', 'D/E', 'Debt/EBITDA', 'R&D/Rev', 'SG&A/Rev', 'SBC/Rev', 
-               'DSO', 'DIO', 'DPO', 'Cash Cycle']
-
-    for cell, value in zip(range_obj, values):
-        if pd.notna(value) and not np.isinf(value):
-            if metric_name == 'Curr Ratio':
-                if value >= 3.0:
-                    cell.color = DARK_GREEN
-                elif value >= 2.0:
-                    cell.color = MED_GREEN
-                elif value >= 1.2:
-                    cell.color = LIGHT_GREEN
-                elif value >= 0.8:
-                    continue
-                elif value >= 0.5:
-                    cell.color = LIGHT_RED
-                else:
-                    cell.color = DARK_RED
-
-            elif metric_name == 'Quick Ratio':
-                if value >= 2.0:
-                    cell.color = DARK_GREEN
-                elif value >= 1.5:
-                    cell.color = MED_GREEN
-                elif value >= 1.0:
-                    cell.color = LIGHT_GREEN
-                elif value >= 0.5:
-                    cell.color = LIGHT_RED
-                else:
-                    cell.color = DARK_RED
-
-            elif metric_name == 'Ins Buys':
-                if value >= 10.0:
-                    cell.color = DARK_GREEN
-                elif value >= 6.0:
-                    cell.color = MED_GREEN
-                elif value >= 3.0:
-                    cell.color = LIGHT_GREEN
-
-            elif metric_name == 'BB Yield':
-                if value >= 0.05:
-                    cell.color = DARK_GREEN
-                elif value >= 0.02:
-                    cell.color = MED_GREEN
-                elif value >= 0.01:
-                    cell.color = LIGHT_GREEN
-                elif value >= 0.00:
-                    continue
-                elif value >= -0.02:
-                    cell.color = LIGHT_RED
-                elif value >= -0.04:
-                    cell.color = MED_RED
-                else:
-                    cell.color = DARK_RED
-
-            # Special handling for Cash Cycle (negative is better)
-            elif metric_name == 'Cash Cycle':
-                percentiles = calculate_percentiles(values)
-                if percentiles[25] is not None:
-                    if value <= percentiles[6]:  # Most negative (best)
-                        cell.color = DARK_GREEN
-                    elif value <= percentiles[12]:
-                        cell.color = MED_GREEN
-                    elif value <= percentiles[25]:
-                        cell.color = LIGHT_GREEN
-                    elif value >= percentiles[94]:  # Most positive (worst)
-                        cell.color = DARK_RED
-                    elif value >= percentiles[88]:
-                        cell.color = MED_RED
-                    elif value >= percentiles[75]:
-                        cell.color = LIGHT_RED
-
-            # Special handling for NI to CFO (should be close to 1.0, higher is better)
-            elif metric_name == 'NI to CFO':
-                if value >= 1.5:
-                    cell.color = DARK_GREEN
-                elif value >= 1.2:
-                    cell.color = MED_GREEN
-                elif value >= 1.0:
-                    cell.color = LIGHT_GREEN
-                elif value >= 0.8:
-                    continue  # Neutral
-                elif value >= 0.6:
-                    cell.color = LIGHT_RED
-                elif value >= 0.4:
-                    cell.color = MED_RED
-                else:
-                    cell.color = DARK_RED
-            
-            elif metric_name in good_high:
-                percentiles = calculate_percentiles(values)
-                if percentiles[25] is not None:
-                    if value >= percentiles[94]:
-                        cell.color = DARK_GREEN
-                    elif value >= percentiles[88]:
-                        cell.color = MED_GREEN
-                    elif value >= percentiles[75]:
-                        cell.color = LIGHT_GREEN
-                    elif value <= percentiles[6]:
-                        cell.color = DARK_RED
-                    elif value <= percentiles[12]:
-                        cell.color = MED_RED
-                    elif value <= percentiles[25]:
-                        cell.color = LIGHT_RED
-
-            elif metric_name in good_low:
-                percentiles = calculate_percentiles(values)
-                if percentiles[25] is not None:
-                    if value <= percentiles[6]:
-                        cell.color = DARK_GREEN
-                    elif value <= percentiles[12]:
-                        cell.color = MED_GREEN
-                    elif value <= percentiles[25]:
-                        cell.color = LIGHT_GREEN
-                    elif value >= percentiles[94]:
-                        cell.color = DARK_RED
-                    elif value >= percentiles[88]:
-                        cell.color = MED_RED
-                    elif value >= percentiles[75]:
-                        cell.color = LIGHT_RED
\ No newline at end of file
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return None
+    return np.percentile(finite, PERCENTILES)
+
+def metric_buckets(values, metric_name, cutpoints=None):
+    """
+    Colour bucket per value: 3/2/1 for dark/medium/light green, -1/-2/-3 for light/medium/dark red, 0 for no colour.
+    Fixed thresholds take precedence, then cutpoints at PERCENTILES, one row per value (see src/percentile_index.py),
+    otherwise values are ranked against percentiles of the values themselves.
+    """
+    values = np.asarray(values, dtype=float)
+    buckets = np.zeros(values.shape, dtype=np.int8)
+    finite = np.isfinite(values)
+
+    if metric_name in FIXED_THRESHOLDS:
+        rule = FIXED_THRESHOLDS[metric_name]
+        bins = np.digitize(values[finite], rule['bounds'])
+        buckets[finite] = np.asarray(rule['buckets'], dtype=np.int8)[bins]
+        return buckets
+
+    if metric_name not in HIGHER_IS_BETTER and metric_name not in LOWER_IS_BETTER:
+        return buckets
+
+    if cutpoints is None:
+        cutpoints = calculate_percentiles(values)
+        if cutpoints is None:
+            return buckets
+
+    p6, p12, p25, p75, p88, p94 = np.asarray(cutpoints, dtype=float).T
+    if metric_name in HIGHER_IS_BETTER:
+        conditions = [values >= p94, values >= p88, values >= p75, values <= p6, values <= p12, values <= p25]
+    else:
+        conditions = [values <= p6, values <= p12, values <= p25, values >= p94, values >= p88, values >= p75]
+
+    buckets[:] = np.select(conditions, [3, 2, 1, -3, -2, -1], default=0)
+    buckets[~finite] = 0
+    return buckets
+
+def _runs(indices):
+    # Consecutive indices collapsed into (first, last) pairs
+    runs = []
+    for index in indices:
+        if runs and index == runs[-1][1] + 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return runs
+
+def format_metrics(writer, first_row, first_col, values, metric_name, horizontal=True, cutpoints=None):
+    """
+    Colours a run of cells along one row (or one column) starting at first_row/first_col by metric bucket,
+    painting each colour with one multi-area call. Returns the bucket array from metric_buckets.
+    """
+    buckets = metric_buckets(values, metric_name, cutpoints)
+
+    for bucket, color in BUCKET_COLORS.items():
+        addresses = []
+        for first, last in _runs(np.flatnonzero(buckets == bucket)):
+            if horizontal:
+                addresses.append(range_address(first_row, first_col + first, first_row, first_col + last))
+            else:
+                addresses.append(range_address(first_row + first, first_col, first_row + last, first_col))
+        if addresses:
+            writer.fill(addresses, color)
+
+    return buckets
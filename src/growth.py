@@ -0,0 +1,45 @@
+import re
+import numpy as np
+
+from src.settings import CONFIG
+
+# Metric name prefix -> SF1 column, e.g. 'EPS 5YCAGR' grows the eps column over 5 years
+GROWTH_BASES = CONFIG['growth']['bases']
+
+CAGR_PATTERN = re.compile(r'^(.+) (\d+)YCAGR$')
+
+
+def parse_cagr_metric(metric_name):
+    """
+    'Rev 3YCAGR' -> ('Rev', 3), or None for names that aren't a configured growth metric.
+    """
+    match = CAGR_PATTERN.match(metric_name)
+    if match is None or match.group(1) not in GROWTH_BASES:
+        return None
+    return match.group(1), int(match.group(2))
+
+
+def growth_metrics(metric_names):
+    return [name for name in metric_names if parse_cagr_metric(name) is not None]
+
+
+def max_horizon(metric_names, default=0):
+    return max([parse_cagr_metric(name)[1] for name in growth_metrics(metric_names)], default=default)
+
+
+def cagr(start, end, years):
+    """
+    Compound annual growth between arrays of start and end values.
+    Growth between two positives is the usual (end / start)^(1/years) - 1. Between two negatives
+    the magnitude ratio is inverted, so a loss shrinking from -100 to -50 grows at a positive rate.
+    Sign changes and zero starts have no meaningful rate and give NaN.
+    """
+    start = np.asarray(start, dtype=float)
+    end = np.asarray(end, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.abs(end) / np.abs(start)
+        growth = ratio ** (1 / years) - 1
+    growth = np.where(start < 0, -growth, growth)
+    same_sign = ((start > 0) & (end >= 0)) | ((start < 0) & (end <= 0))
+    return np.where(same_sign, growth, np.nan)
+
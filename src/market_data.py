@@ -0,0 +1,112 @@
+import time
+import functools
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from src.data_fetching import CACHE, get_table, get_tables_bulk
+from src.profiling import PROFILE
+from src.query_specs import returns_query
+from src.settings import CONFIG
+
+BETA_CONFIG = CONFIG['beta']
+BENCHMARK = BETA_CONFIG['benchmark']
+LOOKBACK_YEARS = BETA_CONFIG['lookback_years']
+FREQUENCY = BETA_CONFIG['frequency']
+MIN_OBSERVATIONS = BETA_CONFIG['min_observations']
+DEFAULT_BETA = BETA_CONFIG['default']
+TREASURY = '^TNX'
+RISK_FREE_RATE = 'risk_free_rate'  # Cache table name, whose TTL is cache.ttl_hours.risk_free_rate
+RISK_FREE_TTL_SECONDS = CONFIG['cache']['ttl_hours'][RISK_FREE_RATE] * 3600
+
+RESAMPLE_RULES = {'D': None, 'W': 'W-FRI', 'M': 'ME'}
+
+
+@functools.lru_cache(maxsize=1)
+def _fetch_risk_free_rate(period):
+    with PROFILE.stage('risk-free rate'):
+        treasury = yf.Ticker(TREASURY)
+        rf = treasury.history(period='1d')['Close'].iloc[-1] / 100
+
+    if np.isnan(rf):
+        raise ValueError("Failed to fetch risk-free rate")
+
+    return rf
+
+
+def fetch_risk_free_rate():
+    """
+    10Y Treasury yield, kept in the Parquet cache for the risk_free_rate TTL like the Sharadar tables, so a
+    re-run within it makes no network call and a long-running report server still picks up a new close.
+    """
+    cached = CACHE.get(RISK_FREE_RATE, TREASURY)
+    if cached is not None:
+        return float(cached['rate'].iloc[0])
+
+    # Also held per process, for runs with the cache off or refreshing
+    rf = _fetch_risk_free_rate(int(time.time() // RISK_FREE_TTL_SECONDS))
+    CACHE.put(RISK_FREE_RATE, TREASURY, None, pd.DataFrame({'rate': [rf]}))
+    return rf
+
+
+def to_returns(prices, frequency=FREQUENCY):
+    """
+    Turns a wide frame of adjusted closes (dates x tickers) into simple returns at the given frequency.
+    """
+    rule = RESAMPLE_RULES[frequency]
+    if rule is not None:
+        prices = prices.resample(rule).last()
+    return prices.pct_change(fill_method=None)
+
+
+def estimate_betas(returns, market_returns, min_observations=MIN_OBSERVATIONS):
+    """
+    OLS beta of every column of returns against market_returns in one matrix pass.
+    Each ticker uses only the periods where both it and the market have a return, so listings
+    mid-window and gaps don't need aligning. Tickers with fewer observations get NaN.
+    """
+    market_returns = market_returns.reindex(returns.index)
+    R = returns.to_numpy(dtype=float)
+    m = market_returns.to_numpy(dtype=float)[:, None]
+
+    valid = ~np.isnan(R) & ~np.isnan(m)
+    n = valid.sum(axis=0)
+    R = np.where(valid, R, 0.0)
+    M = np.where(valid, m, 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_r = R.sum(axis=0) / n
+        mean_m = M.sum(axis=0) / n
+        dm = np.where(valid, M - mean_m, 0.0)
+        covariance = (dm * (R - mean_r)).sum(axis=0)
+        variance = (dm ** 2).sum(axis=0)
+        betas = covariance / variance
+
+    betas[n < min_observations] = np.nan
+    return pd.Series(betas, index=returns.columns)
+
+
+def fetch_betas(tickers, lookback_years=LOOKBACK_YEARS, frequency=FREQUENCY):
+    """
+    Betas against the benchmark ETF from cached SEP and SFP adjusted closes, one regression for all tickers.
+    """
+    with PROFILE.stage('beta'):
+        params = returns_query(lookback_years)
+        prices = pd.concat(get_tables_bulk('SHARADAR/SEP', tickers, **params).values(), ignore_index=True)
+        benchmark = get_table('SHARADAR/SFP', BENCHMARK, **params)
+
+        # The query starts at a month boundary, the regression at exactly lookback_years ago
+        start = pd.Timestamp.today().normalize() - pd.DateOffset(years=lookback_years)
+        prices = prices.assign(date=pd.to_datetime(prices['date']))
+        wide = prices.pivot_table(index='date', columns='ticker', values='closeadj', aggfunc='last').sort_index()
+        market = benchmark.assign(date=pd.to_datetime(benchmark['date'])).set_index('date')['closeadj'].sort_index()
+        wide, market = wide[wide.index >= start], market[market.index >= start]
+
+        returns = to_returns(wide, frequency)
+        market_returns = to_returns(market.to_frame(), frequency).iloc[:, 0]
+        return estimate_betas(returns, market_returns).reindex(list(dict.fromkeys(tickers)))
+
+
+def fetch_beta(ticker):
+    beta = fetch_betas([ticker])[ticker]
+    return DEFAULT_BETA if np.isnan(beta) else beta
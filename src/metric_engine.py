@@ -0,0 +1,225 @@
+import ast
+import functools
+import numpy as np
+import pandas as pd
+
+from src.settings import CONFIG
+from src.growth import GROWTH_BASES, parse_cagr_metric, cagr
+
+FORMULAS = CONFIG['metric_formulas']
+TERMS = FORMULAS['terms']  # Named intermediates metrics can refer to, e.g. tev
+METRIC_FORMULAS = FORMULAS['metrics']
+
+# Inputs the caller adds to the frame from other tables, every other name is an SF1 column:
+# price is the latest close on LTM rows, insider_buys the insider purchases in each row's window
+CALLER_INPUTS = ['price', 'insider_buys']
+
+OPERATORS = {
+    ast.Add: ('+', np.add),
+    ast.Sub: ('-', np.subtract),
+    ast.Mult: ('*', np.multiply),
+    ast.Div: ('/', np.divide),
+    ast.Pow: ('**', np.power),
+}
+
+
+def _safe(values):
+    return np.where(values == 0, np.nan, values)
+
+
+def _coalesce(values, fallback):
+    return np.where(np.isnan(values), fallback, values)
+
+
+def _clip(values, lower, upper):
+    return np.clip(values, -np.inf if lower is None else lower, np.inf if upper is None else upper)
+
+
+# Functions over evaluated arguments. prev and cagr also take the row groups, see MetricPlan.evaluate
+FUNCTIONS = {
+    'safe': _safe,  # Zero to NaN, for denominators
+    'coalesce': _coalesce,
+    'clip': _clip,  # None leaves a side unbounded
+    'prev': None,  # prev(x, periods=1), x that many rows earlier within the same ticker
+    'cagr': None,  # cagr(x, years), compound growth of x over that many rows
+}
+
+
+def metric_formula(metric_name):
+    """
+    Expression for a metric, from config.json or, for growth metrics such as 'Rev 3YCAGR', from growth.bases.
+    """
+    if metric_name in METRIC_FORMULAS:
+        return METRIC_FORMULAS[metric_name]
+    growth = parse_cagr_metric(metric_name)
+    if growth is not None:
+        base, years = growth
+        return f"cagr(usd({GROWTH_BASES[base]}), {years})"
+    raise ValueError(f"No formula for metric {metric_name}")
+
+
+class _Compiler:
+    """
+    Turns metric expressions into one list of steps. Every subexpression is keyed by its canonical text,
+    with terms expanded, so a subexpression shared by several metrics becomes a single step.
+    """
+
+    def __init__(self):
+        self.steps = []
+        self.keys = set()
+        self.columns = []
+        self.lookback = 0
+        self._terms = {}
+        self._expanding = []
+
+    def _emit(self, key, operation, *args):
+        if key not in self.keys:
+            self.keys.add(key)
+            self.steps.append((key, operation, args))
+        return key
+
+    def compile(self, expression, source):
+        try:
+            tree = ast.parse(expression, mode='eval').body
+        except SyntaxError as e:
+            raise ValueError(f"Can't parse formula for {source}: {expression}") from e
+        return self._node(tree, source)
+
+    def _name(self, name, source):
+        if name in TERMS:
+            if name in self._expanding:
+                raise ValueError(f"Term {name} refers to itself through {' -> '.join(self._expanding)}")
+            if name not in self._terms:
+                self._expanding.append(name)
+                self._terms[name] = self.compile(TERMS[name], name)
+                self._expanding.pop()
+            return self._terms[name]
+        if name not in self.columns:
+            self.columns.append(name)
+        return self._emit(name, 'column', name)
+
+    def _node(self, node, source):
+        if isinstance(node, ast.Name):
+            return self._name(node.id, source)
+
+        if isinstance(node, ast.Constant) and (node.value is None or isinstance(node.value, (int, float))):
+            return self._emit(repr(node.value), 'constant', node.value)
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            operand = self._node(node.operand, source)
+            return self._emit(f"(-{operand})", 'negative', operand)
+
+        if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+            left, right = self._node(node.left, source), self._node(node.right, source)
+            symbol = OPERATORS[type(node.op)][0]
+            return self._emit(f"({left} {symbol} {right})", 'operator', type(node.op), left, right)
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            function = node.func.id
+            if function == 'usd':  # Local currency to USD, written out so it shares steps with x / fxusd
+                if len(node.args) != 1:
+                    raise ValueError(f"usd takes one argument in the formula for {source}")
+                return self._node(ast.BinOp(node.args[0], ast.Div(), ast.Name('fxusd')), source)
+            if function in FUNCTIONS:
+                args = [self._node(arg, source) for arg in node.args]
+                if function in ('prev', 'cagr'):
+                    periods = getattr(node.args[1], 'value', None) if len(node.args) > 1 else 1
+                    if not isinstance(periods, int) or periods < 1:
+                        raise ValueError(f"{function} needs a positive whole number of periods in the formula for {source}")
+                    self.lookback = max(self.lookback, periods)
+                return self._emit(f"{function}({', '.join(args)})", 'function', function, *args)
+
+        raise ValueError(f"Unsupported expression {ast.unparse(node)} in the formula for {source}")
+
+
+class MetricPlan:
+    """
+    Compiled metric set: the steps to evaluate in order, the input columns they read, and the
+    most periods any of them looks back.
+    """
+
+    def __init__(self, metrics, outputs, steps, columns, lookback):
+        self.metrics = metrics
+        self.outputs = outputs
+        self.steps = steps
+        self.columns = columns
+        self.lookback = lookback
+
+    def evaluate(self, data, by=None):
+        """
+        Evaluates every metric over the rows of data, one vectorized operation per step.
+        data holds one row per period with the input columns, in chronological order; pass by='ticker'
+        for a panel of several tickers, whose rows must then be contiguous per ticker.
+        Returns a DataFrame aligned with data, one column per metric.
+        """
+        missing = [column for column in self.columns if column not in data.columns]
+        if missing:
+            raise ValueError(f"Metrics need columns missing from the data: {missing}")
+
+        groups = pd.factorize(data[by])[0] if by is not None else None
+
+        def shifted(values, periods):
+            result = np.full(len(values), np.nan)
+            result[periods:] = values[:-periods]
+            if groups is not None:
+                result[periods:][groups[periods:] != groups[:-periods]] = np.nan
+            return result
+
+        values = {}
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            for key, operation, args in self.steps:
+                if operation == 'column':
+                    values[key] = data[args[0]].to_numpy(dtype=float)
+                elif operation == 'constant':
+                    values[key] = args[0]
+                elif operation == 'negative':
+                    values[key] = -values[args[0]]
+                elif operation == 'operator':
+                    values[key] = OPERATORS[args[0]][1](values[args[1]], values[args[2]])
+                elif args[0] == 'prev':
+                    values[key] = shifted(values[args[1]], values[args[2]] if len(args) > 2 else 1)
+                elif args[0] == 'cagr':
+                    years = values[args[2]]
+                    values[key] = cagr(shifted(values[args[1]], years), values[args[1]], years)
+                else:
+                    values[key] = FUNCTIONS[args[0]](*(values[arg] for arg in args[1:]))
+
+        metrics = pd.DataFrame({
+            metric: np.broadcast_to(np.asarray(values[key], dtype=float), len(data))
+            for metric, key in zip(self.metrics, self.outputs)
+        }, index=data.index)
+        return metrics.replace([np.inf, -np.inf], np.nan)
+
+
+@functools.lru_cache(maxsize=None)
+def _compile(metric_names):
+    compiler = _Compiler()
+    outputs = [compiler.compile(metric_formula(metric), metric) for metric in metric_names]
+    return MetricPlan(list(metric_names), outputs, compiler.steps, compiler.columns, compiler.lookback)
+
+
+def compile_metrics(metric_names):
+    """
+    Compiles the formulas of metric_names once per distinct list into a MetricPlan.
+    """
+    return _compile(tuple(dict.fromkeys(metric_names)))
+
+
+def evaluate_metrics(data, metric_names, by=None):
+    return compile_metrics(metric_names).evaluate(data, by=by)
+
+
+def input_columns(metric_names, caller_inputs=False):
+    """
+    SF1 columns the metrics read, plus price and insider_buys if caller_inputs.
+    """
+    columns = compile_metrics(metric_names).columns
+    return columns if caller_inputs else [column for column in columns if column not in CALLER_INPUTS]
+
+
+def dependent_metrics(metric_names, column):
+    """
+    The metrics among metric_names whose formulas read column, directly or through terms, e.g. every metric
+    that moves with 'price'.
+    """
+    return [metric for metric in metric_names if column in compile_metrics([metric]).columns]
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+
+from src.settings import BASE_DIR, CONFIG
+from src.comparison_metrics import COMPARISON_METRICS
+from src.dcf import DCF_COLUMNS
+from src.event_windows import EventWindows
+from src.growth import max_horizon
+from src.metric_engine import evaluate_metrics, input_columns
+from src.query_specs import SF1_BASE_COLUMNS
+
+PANEL_CONFIG = CONFIG['metric_panel']
+PANEL_DIR = os.path.join(BASE_DIR, PANEL_CONFIG['directory'])
+INDEX_FILE = 'index.json'
+
+# Every metric an overview or comparison table shows
+REPORT_METRICS = list(dict.fromkeys([metric for group in CONFIG['metric_groups'] for metric in group['metrics']] + COMPARISON_METRICS))
+# Extra years feed the longest CAGR, as in the overview
+HISTORY_YEARS = PANEL_CONFIG['history_years'] + max_horizon(REPORT_METRICS, default=3) + 1
+SF1_COLUMNS = list(dict.fromkeys(SF1_BASE_COLUMNS + input_columns(REPORT_METRICS) + DCF_COLUMNS))
+
+# compute_wacc's LTM inputs in USD, held as extra metrics on the LTM period
+LTM_INPUTS = ['market_cap', 'debt', 'interest_exp', 'tax_exp', 'ebt']
+LTM = 'LTM'
+
+
+class MetricPanel:
+    """
+    Report metrics for many tickers as one tickers x periods x metrics float64 array, periods being fiscal
+    years then LTM. Opened from disk the array is a read-only memory map, so every process attached to the
+    same panel reads one copy through the page cache and only copies the slices it asks for.
+    """
+
+    def __init__(self, values, tickers, periods, metrics, as_of):
+        self.values = values
+        self.tickers = pd.Index(tickers, dtype=object)
+        self.periods = pd.Index(periods, dtype=object, name='year')
+        self.metrics = pd.Index(metrics)
+        self.as_of = pd.Timestamp(as_of)
+
+    def _positions(self, metrics):
+        metrics = [metric for metric in self.metrics if metric not in LTM_INPUTS] if metrics is None else list(metrics)
+        positions = self.metrics.get_indexer(metrics)
+        if (positions < 0).any():
+            raise ValueError(f"Metrics not in the panel: {[m for m, p in zip(metrics, positions) if p < 0]}")
+        return metrics, positions
+
+    def frame(self, ticker, metrics=None):
+        """
+        One ticker's metrics by year then LTM, laid out like grab_fundamental_data's, for the years it has rows.
+        """
+        if ticker not in self.tickers:
+            raise KeyError(f"{ticker} is not in the metric panel")
+        metrics, positions = self._positions(metrics)
+        block = self.values[self.tickers.get_loc(ticker)]
+        present = ~np.isnan(block).all(axis=1)
+        return pd.DataFrame(block[:, positions], index=self.periods, columns=metrics)[present]
+
+    def ltm(self, tickers, metrics=None):
+        """
+        LTM metrics of tickers, one row each in the order given, NaN for tickers not in the panel.
+        """
+        metrics, positions = self._positions(metrics)
+        codes = self.tickers.get_indexer(list(tickers))
+        block = self.values[np.maximum(codes, 0), -1][:, positions]
+        block[codes < 0] = np.nan
+        return pd.DataFrame(block, index=pd.Index(list(tickers), name='ticker'), columns=metrics)
+
+    def wacc_inputs(self, ticker):
+        if ticker not in self.tickers:
+            raise KeyError(f"{ticker} is not in the metric panel")
+        return dict(zip(LTM_INPUTS, self.ltm([ticker], LTM_INPUTS).iloc[0].tolist()))
+
+
+def panel_rows(sf1):
+    """
+    SF1 ART rows laid out as the overview reads them: the latest restatement of each fiscal year per ticker,
+    then its LTM row, contiguous per ticker and oldest first.
+    """
+    sf1 = sf1[sf1['dimension'] == 'ART'].copy()
+    sf1['ticker'] = sf1['ticker'].astype(str)
+    sf1['calendardate'] = pd.to_datetime(sf1['calendardate'])
+    sf1 = sf1.sort_values(['ticker', 'calendardate', 'datekey'], ascending=[True, False, False])
+
+    ltm = sf1.drop_duplicates('ticker').assign(year=LTM)
+    annual = sf1[sf1['fiscalperiod'].astype(str).str.contains('Q4')].drop_duplicates(['ticker', 'fiscalperiod'])
+    annual = annual.assign(year=annual['calendardate'].dt.year).drop_duplicates(['ticker', 'year'])
+    annual = annual.sort_values(['ticker', 'year'])
+
+    rows = pd.concat([annual.assign(is_ltm=False), ltm.assign(is_ltm=True)])
+    return rows.sort_values(['ticker', 'is_ltm'], kind='stable', ignore_index=True)
+
+
+def build_metric_panel(sf1, sf2, latest_close, as_of=None):
+    """
+    Evaluates REPORT_METRICS over every fiscal year and LTM of every ticker in sf1 in one pass.
+    sf2 holds insider transactions and latest_close the latest close per ticker, e.g. from price_stats.
+    Ins Buys is NaN for years whose 12-month window starts before the earliest transaction in sf2.
+    """
+    as_of = pd.Timestamp.today().normalize() if as_of is None else pd.Timestamp(as_of)
+    rows = panel_rows(sf1)
+    is_ltm = rows['is_ltm'].to_numpy()
+
+    # Each year counts the 12 months to its year end, the latest period the 12 months to as_of
+    latest = rows.groupby('ticker', sort=False)['calendardate'].transform('max')
+    window_ends = rows['calendardate'].where(rows['calendardate'] != latest, as_of)
+    insider_buys = EventWindows(sf2, 'transactiondate', codes=['P'])
+    covered = window_ends - pd.DateOffset(months=12) >= pd.to_datetime(sf2['transactiondate']).min()
+
+    rows['price'] = np.where(is_ltm, rows['ticker'].map(latest_close), np.nan)
+    rows['insider_buys'] = np.where(covered, insider_buys.window_sums(rows['ticker'], window_ends, months=12), np.nan)
+    metrics = evaluate_metrics(rows, REPORT_METRICS, by='ticker')
+
+    ltm = rows[is_ltm]
+    fxusd = ltm['fxusd'].to_numpy(dtype=float)
+    ltm_inputs = np.full((len(rows), len(LTM_INPUTS)), np.nan)
+    ltm_inputs[is_ltm] = np.column_stack([
+        ltm['price'].to_numpy(dtype=float) * ltm['sharesbas'].to_numpy(dtype=float) * ltm['sharefactor'].to_numpy(dtype=float),
+        *(ltm[column].to_numpy(dtype=float) / fxusd for column in ['debt', 'intexp', 'taxexp', 'ebt']),
+    ])
+
+    tickers = pd.Index(rows['ticker'].unique())
+    years = sorted(rows.loc[~is_ltm, 'year'].unique())
+    periods = pd.Index(years + [LTM], dtype=object)
+    values = np.full((len(tickers), len(periods), len(REPORT_METRICS) + len(LTM_INPUTS)), np.nan)
+    values[tickers.get_indexer(rows['ticker']), periods.get_indexer(rows['year'])] = np.hstack([metrics.to_numpy(), ltm_inputs])
+    return MetricPanel(values, tickers, periods, REPORT_METRICS + LTM_INPUTS, as_of)
+
+
+def _read_index(directory):
+    with open(os.path.join(directory, INDEX_FILE)) as f:
+        return json.load(f)
+
+
+def save_metric_panel(panel, directory=PANEL_DIR):
+    """
+    Writes the panel's array as .npy next to a small JSON index. The index is replaced last and names
+    the array file, so workers attaching mid-write still see a complete earlier panel. The array the
+    previous index named is kept too, for workers that read that index just before the replace.
+    """
+    os.makedirs(directory, exist_ok=True)
+    index_path = os.path.join(directory, INDEX_FILE)
+    previous = _read_index(directory)['values'] if os.path.exists(index_path) else None
+    values_file = f"metrics-{time.time_ns()}.npy"
+    with open(os.path.join(directory, values_file), 'wb') as f:
+        np.save(f, np.ascontiguousarray(panel.values, dtype=np.float64))
+
+    index = {
+        'values': values_file,
+        'tickers': panel.tickers.tolist(),
+        'periods': [period if period == LTM else int(period) for period in panel.periods],
+        'metrics': panel.metrics.tolist(),
+        'as_of': panel.as_of.strftime('%Y-%m-%d'),
+    }
+    with open(index_path + '.tmp', 'w') as f:
+        json.dump(index, f)
+    os.replace(index_path + '.tmp', index_path)
+
+    for name in os.listdir(directory):
+        if name.startswith('metrics-') and name not in (values_file, previous):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass  # Still mapped by a worker on Windows, removed by the next save
+
+
+def open_metric_panel(directory=PANEL_DIR):
+    """
+    Attaches to a saved panel without reading its array: the values are memory-mapped and paged in on use.
+    """
+    if not os.path.exists(os.path.join(directory, INDEX_FILE)):
+        raise FileNotFoundError(f"No metric panel in {directory}, build one with screen_universe.py --metric-panel")
+    index = _read_index(directory)
+    try:
+        values = np.load(os.path.join(directory, index['values']), mmap_mode='r')
+    except FileNotFoundError:
+        # Two rebuilds landed between reading the index and the array, so the index has moved on
+        index = _read_index(directory)
+        values = np.load(os.path.join(directory, index['values']), mmap_mode='r')
+    return MetricPanel(values, index['tickers'], index['periods'], index['metrics'], index['as_of'])
@@ -0,0 +1,101 @@
+import numpy as np
+
+from src.dcf import npv, GROWTH, TERMINAL_GROWTH
+from src.settings import CONFIG
+
+MC_CONFIG = CONFIG['monte_carlo']
+PATHS = MC_CONFIG['paths']
+CHUNK_SIZE = MC_CONFIG['chunk_size']
+SEED = MC_CONFIG['seed']
+PERCENTILES = MC_CONFIG['percentiles']
+HISTOGRAM_BINS = MC_CONFIG['histogram_bins']
+MIN_HISTORY = MC_CONFIG['min_history']
+
+# Sampled inputs are clipped to these ranges so a wide historical spread can't produce absurd paths
+GROWTH_BOUNDS = (-0.5, 1.0)
+MARGIN_BOUNDS = (-1.0, 1.0)
+MIN_DISCOUNT_RATE = 0.01
+
+
+def _mean_sd(history, default_mean, default_sd):
+    history = np.asarray(history, dtype=float)
+    history = history[np.isfinite(history)]
+    if len(history) < MIN_HISTORY:
+        return default_mean, default_sd
+    return history.mean(), history.std(ddof=1)
+
+
+def input_distributions(metrics, wacc):
+    """
+    Normal distributions (mean, sd) for each DCF input, taken from the ticker's own history where there
+    is enough of it: revenue growth from Rev 3YCAGR, FCF margin from FCF Marg, and the discount rate
+    and terminal growth centred on the point estimates.
+    """
+    fcf_margin = metrics['FCF Marg'] if 'FCF Marg' in metrics.columns else metrics['FCF'] / metrics['Rev']
+    growth_history = metrics['Rev 3YCAGR'] if 'Rev 3YCAGR' in metrics.columns else []
+    ltm_margin = fcf_margin.loc['LTM']
+
+    return {
+        'growth': _mean_sd(growth_history, GROWTH, MC_CONFIG['default_growth_sd']),
+        'margin': _mean_sd(fcf_margin, ltm_margin, MC_CONFIG['default_margin_sd']),
+        'discount_rate': (wacc, MC_CONFIG['discount_rate_sd']),
+        'terminal_growth': (TERMINAL_GROWTH, MC_CONFIG['terminal_growth_sd']),
+    }
+
+
+def simulate_values(revenue, distributions, paths=PATHS, chunk_size=CHUNK_SIZE, seed=SEED):
+    """
+    DCF value of each simulated path, with FCF = revenue x sampled margin grown at the sampled rates.
+    Paths are drawn and valued chunk_size at a time, so the temporaries stay the same size however
+    many paths are run; only the float32 result array grows with paths.
+    """
+    rng = np.random.default_rng(seed)
+    values = np.empty(paths, dtype=np.float32)
+
+    for start in range(0, paths, chunk_size):
+        n = min(chunk_size, paths - start)
+        growth = np.clip(rng.normal(*distributions['growth'], n), *GROWTH_BOUNDS)
+        margin = np.clip(rng.normal(*distributions['margin'], n), *MARGIN_BOUNDS)
+        discount_rate = np.maximum(rng.normal(*distributions['discount_rate'], n), MIN_DISCOUNT_RATE)
+        terminal_growth = rng.normal(*distributions['terminal_growth'], n)
+
+        values[start:start + n] = npv(revenue * margin, discount_rate, growth, terminal_growth)
+
+    return values
+
+
+def summarize(values, market_cap, percentiles=PERCENTILES, bins=HISTOGRAM_BINS):
+    """
+    Percentile values and upsides, the share of paths worth more than the market cap, and a histogram.
+    The histogram spans the 1st to 99th percentile, with the tails counted in the end bins.
+    Paths that valued to NaN or inf are left out, and paths counts only the rest.
+    """
+    values = values[np.isfinite(values)]
+    if not len(values):
+        raise ValueError("No simulated path has a finite value")
+    points = np.percentile(values, percentiles)
+    low, high = np.percentile(values, [1, 99])
+    counts, edges = np.histogram(np.clip(values, low, high), bins=bins, range=(low, high))
+
+    return {
+        'paths': len(values),
+        'percentiles': dict(zip(percentiles, points)),
+        'upside': dict(zip(percentiles, points / market_cap - 1)),
+        'prob_undervalued': float((values > market_cap).mean()) if np.isfinite(market_cap) else np.nan,
+        'histogram': (counts, edges),
+    }
+
+
+def simulate_overview(metrics, wacc, paths=PATHS, seed=SEED):
+    """
+    Runs the simulation for an overview metrics frame (years plus LTM, values in $M).
+    Returns None when LTM revenue, the FCF margin or the WACC isn't finite, as no path could be valued.
+    """
+    distributions = input_distributions(metrics, wacc)
+    revenue = metrics.loc['LTM', 'Rev']
+    if not np.isfinite([revenue] + [value for mean_sd in distributions.values() for value in mean_sd]).all():
+        return None
+    values = simulate_values(revenue, distributions, paths=paths, seed=seed)
+    summary = summarize(values, metrics.loc['LTM', 'Mkt Cap'])
+    summary['distributions'] = distributions
+    return summary
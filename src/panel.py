@@ -0,0 +1,143 @@
+import sys
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.settings import CONFIG
+from src.universe_store import load_table, store_path
+
+PANEL_CONFIG = CONFIG['panel']
+FLOAT32 = PANEL_CONFIG['float32']
+# Kept at full precision when FLOAT32 is on, e.g. current assets and liabilities, whose difference cancels
+FLOAT64_COLUMNS = PANEL_CONFIG['float64_columns']
+
+# Strings repeated on every row, held as one small dictionary plus integer codes
+CATEGORICAL_COLUMNS = ['ticker', 'dimension', 'fiscalperiod', 'transactioncode', 'table', 'isdelisted']
+
+
+def compact_frame(data, float32=FLOAT32):
+    """
+    data with repeated strings as categoricals, categories sorted so they order like the strings,
+    and float64 columns as float32 unless listed in panel.float64_columns. Metrics are still computed
+    in float64; float32 only halves what is held between reports.
+    """
+    dtypes = {}
+    for name, dtype in data.dtypes.items():
+        if name in CATEGORICAL_COLUMNS and not isinstance(dtype, pd.CategoricalDtype):
+            dtypes[name] = 'category'
+        elif float32 and dtype == np.float64 and name not in FLOAT64_COLUMNS:
+            dtypes[name] = np.float32
+    data = data.astype(dtypes)
+
+    for name in CATEGORICAL_COLUMNS:
+        if name in data.columns:
+            categories = data[name].cat.categories
+            if not categories.is_monotonic_increasing:
+                data[name] = data[name].cat.reorder_categories(categories.sort_values())
+    return data
+
+
+def _object_bytes(values):
+    """
+    What a categorical column takes as Python string objects, counted from its categories without building them.
+    """
+    codes = values.cat.codes.to_numpy()
+    counts = np.bincount(codes[codes >= 0], minlength=len(values.cat.categories))
+    sizes = np.array([sys.getsizeof(category) for category in values.cat.categories], dtype=np.int64)
+    return 8 * len(values) + int(counts @ sizes) + int((codes < 0).sum()) * sys.getsizeof(np.nan)
+
+
+class Panel:
+    """
+    Rows of one table for many tickers, compact and sorted by ticker, period then filing date, so the rows of
+    tickers[i] are the contiguous slice offsets[i]:offsets[i + 1] of data, its periods in ascending order.
+    """
+
+    def __init__(self, data, period='calendardate'):
+        data = compact_frame(data)
+        data['ticker'] = data['ticker'].cat.remove_unused_categories()
+        # Restatements of a period in the order they were filed, the latest last
+        order = ['ticker', period] + (['datekey'] if 'datekey' in data.columns and period != 'datekey' else [])
+        self.data = data.sort_values(order, kind='stable', ignore_index=True)
+        self.period = period
+        self.tickers = self.data['ticker'].cat.categories
+        codes = self.data['ticker'].cat.codes.to_numpy()
+        self.offsets = np.searchsorted(codes, np.arange(len(self.tickers) + 1))
+        self.periods = self.data[period].to_numpy()
+
+    def __len__(self):
+        return len(self.data)
+
+    def rows(self, ticker):
+        i = self.tickers.get_loc(ticker)
+        return self.data.iloc[self.offsets[i]:self.offsets[i + 1]]
+
+    def locate(self, tickers, periods):
+        """
+        Row of each (ticker, period) pair, its latest restatement, or -1 where there is none. Each pair is a
+        binary search of the period within the ticker's slice, not a scan of the table.
+        """
+        codes = self.tickers.get_indexer(list(tickers))
+        periods = np.asarray(periods, dtype=self.periods.dtype)
+        rows = np.full(len(codes), -1, dtype=np.int64)
+        for i, (code, period) in enumerate(zip(codes, periods)):
+            if code < 0:
+                continue
+            start, end = self.offsets[code], self.offsets[code + 1]
+            row = start + np.searchsorted(self.periods[start:end], period, side='right') - 1
+            if row >= start and self.periods[row] == period:
+                rows[i] = row
+        return rows
+
+    def latest(self):
+        """
+        The last row of each ticker's slice, its latest period and latest restatement, indexed by ticker.
+        For SF1 ART rows this is the LTM row select_periods picks, without sorting again.
+        """
+        return self.data.iloc[self.offsets[1:] - 1].set_index('ticker')
+
+    def memory_usage(self):
+        return int(self.data.memory_usage(deep=True).sum() + self.offsets.nbytes)
+
+
+def load_panel(table, columns, period='calendardate', filters=None):
+    """
+    Reads only columns of a stored table, repeated strings straight into categoricals, as a Panel.
+    filters are pyarrow row filters applied while reading, e.g. [('dimension', '==', 'ART')].
+    """
+    categorical = [name for name in columns if name in CATEGORICAL_COLUMNS]
+    data = load_table(table, columns=list(dict.fromkeys(columns)), filters=filters, read_dictionary=categorical)
+    return Panel(data, period)
+
+
+def baseline_memory_usage(table):
+    """
+    What load_table(table) takes, every row and column with strings as Python objects, counted from the file's
+    metadata and its string columns read as dictionaries rather than by loading the table.
+    """
+    parquet = pq.ParquetFile(store_path(table))
+    rows = parquet.metadata.num_rows
+    text = [field.name for field in parquet.schema_arrow
+            if pa.types.is_string(field.type) or pa.types.is_large_string(field.type)]
+
+    total = pd.RangeIndex(rows).memory_usage()
+    for field in parquet.schema_arrow:
+        if field.name not in text:
+            width = field.type.bit_width // 8 if pa.types.is_primitive(field.type) else 8
+            total += rows * max(width, 1)
+    if text:
+        strings = load_table(table, columns=text, read_dictionary=text)
+        total += sum(_object_bytes(strings[name].astype('category')) for name in text)
+    return total
+
+
+def memory_report(panel, table):
+    """
+    One line comparing a Panel's footprint with the plain load_table of the whole table it was read from.
+    """
+    baseline_bytes = baseline_memory_usage(table)
+    compact_bytes = panel.memory_usage()
+    return (f"{len(panel):,} rows for {len(panel.tickers):,} tickers in {compact_bytes / 1e6:,.1f} MB, "
+            f"{baseline_bytes / max(compact_bytes, 1):.1f}x smaller than the full {table} load "
+            f"({baseline_bytes / 1e6:,.1f} MB)")
@@ -0,0 +1,111 @@
+import os
+import functools
+import numpy as np
+import pandas as pd
+
+from src.settings import BASE_DIR, CONFIG
+
+FORMATTING = CONFIG['formatting']
+INDEX_CONFIG = FORMATTING['percentile_index']
+PERCENTILES = FORMATTING['percentiles']
+RANKED_METRICS = FORMATTING['higher_is_better'] + FORMATTING['lower_is_better']
+
+INDEX_DIR = os.path.join(BASE_DIR, CONFIG['store']['directory'])
+INDEX_PATH = os.path.join(INDEX_DIR, 'percentile_index.parquet')
+GROUPS_PATH = os.path.join(INDEX_DIR, 'percentile_groups.parquet')
+
+SCOPES = ['industry', 'sector', 'universe']  # Narrowest first, the order peer groups fall back in
+QUANTILES = np.arange(101)
+QUANTILE_COLUMNS = [f"q{q}" for q in QUANTILES]
+
+
+def build_index(metrics, groups):
+    """
+    Quantiles 0-100 of every percentile-coloured metric across the universe, each sector and each industry.
+    metrics is indexed by ticker with one column per metric, groups by ticker with sector and industry columns.
+    Returns (index, ticker_groups), one row per scope, group and metric with its observation count.
+    """
+    columns = [metric for metric in metrics.columns if metric in RANKED_METRICS]
+    values = metrics[columns].rename_axis('ticker').reset_index().melt(id_vars='ticker', var_name='metric')
+    values = values[np.isfinite(values['value'].to_numpy(dtype=float))]
+
+    ticker_groups = groups[['sector', 'industry']].reindex(metrics.index).rename_axis('ticker')
+    values = values.join(ticker_groups, on='ticker').assign(universe='All')
+
+    tables = []
+    for scope in SCOPES:
+        grouped = values.dropna(subset=[scope]).groupby([scope, 'metric'])['value']
+        quantiles = grouped.quantile(QUANTILES / 100).unstack()
+        quantiles.columns = QUANTILE_COLUMNS
+        quantiles.insert(0, 'count', grouped.size())
+        tables.append(quantiles.rename_axis(['group', 'metric']).reset_index().assign(scope=scope))
+
+    index = pd.concat(tables, ignore_index=True)
+    return index[['scope', 'group', 'metric', 'count'] + QUANTILE_COLUMNS], ticker_groups.reset_index()
+
+
+def save_index(index, ticker_groups):
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    for data, path in ((index, INDEX_PATH), (ticker_groups, GROUPS_PATH)):
+        data.to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+
+
+class PercentileIndex:
+    """
+    Fixed per-metric distributions to colour report values against, instead of the handful of values in one table.
+    Each ticker is ranked within its configured peer group, falling back to wider groups when one is too small.
+    """
+
+    def __init__(self, index, ticker_groups, scope=INDEX_CONFIG['scope'], min_group_size=INDEX_CONFIG['min_group_size']):
+        index = index[index['count'] >= min_group_size]
+        quantiles = index[QUANTILE_COLUMNS].to_numpy(dtype=float)
+        self.quantiles = {
+            (row.scope, row.group, row.metric): quantiles[i]
+            for i, row in enumerate(index[['scope', 'group', 'metric']].itertuples(index=False))
+        }
+        self.metrics = set(index['metric'])
+        self.groups = ticker_groups.set_index('ticker')
+        self.scopes = SCOPES[SCOPES.index(scope):]
+
+    def _quantiles(self, metric, ticker):
+        peers = self.groups.loc[ticker] if ticker in self.groups.index else None
+        for scope in self.scopes:
+            group = 'All' if scope == 'universe' else None if peers is None else peers[scope]
+            quantiles = self.quantiles.get((scope, group, metric))
+            if quantiles is not None:
+                return quantiles
+        return None
+
+    def cutpoints(self, metric, tickers, percentiles=PERCENTILES):
+        """
+        Values at the given percentiles of each ticker's peer distribution, shape (len(tickers), len(percentiles)).
+        Returns None if the metric isn't indexed; tickers without any usable distribution get NaN rows.
+        """
+        if metric not in self.metrics:
+            return None
+        cutpoints = np.full((len(tickers), len(percentiles)), np.nan)
+        for i, ticker in enumerate(tickers):
+            quantiles = self._quantiles(metric, ticker)
+            if quantiles is not None:
+                cutpoints[i] = np.interp(percentiles, QUANTILES, quantiles)
+        return cutpoints
+
+
+@functools.lru_cache(maxsize=1)
+def _read_index(index_modified_at, groups_modified_at):
+    return PercentileIndex(pd.read_parquet(INDEX_PATH), pd.read_parquet(GROUPS_PATH))
+
+
+def load_index():
+    """
+    The on-disk index, re-read only when either of its files has been rebuilt. None if disabled or not built yet.
+    """
+    if not INDEX_CONFIG['enabled'] or not os.path.exists(INDEX_PATH) or not os.path.exists(GROUPS_PATH):
+        return None
+    return _read_index(os.path.getmtime(INDEX_PATH), os.path.getmtime(GROUPS_PATH))
+
+
+def peer_cutpoints(metric, tickers):
+    index = load_index()
+    return None if index is None else index.cutpoints(metric, tickers)
@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+
+from src.settings import CONFIG
+
+PRICES = CONFIG['prices']
+RETURN_MONTHS = PRICES['return_months']
+HIGH_LOW_WEEKS = PRICES['high_low_weeks']
+VOLUME_DAYS = PRICES['volume_days']
+
+FALLBACK_COLUMNS = {'closeadj': 'close', 'high': 'close', 'low': 'close'}  # For stores pulled with fewer SEP columns
+NO_DATE = np.iinfo(np.int64).min  # NaT as nanoseconds
+
+
+def _nanoseconds(date):
+    return pd.Timestamp(date).value
+
+
+class TickerCodes:
+    """
+    Integer code per ticker, stable across chunks, with new tickers appended as they first appear.
+    """
+
+    def __init__(self):
+        self.tickers = pd.Index([], dtype=object)
+
+    def encode(self, tickers):
+        codes, uniques = pd.factorize(tickers)
+        known = self.tickers.get_indexer(uniques)
+        new = known < 0
+        known[new] = np.arange(len(self.tickers), len(self.tickers) + new.sum())
+        self.tickers = self.tickers.append(pd.Index(np.asarray(uniques)[new], dtype=object))
+        return known[codes]
+
+
+class Aggregator:
+    """
+    Per-ticker statistic over a stream of price chunks. Each chunk is folded into one array slot per
+    ticker, so state grows with the number of tickers, never with the number of rows.
+    """
+
+    fill = np.nan
+
+    def __init__(self):
+        self.state = np.empty(0)
+
+    def _grow(self, size):
+        if size > len(self.state):
+            self.state = np.concatenate([self.state, np.full(size - len(self.state), self.fill)])
+
+    def update(self, codes, dates, chunk, size):
+        self._grow(size)
+        self.fold(codes, dates, chunk)
+
+    def result(self, size):
+        self._grow(size)
+        return self.state
+
+
+class LastValue(Aggregator):
+    """
+    column on each ticker's latest date up to until, with that date kept in dates.
+    """
+
+    def __init__(self, column, until=None):
+        super().__init__()
+        self.column = column
+        self.until = None if until is None else _nanoseconds(until)
+        self.dates = np.empty(0, dtype=np.int64)
+
+    def _grow(self, size):
+        if size > len(self.dates):
+            self.dates = np.concatenate([self.dates, np.full(size - len(self.dates), NO_DATE)])
+        super()._grow(size)
+
+    def fold(self, codes, dates, chunk):
+        values = chunk[self.column].to_numpy(dtype=float)
+        keep = ~np.isnan(values)
+        if self.until is not None:
+            keep &= dates <= self.until
+        codes, dates, values = codes[keep], dates[keep], values[keep]
+
+        latest = self.dates.copy()
+        np.maximum.at(latest, codes, dates)
+        newest = dates == latest[codes]  # Rows on their ticker's latest date so far
+        self.state[codes[newest]] = values[newest]
+        self.dates = latest
+
+
+class WindowExtreme(Aggregator):
+    """
+    Highest (how='max') or lowest (how='min') value of column per ticker on dates from since on.
+    """
+
+    def __init__(self, column, since, how='max'):
+        super().__init__()
+        self.column = column
+        self.since = _nanoseconds(since)
+        self.ufunc = np.fmax if how == 'max' else np.fmin  # NaN-ignoring
+
+    def fold(self, codes, dates, chunk):
+        keep = dates >= self.since
+        self.ufunc.at(self.state, codes[keep], chunk[self.column].to_numpy(dtype=float)[keep])
+
+
+class WindowMean(Aggregator):
+    """
+    Mean of column per ticker on dates from since on, carried as a running sum and count.
+    """
+
+    fill = 0.0
+
+    def __init__(self, column, since):
+        super().__init__()
+        self.column = column
+        self.since = _nanoseconds(since)
+        self.counts = np.empty(0)
+
+    def _grow(self, size):
+        if size > len(self.counts):
+            self.counts = np.concatenate([self.counts, np.zeros(size - len(self.counts))])
+        super()._grow(size)
+
+    def fold(self, codes, dates, chunk):
+        values = chunk[self.column].to_numpy(dtype=float)
+        keep = (dates >= self.since) & ~np.isnan(values)
+        self.state += np.bincount(codes[keep], weights=values[keep], minlength=len(self.state))
+        self.counts += np.bincount(codes[keep], minlength=len(self.counts))
+
+    def result(self, size):
+        super().result(size)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.counts > 0, self.state / self.counts, np.nan)
+
+
+def complete_chunk(chunk):
+    """
+    Missing price columns filled from close, and dollar volume added.
+    """
+    for column, fallback in FALLBACK_COLUMNS.items():
+        if column not in chunk.columns:
+            chunk = chunk.assign(**{column: chunk[fallback]})
+    volume = chunk['volume'] if 'volume' in chunk.columns else np.nan
+    return chunk.assign(dollar_volume=chunk['close'] * volume)
+
+
+def price_stats(chunks, as_of=None):
+    """
+    Latest close, 52-week high and low, trailing total returns and average daily dollar volume per ticker,
+    in one pass over chunks of SEP rows in any order, e.g. from universe_store.iter_table or read_csv_chunks.
+    Only one chunk plus a few arrays with one slot per ticker are held at a time.
+    Returns a DataFrame indexed by ticker: date and close of the latest price, then one column per statistic.
+    """
+    as_of = pd.Timestamp.today().normalize() if as_of is None else pd.Timestamp(as_of)
+    high_low_since = as_of - pd.DateOffset(weeks=HIGH_LOW_WEEKS)
+
+    aggregators = {
+        'close': LastValue('close', until=as_of),
+        'closeadj': LastValue('closeadj', until=as_of),
+        '52W High': WindowExtreme('high', high_low_since, how='max'),
+        '52W Low': WindowExtreme('low', high_low_since, how='min'),
+        'ADV': WindowMean('dollar_volume', as_of - pd.DateOffset(days=VOLUME_DAYS)),
+    }
+    for months in RETURN_MONTHS:
+        # Total return base: the last adjusted close on or before the start of the period
+        aggregators[f"Ret {months}M"] = LastValue('closeadj', until=as_of - pd.DateOffset(months=months))
+
+    tickers = TickerCodes()
+    for chunk in chunks:
+        chunk = complete_chunk(chunk)
+        codes = tickers.encode(chunk['ticker'])
+        dates = pd.to_datetime(chunk['date']).to_numpy(dtype='datetime64[ns]').view(np.int64)
+        for aggregator in aggregators.values():
+            aggregator.update(codes, dates, chunk, len(tickers.tickers))
+
+    size = len(tickers.tickers)
+    results = {name: aggregator.result(size) for name, aggregator in aggregators.items()}
+
+    stats = pd.DataFrame(index=pd.Index(tickers.tickers, name='ticker'))
+    stats['date'] = aggregators['close'].dates.view('datetime64[ns]')  # NO_DATE reads as NaT
+    stats['close'] = results['close']
+    stats['52W High'] = results['52W High']
+    stats['52W Low'] = results['52W Low']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for months in RETURN_MONTHS:
+            stats[f"Ret {months}M"] = results['closeadj'] / results[f"Ret {months}M"] - 1
+    stats['ADV'] = results['ADV'] / 1_000_000  # Average daily dollar volume, $M
+    return stats
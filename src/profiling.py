@@ -0,0 +1,127 @@
+import sys
+import json
+import time
+import cProfile
+from contextlib import contextmanager
+from datetime import datetime
+
+COUNTERS = ['rows', 'bytes', 'cache_hits', 'cache_misses', 'sheet_ops']
+
+
+class RunProfile:
+    """
+    Wall time and counters per named stage of a run. Stages nest: seconds includes nested stages,
+    self_seconds excludes them, and counters go to the innermost open stage. Does nothing until enabled.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}
+        self.cprofile_stage = None
+        self.cprofile = None
+        self._stack = []
+        self._started_at = None
+
+    def enable(self, cprofile_stage=None):
+        self.enabled = True
+        self.stages = {}
+        self.cprofile_stage = cprofile_stage
+        self.cprofile = cProfile.Profile() if cprofile_stage else None
+        self._started_at = time.time()
+
+    def _entry(self, name):
+        if name not in self.stages:
+            self.stages[name] = {'calls': 0, 'seconds': 0.0, 'self_seconds': 0.0, **dict.fromkeys(COUNTERS, 0)}
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        entry = self._entry(name)
+        profiling = self.cprofile is not None and name == self.cprofile_stage and name not in self._stack
+        self._stack.append(name)
+        if profiling:
+            self.cprofile.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if profiling:
+                self.cprofile.disable()
+            self._stack.pop()
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            entry['self_seconds'] += seconds
+            if self._stack:
+                self.stages[self._stack[-1]]['self_seconds'] -= seconds
+
+    def add(self, **counters):
+        if self.enabled and self._stack:
+            entry = self.stages[self._stack[-1]]
+            for counter, value in counters.items():
+                entry[counter] += int(value)
+
+    def to_dict(self, **context):
+        return {
+            **context,
+            'command': sys.argv,
+            'started_at': datetime.fromtimestamp(self._started_at).isoformat(timespec='seconds'),
+            'total_seconds': round(time.time() - self._started_at, 4),
+            'stages': {name: {key: round(value, 4) if isinstance(value, float) else value for key, value in entry.items()}
+                       for name, entry in self.stages.items()},
+        }
+
+    def write(self, path, **context):
+        """
+        Writes the profile as JSON to path, plus the cProfile stats of the profiled stage to path + '.prof'.
+        Returns the profile dict.
+        """
+        profile = self.to_dict(**context)
+        with open(path, 'w') as f:
+            json.dump(profile, f, indent=2)
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(path + '.prof')
+        return profile
+
+    def summary(self):
+        lines = [f"{'stage':<28}{'calls':>6}{'seconds':>9}{'self':>9}{'rows':>10}{'MB':>8}{'cache hit/miss':>16}{'sheet ops':>10}"]
+        for name, entry in sorted(self.stages.items(), key=lambda item: -item[1]['self_seconds']):
+            cache = f"{entry['cache_hits']}/{entry['cache_misses']}"
+            lines.append(f"{name:<28}{entry['calls']:>6}{entry['seconds']:>9.3f}{entry['self_seconds']:>9.3f}"
+                         f"{entry['rows']:>10,}{entry['bytes'] / 1e6:>8.2f}{cache:>16}{entry['sheet_ops']:>10,}")
+        return '\n'.join(lines)
+
+
+class ProfiledWriter:
+    """
+    Wraps a sheet writer so every call counts as a sheet operation of the current stage.
+    """
+
+    def __init__(self, writer, profile):
+        self._writer = writer
+        self._profile = profile
+
+    def __getattr__(self, name):
+        method = getattr(self._writer, name)
+        if not callable(method):
+            return method
+
+        def counted(*args, **kwargs):
+            self._profile.add(sheet_ops=1)
+            return method(*args, **kwargs)
+        return counted
+
+
+PROFILE = RunProfile()
+
+
+def profile_writer(writer):
+    return ProfiledWriter(writer, PROFILE) if PROFILE.enabled else writer
+
+
+def frame_bytes(data):
+    return data.memory_usage(deep=True).sum()
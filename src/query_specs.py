@@ -0,0 +1,72 @@
+import pandas as pd
+
+from src.metric_engine import input_columns
+
+# Columns every SF1 pull needs for period selection, currency conversion and share counts
+SF1_BASE_COLUMNS = ['ticker', 'dimension', 'calendardate', 'datekey', 'fiscalperiod',
+                    'fxusd', 'sharesbas', 'sharefactor']
+
+SEP_COLUMNS = ['ticker', 'date', 'close']
+PRICE_HISTORY_COLUMNS = ['ticker', 'date', 'close', 'closeadj', 'high', 'low', 'volume']  # For src/price_stats.py
+RETURN_COLUMNS = ['ticker', 'date', 'closeadj']  # Split and dividend adjusted, for return series
+SF2_COLUMNS = ['ticker', 'filingdate', 'transactiondate', 'transactioncode']
+
+PRICE_LOOKBACK_DAYS = 10  # Covers weekends and market holidays when looking for the latest close
+
+
+def _start_date(lookback):
+    # Rounded down to the start of its month, so the query, and the cache key hashed from it, stay the same
+    # all month instead of changing daily. Callers trim to the exact lookback where the extra rows matter;
+    # SF1 gains none, as quarter ends never fall between a month start and a later day of that month.
+    return (pd.Timestamp.today().normalize() - lookback).replace(day=1).strftime('%Y-%m-%d')
+
+
+def _date_years_ago(years):
+    return _start_date(pd.DateOffset(years=years))
+
+
+def sf1_query(metrics, years, dimension='ART', extra_columns=()):
+    """
+    SF1 query parameters restricted to one dimension, the last `years` calendar years
+    and only the columns the formulas of the requested metrics read.
+    """
+    columns = list(SF1_BASE_COLUMNS) + input_columns(metrics)  # Raises ValueError for a metric without a formula
+    columns += list(extra_columns)
+
+    return {
+        'dimension': dimension,
+        'calendardate': {'gte': _date_years_ago(years)},
+        'qopts': {'columns': list(dict.fromkeys(columns))},
+    }
+
+
+def sep_query(lookback_days=PRICE_LOOKBACK_DAYS):
+    return {
+        'date': {'gte': _start_date(pd.Timedelta(days=lookback_days))},
+        'qopts': {'columns': SEP_COLUMNS},
+    }
+
+
+def price_history_query(days):
+    return {
+        'date': {'gte': _start_date(pd.Timedelta(days=days))},
+        'qopts': {'columns': PRICE_HISTORY_COLUMNS},
+    }
+
+
+def returns_query(years):
+    return {
+        'date': {'gte': _date_years_ago(years)},
+        'qopts': {'columns': RETURN_COLUMNS},
+    }
+
+
+def sf2_query(years, extra_columns=()):
+    # SF2 only filters on ticker, filingdate, ownername and securityadcode server-side,
+    # so transaction codes are selected locally. Form 4s are filed after the trade, which
+    # makes a filingdate bound a safe lower bound on transactiondate. Pass
+    # extra_columns=['transactionshares', 'transactionvalue'] to sum shares or dollars.
+    return {
+        'filingdate': {'gte': _date_years_ago(years)},
+        'qopts': {'columns': SF2_COLUMNS + list(extra_columns)},
+    }
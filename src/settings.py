@@ -0,0 +1,20 @@
+import os
+import json
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY_PATH = os.path.join(BASE_DIR, 'api_key.json')
+CONFIG_PATH = os.path.join(BASE_DIR, 'config.json')
+
+# Parsed once per process; every module reads its section from here
+with open(CONFIG_PATH, 'r') as f:
+    CONFIG = json.load(f)
+
+
+def load_api_key():
+    with open(API_KEY_PATH) as f:
+        return json.load(f)['api_key']
+
+
+def configure_api_key():
+    import nasdaqdatalink as ndl
+    ndl.ApiConfig.api_key = load_api_key()
@@ -0,0 +1,221 @@
+import re
+import xlsxwriter
+
+from src.formatting_helpers import union_addresses
+
+ADDRESS_PATTERN = re.compile(r'\$?([A-Z]+)\$?(\d+)')
+
+
+def parse_address(address):
+    """
+    Converts an A1 range address such as '$E$5:$V$5' or 'E5' to (first_row, first_col, last_row, last_col).
+    """
+    coords = []
+    for letters, row in ADDRESS_PATTERN.findall(address):
+        col = 0
+        for letter in letters:
+            col = col * 26 + ord(letter) - 64
+        coords.append((int(row), col))
+    (first_row, first_col), (last_row, last_col) = coords[0], coords[-1]
+    return first_row, first_col, last_row, last_col
+
+
+def to_hex(color):
+    return '#{:02X}{:02X}{:02X}'.format(*color)
+
+
+class XlwingsSheetWriter:
+    """
+    Writes to a live Excel sheet through xlwings. Rows and columns are 1-based, colours are RGB tuples.
+    """
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+
+    def write_values(self, row, col, rows):
+        self.sheet.range((row, col)).value = rows
+
+    def read_values(self, address):
+        return self.sheet.range(address).options(ndim=2).value
+
+    def write_formulas(self, row, col, rows):
+        self.sheet.range((row, col)).formula = rows
+
+    def set_number_formats(self, formats):
+        for number_format, addresses in formats.items():
+            for address in union_addresses(addresses):
+                self.sheet.range(address).api.NumberFormat = number_format
+
+    def fill(self, addresses, color):
+        for address in union_addresses(addresses):
+            self.sheet.range(address).color = color
+
+    def clear_fill(self, addresses):
+        for address in union_addresses(addresses):
+            self.sheet.range(address).color = None
+
+    def fill_rows(self, first_row, last_row, color):
+        self.sheet.range((first_row, 1), (last_row, self.sheet.api.Columns.Count)).color = color
+
+    def add_comments(self, comments):
+        # Comments are given as (row, col, text) and always lie along one row or column
+        rows = [row for row, _, _ in comments]
+        cols = [col for _, col, _ in comments]
+        self.sheet.range((min(rows), min(cols)), (max(rows), max(cols))).api.ClearComments()
+        for row, col, text in comments:
+            self.sheet.cells(row, col).api.AddComment(text).Visible = False
+
+    def add_bottom_border(self, address):
+        self.sheet.range(address).api.Borders(9).Weight = 2  # xlEdgeBottom, xlThin
+
+    def add_table(self, address, style):
+        self.sheet.api.ListObjects.Add(1, self.sheet.range(address).api.Address, 0, 1).TableStyle = style
+
+    def autofit_columns(self, first_col, last_col):
+        self.sheet.range((1, first_col), (1, last_col)).api.EntireColumn.AutoFit()
+
+    def freeze_panes(self, row, col):
+        window = self.sheet.api.Application.ActiveWindow
+        window.SplitRow = row
+        window.SplitColumn = col
+        window.FreezePanes = True
+
+    def set_font_size(self, row, col, size):
+        self.sheet.cells(row, col).api.Font.Size = size
+
+    def close(self):
+        pass
+
+
+class XlsxSheetWriter:
+    """
+    Writes a standalone .xlsx file with xlsxwriter, no Excel required. Cell contents and styles are
+    buffered and written in one pass on close(), so calls can arrive in any order like the xlwings writer.
+    """
+
+    def __init__(self, path, sheet_name='Sheet1'):
+        self.path = path
+        self.sheet_name = sheet_name
+        self._cells = {}
+        self._row_fills = {}
+        self._comments = []
+        self._tables = []
+        self._freeze = None
+        self._autofit = False
+
+    def _cell(self, row, col):
+        return self._cells.setdefault((row, col), {})
+
+    def _cells_in(self, address):
+        first_row, first_col, last_row, last_col = parse_address(address)
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                yield self._cell(row, col)
+
+    def write_values(self, row, col, rows):
+        for i, values in enumerate(rows):
+            for j, value in enumerate(values):
+                self._cell(row + i, col + j)['value'] = value
+
+    def write_formulas(self, row, col, rows):
+        self.write_values(row, col, rows)
+
+    def set_number_formats(self, formats):
+        for number_format, addresses in formats.items():
+            for address in addresses:
+                for cell in self._cells_in(address):
+                    cell['num_format'] = number_format
+
+    def fill(self, addresses, color):
+        for address in addresses:
+            for cell in self._cells_in(address):
+                cell['bg_color'] = to_hex(color)
+
+    def clear_fill(self, addresses):
+        for address in addresses:
+            for cell in self._cells_in(address):
+                cell.pop('bg_color', None)
+
+    def fill_rows(self, first_row, last_row, color):
+        for row in range(first_row, last_row + 1):
+            self._row_fills[row] = to_hex(color)
+
+    def add_comments(self, comments):
+        self._comments.extend(comments)
+
+    def add_bottom_border(self, address):
+        first_row, first_col, last_row, last_col = parse_address(address)
+        for col in range(first_col, last_col + 1):
+            self._cell(last_row, col)['bottom'] = 1
+
+    def add_table(self, address, style):
+        # 'TableStyleLight1' -> 'Table Style Light 1'
+        self._tables.append((parse_address(address), re.sub(r'([a-z])([A-Z0-9])', r'\1 \2', style)))
+
+    def autofit_columns(self, first_col, last_col):
+        self._autofit = True
+
+    def freeze_panes(self, row, col):
+        self._freeze = (row, col)
+
+    def set_font_size(self, row, col, size):
+        self._cell(row, col)['font_size'] = size
+
+    def close(self):
+        workbook = xlsxwriter.Workbook(self.path, {'nan_inf_to_errors': True})
+        worksheet = workbook.add_worksheet(self.sheet_name)
+        formats = {}
+
+        def get_format(properties):
+            key = tuple(sorted(properties.items()))
+            if key not in formats:
+                formats[key] = workbook.add_format(properties)
+            return formats[key]
+
+        for row, color in self._row_fills.items():
+            worksheet.set_row(row - 1, None, get_format({'bg_color': color}))
+
+        # Tables go first so the buffered cells, with their formats, overwrite the plain table headers
+        for (first_row, first_col, last_row, last_col), style in self._tables:
+            headers = [self._cells.get((first_row, col), {}).get('value') for col in range(first_col, last_col + 1)]
+            worksheet.add_table(first_row - 1, first_col - 1, last_row - 1, last_col - 1, {
+                'style': style,
+                'columns': [{'header': str(header)} for header in headers]
+            })
+
+        for (row, col), cell in sorted(self._cells.items()):
+            properties = {key: value for key, value in cell.items() if key != 'value'}
+            if 'bg_color' not in properties and row in self._row_fills:
+                properties['bg_color'] = self._row_fills[row]  # Cell formats replace the row format
+            cell_format = get_format(properties) if properties else None
+
+            value = cell.get('value')
+            if value is None:
+                if cell_format is not None:
+                    worksheet.write_blank(row - 1, col - 1, None, cell_format)
+            else:
+                worksheet.write(row - 1, col - 1, value, cell_format)
+
+        for row, col, text in self._comments:
+            worksheet.write_comment(row - 1, col - 1, text)
+
+        if self._freeze:
+            worksheet.freeze_panes(*self._freeze)
+        if self._autofit:
+            worksheet.autofit()
+
+        workbook.close()
+
+
+def open_writer(backend, path=None, sheet_name=None):
+    """
+    'excel' writes via xlwings to the active sheet of the open workbook, or to a new sheet when sheet_name is given.
+    'xlsx' writes a new file at path.
+    """
+    if backend == 'xlsx':
+        return XlsxSheetWriter(path, sheet_name or 'Sheet1')
+
+    import xlwings as xw  # Needs a running Excel, so only imported for the Excel backend
+    book = xw.books.active
+    sheet = book.sheets.add(sheet_name, after=book.sheets[-1]) if sheet_name else book.sheets.active
+    return XlwingsSheetWriter(sheet)
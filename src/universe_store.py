@@ -0,0 +1,242 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import nasdaqdatalink as ndl
+
+from src.data_fetching import EXECUTOR, _fetch_page, _request_key
+from src.settings import BASE_DIR, CONFIG
+
+STORE_DIR = os.path.join(BASE_DIR, CONFIG['store']['directory'])
+STATE_PATH = os.path.join(STORE_DIR, 'sync_state.json')
+CHUNK_ROWS = CONFIG['store']['chunk_rows']  # Rows held at once when streaming a table
+
+DATE_COLUMNS = ['calendardate', 'datekey', 'reportperiod', 'lastupdated', 'date', 'filingdate', 'transactiondate']
+# Text columns of the Sharadar tables, stored as strings even where a chunk holds only blanks or number-like values
+STRING_COLUMNS = ['ticker', 'dimension', 'fiscalperiod', 'table', 'permaticker', 'name', 'exchange', 'isdelisted',
+                  'category', 'cusips', 'siccode', 'sicsector', 'sicindustry', 'famasector', 'famaindustry', 'sector',
+                  'industry', 'scalemarketcap', 'scalerevenue', 'relatedtickers', 'currency', 'location',
+                  'secfilings', 'companysite', 'issuername', 'ownername', 'officertitle', 'isdirector',
+                  'isofficer', 'istenpercentowner', 'transactioncode', 'securityadcode', 'securitytitle',
+                  'directorindirect', 'natureofownership', 'formtype', 'action', 'contraticker', 'contraname']
+
+# Row identity and the server-side filterable column that moves forward when a row changes.
+# SF2 has no lastupdated and no natural key, but filings only ever arrive after the last
+# filingdate, so the rows from the high-water mark on are replaced as a block.
+SYNC_SPECS = {
+    'SHARADAR/SF1': {'keys': ['ticker', 'dimension', 'calendardate'], 'updated': 'lastupdated'},
+    'SHARADAR/SEP': {'keys': ['ticker', 'date'], 'updated': 'lastupdated'},
+    'SHARADAR/SF2': {'keys': None, 'updated': 'filingdate'},
+    'SHARADAR/TICKERS': {'keys': ['ticker', 'table'], 'updated': 'lastupdated'},
+}
+
+
+def store_path(table):
+    return os.path.join(STORE_DIR, table.replace('/', '_') + '.parquet')
+
+
+def parse_dates(data):
+    for col in DATE_COLUMNS:
+        if col in data.columns:
+            data[col] = pd.to_datetime(data[col])
+    return data
+
+
+def load_state():
+    if not os.path.exists(STATE_PATH):
+        return {}
+    with open(STATE_PATH) as f:
+        return json.load(f)
+
+
+def save_state(state):
+    with open(STATE_PATH + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(STATE_PATH + '.tmp', STATE_PATH)
+
+
+def with_sync_columns(code, params):
+    # Column-restricted pulls still need the key and updated columns for later delta syncs
+    columns = params.get('qopts', {}).get('columns')
+    if not columns or code not in SYNC_SPECS:
+        return params
+    spec = SYNC_SPECS[code]
+    columns = list(dict.fromkeys(columns + (spec['keys'] or []) + [spec['updated']]))
+    return {**params, 'qopts': {**params['qopts'], 'columns': columns}}
+
+
+def record_sync(code, params, high_water_mark):
+    if code not in SYNC_SPECS:
+        return
+    state = load_state()
+    state[code] = {
+        'params': params,
+        'high_water_mark': None if pd.isna(high_water_mark) else high_water_mark.strftime('%Y-%m-%d')
+    }
+    save_state(state)
+
+
+def write_table(code, data, params):
+    path = store_path(code)
+    data.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+
+    if code in SYNC_SPECS:
+        record_sync(code, params, data[SYNC_SPECS[code]['updated']].max())
+
+
+def read_csv_chunks(path, columns=None, chunk_rows=CHUNK_ROWS):
+    """
+    Reads a CSV, or a bulk export zip holding one, chunk_rows rows at a time with dates parsed
+    and STRING_COLUMNS kept as text. Only columns that exist in the file are read.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    if columns is not None:
+        columns = [col for col in columns if col in header]
+    text = {col: str for col in header if col in STRING_COLUMNS}
+    for chunk in pd.read_csv(path, usecols=columns, dtype=text, chunksize=chunk_rows, low_memory=False):
+        yield parse_dates(chunk)
+
+
+def export_schema(header, sample=None):
+    """
+    Parquet schema of an export fixed up front from its header: dates as timestamps, STRING_COLUMNS and any
+    column sample reads as text as strings, everything else float64, since whole-number columns may gain
+    NaNs in a later chunk. Later chunks are cast to it, whatever their own blanks made pandas infer.
+    """
+    fields = []
+    for col in header:
+        if col in DATE_COLUMNS:
+            fields.append(pa.field(col, pa.timestamp('ns')))
+        elif col in STRING_COLUMNS or (sample is not None and sample[col].notna().any()
+                                       and not pd.api.types.is_numeric_dtype(sample[col])
+                                       and not pd.api.types.is_datetime64_any_dtype(sample[col])):
+            fields.append(pa.field(col, pa.string()))
+        else:
+            fields.append(pa.field(col, pa.float64()))
+    return pa.schema(fields)
+
+
+def to_schema(chunk, schema):
+    chunk = chunk.astype({field.name: 'string' for field in schema if pa.types.is_string(field.type)})
+    return pa.Table.from_pandas(chunk, preserve_index=False).cast(schema)
+
+
+def iter_table(table, columns=None, chunk_rows=CHUNK_ROWS):
+    """
+    Reads a stored table chunk_rows rows at a time, so memory stays bounded however large it is.
+    Only columns that exist in the table are read.
+    """
+    path = store_path(table)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{table} is not in the local store, download it first with --download")
+    parquet = pq.ParquetFile(path)
+    if columns is not None:
+        columns = [col for col in columns if col in parquet.schema_arrow.names]
+    for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+        yield batch.to_pandas()
+
+
+def export_to_store(code, **params):
+    """
+    Downloads a whole table through the bulk export endpoint in one request and saves it as Parquet in the local store.
+    Takes the same filter and qopts parameters as ndl.get_table. The export is converted a chunk at a time,
+    so even SEP never has to fit in memory. An export with no rows is stored as an empty table with its columns.
+    Returns the number of rows stored.
+    """
+    os.makedirs(STORE_DIR, exist_ok=True)
+    params = with_sync_columns(code, params)
+    path = store_path(code)
+    zip_path = path[:-len('.parquet')] + '.zip'
+    updated = SYNC_SPECS[code]['updated'] if code in SYNC_SPECS else None
+
+    ndl.export_table(code, filename=zip_path, **params)
+    writer = None
+    rows = 0
+    latest = []
+    try:
+        for chunk in read_csv_chunks(zip_path):
+            if writer is None:
+                writer = pq.ParquetWriter(path + '.tmp', export_schema(chunk.columns, chunk))
+            writer.write_table(to_schema(chunk, writer.schema))
+            rows += len(chunk)
+            if updated is not None:
+                latest.append(chunk[updated].max())
+        if writer is None:
+            schema = export_schema(pd.read_csv(zip_path, nrows=0).columns)
+            pq.write_table(schema.empty_table(), path + '.tmp')
+    finally:
+        if writer is not None:
+            writer.close()
+        os.remove(zip_path)
+
+    os.replace(path + '.tmp', path)
+    record_sync(code, params, pd.Series(latest, dtype='datetime64[ns]').max())
+    return rows
+
+
+def changed_tickers(stored, delta, keys):
+    """
+    Tickers in delta with a new key or at least one value that differs from the stored row.
+    """
+    if keys is None:
+        # No row identity, so compare the two blocks as multisets of whole rows
+        counts = stored[delta.columns].value_counts(dropna=False).sub(delta.value_counts(dropna=False), fill_value=0)
+        return set(counts[counts != 0].index.get_level_values('ticker'))
+    if delta.empty:
+        return set()
+
+    values = [col for col in delta.columns if col not in keys and col != 'lastupdated' and col in stored.columns]
+    merged = delta.merge(stored[keys + values], on=keys, how='left', suffixes=('', '_stored'), indicator=True)
+    changed = merged['_merge'] == 'left_only'
+    for col in values:
+        new, old = merged[col], merged[col + '_stored']
+        if pd.api.types.is_numeric_dtype(new) and pd.api.types.is_numeric_dtype(old):
+            # The bulk export goes through CSV, so the same value can differ in the last digit
+            differs = ~np.isclose(new, old, rtol=1e-9, atol=0)
+        else:
+            differs = new != old
+        changed |= differs & ~(new.isna() & old.isna())
+    return set(merged.loc[changed, 'ticker'])
+
+
+def sync_table(code):
+    """
+    Pulls only the rows updated since the table's high-water mark and upserts them into the store.
+    Returns the set of tickers whose data actually changed.
+    """
+    state = load_state().get(code)
+    if state is None:
+        raise FileNotFoundError(f"{code} has no sync state, download it first with --download")
+
+    spec = SYNC_SPECS[code]
+    updated = spec['updated']
+    params = dict(state['params'])
+    if state['high_water_mark'] is not None:
+        # gte rather than gt: the mark only has day resolution, and re-pulled rows upsert to themselves
+        params[updated] = {'gte': state['high_water_mark']}
+
+    delta = parse_dates(EXECUTOR.run_pages(_request_key(code, None, params), _fetch_page, code, None, params))
+    stored = load_table(code)
+
+    if spec['keys'] is None:
+        replaced = stored[updated] >= pd.Timestamp(state['high_water_mark'] or pd.Timestamp.min)
+        changed = changed_tickers(stored[replaced], delta, None)
+        merged = pd.concat([stored[~replaced], delta], ignore_index=True)
+    else:
+        delta = delta.sort_values(updated).drop_duplicates(spec['keys'], keep='last')
+        changed = changed_tickers(stored, delta, spec['keys'])
+        merged = pd.concat([stored, delta], ignore_index=True).drop_duplicates(spec['keys'], keep='last')
+
+    write_table(code, merged.reset_index(drop=True), state['params'])
+    return changed
+
+
+def load_table(table, columns=None, **read_options):
+    # read_options go through to pyarrow, e.g. filters or read_dictionary
+    path = store_path(table)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{table} is not in the local store, download it first with --download")
+    return pd.read_parquet(path, columns=columns, **read_options)